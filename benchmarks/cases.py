@@ -0,0 +1,317 @@
+"""Benchmark cases of the pipeline.
+
+The notebook modules find their data from the working directory
+(``filenames.py`` uses ``Path.cwd().parents[1]``, the dashboard reads
+``resources/``), so every case runs in a fresh interpreter whose working
+directory is the matching folder of the synthetic tree written by
+``generate.py`` and whose ``PYTHONPATH`` is the module folder of this
+checkout. The case prints its timings as one JSON object.
+
+Usage (normally through ``run.py``)::
+
+    python cases.py profile_ingest --root benchmarks/data/small --repeat 3
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+repo_path = Path(__file__).resolve().parents[1]
+
+
+def timeit(func, repeat=3, setup=None):
+    """Seconds of `repeat` calls of func, after setup() before each."""
+    seconds = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        func()
+        seconds.append(time.perf_counter() - start)
+    return seconds
+
+
+def summary(seconds, **extra):
+    """Min, median and all the timings of a measurement."""
+    return dict({'min': min(seconds), 'median': statistics.median(seconds),
+                 'seconds': seconds}, **extra)
+
+
+# gain-followers
+
+def profile_ingest(root, repeat):
+    """Ingest the profile CSVs into an empty store and load the
+    deduplicated table."""
+    import filenames
+    import profile_store
+
+    files = sorted(filenames.profile_folder_path.glob('*.csv'))
+    rows = sum(sum(1 for _ in open(f)) - 1 for f in files)
+
+    def setup():
+        shutil.rmtree(profile_store.store_path, ignore_errors=True)
+
+    ingest = timeit(lambda: profile_store.ingest(verbose=False), repeat,
+                    setup)
+    load = timeit(profile_store.load_profiles, repeat)
+    profiles = len(profile_store.load_profiles(columns=['userid']))
+    return {'ingest': summary(ingest, rows=rows),
+            'load_profiles': summary(load, rows=profiles)}
+
+
+def follower_labelling(root, repeat):
+    """Record followers.txt in an empty follower index and label the
+    stored profiles."""
+    import follower_index
+    import profile_store
+
+    profile_store.ingest(verbose=False)
+    usernames = profile_store.load_profiles(columns=['username'])['username']
+
+    def setup():
+        shutil.rmtree(follower_index.index_path, ignore_errors=True)
+
+    update = timeit(follower_index.update, repeat, setup)
+    index = follower_index.update()
+    label = timeit(lambda: index.is_follower(usernames), repeat)
+    return {'index_update': summary(update),
+            'is_follower': summary(label, rows=len(usernames))}
+
+
+def batch_scoring(root, repeat):
+    """Score the candidate chunk files with the model, in-process and
+    through the worker pool."""
+    import batch_score
+    import pandas as pd
+
+    resources = root.joinpath('notebooks', 'dash-app', 'resources')
+    paths = batch_score.chunk_files()
+    batch = pd.concat(pd.read_csv(path) for path in paths)
+    preprocess, model = batch_score.load_model(resources)
+    score = timeit(lambda: batch_score.score_batch(batch, preprocess, model),
+                   repeat)
+    output = root.joinpath('data', 'processed', 'benchmark_scores.csv')
+    pool = timeit(lambda: batch_score.run(paths, output,
+                                          resources_path=resources), repeat)
+    return {'score_batch': summary(score, rows=len(batch)),
+            'run': summary(pool, rows=len(batch),
+                           workers=os.cpu_count())}
+
+
+# posts
+
+def post_features(root, repeat):
+    """Per-owner post features of the post CSVs."""
+    import filenames
+    import post_features as features
+
+    paths = sorted(filenames.post_path.glob('*.csv'))
+    build = timeit(lambda: features.build(paths, verbose=False), repeat)
+    return {'build': summary(build)}
+
+
+def engagement_cube(root, repeat):
+    """Build the engagement cube from an empty store, and query it."""
+    import engagement_cube as cubes
+
+    def setup():
+        shutil.rmtree(cubes.cube_path, ignore_errors=True)
+
+    build = timeit(lambda: cubes.EngagementCube().ingest(verbose=False),
+                   repeat, setup)
+    cube = cubes.EngagementCube()
+    cube.ingest(verbose=False)
+    queries = [(None, None), ('GraphVideo', None), ('GraphSidecar', '3-5'),
+               (['GraphImage', 'GraphSidecar'], ['6-10', '11-20'])]
+    best = timeit(lambda: [cube.best_slots(*query) for query in queries],
+                  repeat)
+    return {'build': summary(build, posts=len(cube.keys)),
+            'best_slots': summary([s / len(queries) for s in best])}
+
+
+# dash-app
+
+def app_cold_start(root, repeat):
+    """Import the app in a fresh interpreter, then build every tab and
+    load the model like the first requests do."""
+    def cold():
+        subprocess.run([sys.executable, '-c', 'import app'], check=True,
+                       env=os.environ.copy())
+
+    import_app = timeit(cold, repeat)
+    import boot_report
+    first_use = boot_report.first_use_times()
+    return dict({'import_app': summary(import_app)},
+                **{name: summary([seconds])
+                   for name, seconds in first_use.items()})
+
+
+def _callback_payload(outputs, inputs, state=()):
+    """Body of the request the browser sends for a callback."""
+    def prop(spec):
+        component, name, value = spec
+        return {'id': component, 'property': name, 'value': value}
+
+    ids = ['{}.{}'.format(*output) for output in outputs]
+    specs = [{'id': component, 'property': name}
+             for component, name in outputs]
+    return {'output': ids[0] if len(ids) == 1
+            else '..' + '...'.join(ids) + '..',
+            'outputs': specs[0] if len(specs) == 1 else specs,
+            'inputs': [prop(spec) for spec in inputs],
+            'changedPropIds': ['{}.{}'.format(*inputs[0][:2])],
+            'state': [prop(spec) for spec in state]}
+
+
+def callbacks(root, repeat):
+    """Every Dash callback through the test client, first call and warm."""
+    import app
+    from tabs.tab_3 import choices
+
+    features = dict(mediacount=120, followers=900, followees=400,
+                    is_private=0, is_business_account=1, has_public_story=0)
+    zooms = [{'xaxis.range[0]': '2021-{:02d}-01'.format(month),
+              'xaxis.range[1]': '2021-{:02d}-15'.format(month)}
+             for month in range(1, 5)] + [{'xaxis.autorange': True}]
+    requests = {
+        'render_content': [_callback_payload(
+            [('tabs-content-template', 'children')],
+            [('tabs-template', 'value', 'tab-{}-template'.format(i))])
+            for i in range(1, 8)],
+        'radio_results': [_callback_payload(
+            [('page-2-graphic', 'figure')],
+            [('page-2-radios', 'value', choice)]) for choice in choices],
+        'page_3_search': [_callback_payload(
+            [('page-3-dropdown', 'options')],
+            [('page-3-dropdown', 'search_value', text)],
+            [('page-3-dropdown', 'value', None)])
+            for text in ['', 'a', 'us', 'user_1', 'zz']],
+        'page_3_profile': [_callback_payload(
+            [('page-3-content', 'children'),
+             ('follower-characteristics', 'children'),
+             ('follower_probability', 'children')],
+            [('page-3-dropdown', 'value', i)]) for i in range(5)],
+        'growth_zoom': [_callback_payload(
+            [('growth-graph', 'figure')],
+            [('growth-graph', 'relayoutData', relayout)])
+            for relayout in zooms],
+        'discovery_zoom': [_callback_payload(
+            [('discovery-graph', 'figure')],
+            [('discovery-graph', 'relayoutData', relayout)])
+            for relayout in zooms],
+        'engagement_results': [_callback_payload(
+            [('engagement-heatmap', 'figure'),
+             ('engagement-best-slots', 'children')],
+            [('engagement-types', 'value', types),
+             ('engagement-buckets', 'value', buckets),
+             ('engagement-metric', 'value', metric)])
+            for types, buckets, metric in [
+                ([], [], 'likes'), (['GraphVideo'], [], 'comments'),
+                (['GraphSidecar'], ['3-5', '6-10'], 'engagement')]],
+        'update_output': [_callback_payload(
+            [('prediction_output', 'children')],
+            [('submit_val', 'n_clicks', i)],
+            [(name, 'value', value + i * (value > 1))
+             for name, value in features.items()])
+            for i in range(5)],
+    }
+
+    client = app.server.test_client()
+
+    def call(payloads):
+        for payload in payloads:
+            response = client.post('/_dash-update-component', json=payload)
+            if response.status_code not in (200, 204):
+                raise RuntimeError('{} returned {}'.format(
+                    payload['output'], response.status_code))
+
+    result = {}
+    for name, payloads in requests.items():
+        first = timeit(lambda: call(payloads[:1]), 1)
+        warm = timeit(lambda: call(payloads), repeat)
+        result[name] = summary([s / len(payloads) for s in warm],
+                               first_call=first[0])
+    return result
+
+
+def scoring(root, repeat):
+    """Score one profile and a batch through the dashboard's model, without
+    the result cache."""
+    import numpy as np
+    import predict
+
+    predict.load_model()
+    rng = np.random.default_rng(0)
+    rows = np.column_stack([
+        rng.integers(0, 2, 10000), rng.integers(0, 3000, 10000),
+        rng.integers(0, 20000, 10000), rng.integers(0, 8000, 10000),
+        rng.integers(0, 2, 10000), rng.integers(0, 2, 10000)]).tolist()
+    single = timeit(lambda: [predict.predict_proba([row])
+                             for row in rows[:100]], repeat)
+    batch = timeit(lambda: predict.predict_proba(rows), repeat)
+    return {'single': summary([s / 100 for s in single]),
+            'batch': summary(batch, rows=len(rows))}
+
+
+def forecast_fit(root, repeat):
+    """AutoARIMA order search and fit on the follower series."""
+    import forecast
+
+    series = forecast.load_series()
+    fit = timeit(lambda: forecast.fit(series), repeat)
+    return {'fit': summary(fit, days=len(series))}
+
+
+# name: (folder of the module under notebooks/, function)
+cases = {
+    'profile_ingest': ('gain-followers', profile_ingest),
+    'follower_labelling': ('gain-followers', follower_labelling),
+    'batch_scoring': ('gain-followers', batch_scoring),
+    'post_features': ('posts', post_features),
+    'engagement_cube': ('posts', engagement_cube),
+    'app_cold_start': ('dash-app', app_cold_start),
+    'callbacks': ('dash-app', callbacks),
+    'scoring': ('dash-app', scoring),
+    'forecast_fit': ('dash-app', forecast_fit),
+}
+
+
+def run_in_tree(root, folder, script, args, capture=True):
+    """Run a script in a fresh interpreter, in `folder` of the tree at
+    `root`, with the modules of `folder` of this checkout importable."""
+    cwd = Path(root).resolve().joinpath('notebooks', folder)
+    cwd.mkdir(parents=True, exist_ok=True)
+    env = os.environ.copy()
+    env['PYTHONPATH'] = os.pathsep.join(
+        [str(repo_path.joinpath('notebooks', folder))]
+        + ([env['PYTHONPATH']] if env.get('PYTHONPATH') else []))
+    result = subprocess.run(
+        [sys.executable, os.path.abspath(script)] + list(args),
+        cwd=str(cwd), env=env, check=True, text=True,
+        stdout=subprocess.PIPE if capture else None)
+    return result.stdout
+
+
+def run_case(root, name, repeat=3):
+    """Timings of one case, run in its own interpreter."""
+    output = run_in_tree(root, cases[name][0], __file__,
+                         [name, '--repeat', str(repeat), '--root',
+                          str(Path(root).resolve())])
+    return json.loads(output.strip().splitlines()[-1])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run one benchmark case.')
+    parser.add_argument('case', choices=sorted(cases))
+    parser.add_argument('--root', required=True, type=Path,
+                        help='synthetic tree written by generate.py')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    result = cases[args.case][1](args.root, args.repeat)
+    print(json.dumps(result))
@@ -0,0 +1,301 @@
+"""Synthetic data for the benchmarks, in the layout the notebooks read.
+
+The real data lives outside the repository (``filenames.data_path``), so
+the benchmarks run on a generated tree with the same schemas::
+
+    <root>/data/raw/profile/profile_<n>.csv           scraped profiles; part
+                                                      of the users re-scraped
+    <root>/data/raw/traveltrackie/users/followers.txt
+    <root>/data/raw/traveltrackie/chunks/chunk_<n>.csv
+                                                      candidate pool to score
+    <root>/data/raw/post/post_<n>.csv                 posts of the profiles
+    <root>/notebooks/dash-app/resources/              profile_growth.csv, the
+                                                      forecast, a bundle
+                                                      trained on the profiles
+                                                      and the engagement cube
+
+The model bundle is written by ``train.py`` itself (reduced grid), the
+forecast by ``forecast.py`` and the cube by ``engagement_cube.py``, all run
+inside the tree. Everything is
+seeded, so a scale always produces the same data.
+
+Usage::
+
+    python generate.py --scale small
+    python generate.py --profiles 50000 --posts 200000 --root /tmp/bench
+"""
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import cases
+
+scales = {
+    'small': dict(profiles=20000, files=4, candidates=50000, posts=50000,
+                  days=400),
+    'medium': dict(profiles=200000, files=8, candidates=500000,
+                   posts=500000, days=730),
+    'large': dict(profiles=1000000, files=16, candidates=2000000,
+                  posts=2000000, days=1095),
+}
+
+# share of profile rows that are re-scrapes of a user already written
+duplicate_share = 0.2
+
+business_categories = ['', '', '', 'Creators & Celebrities',
+                       'Personal Goods & General Merchandise Stores',
+                       'Restaurants', 'Travel', 'Publishers', 'Local Events']
+words = ['travel', 'photo', 'life', 'love', 'nature', 'food', 'adventure',
+         'blogger', 'explore', 'dublin', 'ireland', 'coffee', 'music',
+         'reise', 'viaje', 'voyage', 'fotografia', 'natur']
+hashtags = ['travel', 'wanderlust', 'travelgram', 'instatravel', 'nature',
+            'photography', 'explore', 'adventure', 'ireland', 'dublin',
+            'beach', 'mountains', 'sunset', 'food', 'foodie', 'travelblogger',
+            'roadtrip', 'hiking', 'landscape', 'city']
+# 1x1 transparent PNG standing in for the logo of the Introduction tab
+logo = bytes.fromhex(
+    '89504e470d0a1a0a0000000d4948445200000001000000010806000000'
+    '1f15c4890000000d49444154789c6360000002000005000100e2216bc0'
+    '0000000049454e44ae426082')
+
+
+def _usernames(rng, n, offset=0):
+    suffix = rng.integers(0, 10000, n).astype(str)
+    return pd.Series(np.arange(offset, offset + n).astype(str)).radd(
+        'user_') + '_' + suffix
+
+
+def _bools(rng, n, p):
+    return np.where(rng.random(n) < p, 'True', 'False')
+
+
+def _biographies(rng, n):
+    lengths = rng.integers(0, 8, n)
+    tokens = rng.choice(words, lengths.sum())
+    return pd.Series(np.split(tokens, np.cumsum(lengths)[:-1])) \
+        .str.join(' ').to_numpy()
+
+
+def profile_frame(rng, userids, usernames):
+    """Profiles with the columns of the scraper's profile CSVs."""
+    n = len(userids)
+    followers = np.round(rng.lognormal(5.5, 1.6, n)).astype(int)
+    followees = np.round(rng.lognormal(6.0, 1.1, n)).astype(int)
+    business = _bools(rng, n, 0.25)
+    return pd.DataFrame({
+        'userid': userids,
+        'username': usernames,
+        'full_name': usernames.str.replace('_', ' ').str.title(),
+        'biography': _biographies(rng, n),
+        'external_url': np.where(rng.random(n) < 0.2,
+                                 'https://example.com', ''),
+        'is_private': _bools(rng, n, 0.35),
+        'is_verified': _bools(rng, n, 0.01),
+        'is_business_account': business,
+        'business_category_name': np.where(
+            business == 'True', rng.choice(business_categories[3:], n), ''),
+        'has_public_story': _bools(rng, n, 0.2),
+        'mediacount': np.round(rng.lognormal(4.0, 1.3, n)).astype(int),
+        'igtvcount': rng.poisson(0.3, n),
+        'followers': followers,
+        'followees': followees,
+        'profile_pic_url': 'https://example.com/pic.jpg',
+        'followed_by_viewer': 'False',
+        'follows_viewer': 'False',
+        'blocked_by_viewer': 'False',
+        'has_blocked_viewer': 'False',
+        'requested_by_viewer': 'False',
+        'has_requested_viewer': 'False',
+    })
+
+
+def follow_probability(df):
+    """Chance that a profile follows back: higher for accounts following
+    many and followed by few, like the real labels."""
+    score = 0.8 * np.log1p(df['followees']) - 0.6 * np.log1p(df['followers']) \
+        + 0.5 * (df['is_private'] == 'False') - 1.0
+    return 1 / (1 + np.exp(-score))
+
+
+def write_profiles(root, rng, profiles, files):
+    """Profile CSVs with re-scraped duplicates and followers.txt.
+
+    Returns:
+        DataFrame of the userid and username of every profile
+    """
+    folder = root.joinpath('data', 'raw', 'profile')
+    folder.mkdir(parents=True, exist_ok=True)
+    userids = pd.unique(rng.integers(10 ** 9, 6 * 10 ** 10, 2 * profiles))
+    userids = userids[:profiles]
+    usernames = _usernames(rng, profiles)
+    df = profile_frame(rng, userids, usernames)
+    followers = df['username'][rng.random(profiles)
+                               < follow_probability(df)]
+
+    written = 0
+    for i, part in enumerate(np.array_split(np.arange(profiles), files)):
+        rows = df.iloc[part]
+        if written:
+            # re-scrape users of earlier files with drifted counts
+            again = df.iloc[rng.integers(0, written, int(
+                len(part) * duplicate_share))].copy()
+            again['followers'] += rng.integers(-5, 20, len(again))
+            rows = pd.concat([rows, again])
+        rows.sample(frac=1, random_state=i).to_csv(
+            folder.joinpath('profile_{}.csv'.format(i)), index=False)
+        written += len(part)
+
+    users = root.joinpath('data', 'raw', 'traveltrackie', 'users')
+    users.mkdir(parents=True, exist_ok=True)
+    followers.to_csv(users.joinpath('followers.txt'), index=False,
+                     header=False)
+    return df[['userid', 'username']]
+
+
+def write_candidates(root, rng, candidates, chunk_size=50000):
+    """Candidate profile chunks for batch scoring."""
+    folder = root.joinpath('data', 'raw', 'traveltrackie', 'chunks')
+    folder.mkdir(parents=True, exist_ok=True)
+    for i, start in enumerate(range(0, candidates, chunk_size)):
+        n = min(chunk_size, candidates - start)
+        userids = np.arange(start, start + n) + 7 * 10 ** 10
+        profile_frame(rng, userids, _usernames(rng, n, 10 ** 8 + start)) \
+            .to_csv(folder.joinpath('chunk_{}.csv'.format(i)), index=False)
+
+
+def _lists(rng, n, vocabulary, mean):
+    lengths = rng.poisson(mean, n)
+    # Zipf-like popularity of the items
+    weights = 1 / np.arange(1, len(vocabulary) + 1)
+    items = rng.choice(vocabulary, lengths.sum(), p=weights / weights.sum())
+    quoted = pd.Series(items).radd("'") + "'"
+    return '[' + pd.Series(np.split(quoted.to_numpy(),
+                                    np.cumsum(lengths)[:-1])) \
+        .str.join(', ') + ']'
+
+
+def write_posts(root, rng, posts, profiles, files=4):
+    """Post CSVs of the profiles, with a few posts scraped twice."""
+    folder = root.joinpath('data', 'raw', 'post')
+    folder.mkdir(parents=True, exist_ok=True)
+    owners = profiles.iloc[rng.integers(0, len(profiles), posts)]
+    typename = rng.choice(['GraphImage', 'GraphVideo', 'GraphSidecar'], posts,
+                          p=[0.6, 0.15, 0.25])
+    is_video = typename == 'GraphVideo'
+    date = pd.Timestamp('2022-02-04') - pd.to_timedelta(
+        rng.integers(0, 3 * 365 * 86400, posts), unit='s')
+    mentioned = profiles['username'].sample(
+        min(len(profiles), 500), random_state=0).to_numpy()
+    df = pd.DataFrame({
+        'url': 'https://www.instagram.com/p/' + pd.Series(
+            rng.integers(0, 2 ** 62, posts)).map('{:x}'.format) + '/',
+        'owner_id': owners['userid'].to_numpy(),
+        'owner_username': owners['username'].to_numpy(),
+        'date_utc': date.strftime('%Y-%m-%d %H:%M:%S'),
+        'typename': typename,
+        'is_video': np.where(is_video, 'True', 'False'),
+        'video_view_count': np.where(
+            is_video, rng.integers(100, 50000, posts).astype(float), np.nan),
+        'likes': np.round(rng.lognormal(4.0, 1.4, posts)).astype(int),
+        'comments': rng.poisson(6, posts),
+        'is_sponsored': np.where(rng.random(posts) < 0.02, 'True', 'False'),
+        'caption_hashtags': _lists(rng, posts, hashtags, 4),
+        'caption_mentions': _lists(rng, posts, mentioned, 0.3),
+        'tagged_users': _lists(rng, posts, mentioned, 0.2),
+        'days_ago': (pd.Timestamp('2022-02-04') - date).days,
+    })
+    again = df.sample(frac=0.02, random_state=1)
+    df = pd.concat([df, again]).sample(frac=1, random_state=2)
+    for i, part in enumerate(np.array_split(np.arange(len(df)), files)):
+        df.iloc[part].to_csv(folder.joinpath('post_{}.csv'.format(i)),
+                             index=False)
+
+
+def write_growth(root, rng, days):
+    """profile_growth.csv of the dashboard, newest day first."""
+    resources = root.joinpath('notebooks', 'dash-app', 'resources')
+    resources.mkdir(parents=True, exist_ok=True)
+    dates = pd.date_range(end='2022-02-04', periods=days, freq='D')
+    t = np.arange(days)
+    weekly = 1 + 0.3 * np.sin(2 * np.pi * t / 7)
+    gained = np.maximum(rng.normal(4, 3, days) * weekly, -5)
+    df = pd.DataFrame({
+        'Date': dates.strftime('%Y-%m-%d'),
+        'Followers': np.round(1000 + np.cumsum(gained)).astype(int),
+        'Impressions': rng.poisson(900 * weekly),
+        'Reach': rng.poisson(300 * weekly)})
+    df.iloc[::-1].to_csv(resources.joinpath('profile_growth.csv'),
+                         index=False)
+    resources.joinpath('clean_instagram_logo2.png').write_bytes(logo)
+
+
+def train_stage(root):
+    """Train a bundle on the synthetic profiles with train.py (run inside
+    the gain-followers folder of the tree)."""
+    import train
+
+    # one point of the notebook's grid, the data pipeline is unchanged
+    train.param_grid = {'n_estimators': [10], 'max_features': ['sqrt'],
+                        'max_depth': [8], 'criterion': ['gini']}
+    resources = root.joinpath('notebooks', 'dash-app', 'resources')
+    train.run(train.load_dataset(), outlier='none', cv=2,
+              version='synthetic', path=resources.joinpath('artifacts'))
+
+
+def generate(root, profiles, files, candidates, posts, days, seed=0):
+    """Write the synthetic tree under `root`."""
+    root = Path(root)
+    if root.joinpath('generated.json').exists():
+        raise FileExistsError('{} is already generated'.format(root))
+    rng = np.random.default_rng(seed)
+    start = time.perf_counter()
+    users = write_profiles(root, rng, profiles, files)
+    write_candidates(root, rng, candidates)
+    write_posts(root, rng, posts, users)
+    write_growth(root, rng, days)
+    cases.run_in_tree(root, 'gain-followers', __file__,
+                      ['--stage', 'train', '--root', str(root.resolve())],
+                      capture=False)
+    cases.run_in_tree(root, 'dash-app', cases.repo_path.joinpath(
+        'notebooks', 'dash-app', 'forecast.py'), [], capture=False)
+    cases.run_in_tree(root, 'posts', cases.repo_path.joinpath(
+        'notebooks', 'posts', 'engagement_cube.py'),
+        ['--resources', str(root.resolve().joinpath(
+            'notebooks', 'dash-app', 'resources'))], capture=False)
+    params = dict(profiles=profiles, files=files, candidates=candidates,
+                  posts=posts, days=days, seed=seed)
+    with open(root.joinpath('generated.json'), 'w') as f:
+        json.dump(params, f, indent=1)
+    print('Generated {} in {:.0f}s'.format(root, time.perf_counter() - start))
+    return params
+
+
+def default_root(scale):
+    return Path(__file__).resolve().parent.joinpath('data', scale)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Generate synthetic data for the benchmarks.')
+    parser.add_argument('--scale', choices=sorted(scales), default='small')
+    parser.add_argument('--root', type=Path,
+                        help='output folder (default: benchmarks/data/SCALE)')
+    for name in scales['small']:
+        parser.add_argument('--' + name, type=int,
+                            help='override the {} of the scale'.format(name))
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--stage', choices=['train'], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.stage == 'train':
+        train_stage(args.root)
+        sys.exit()
+    params = dict(scales[args.scale])
+    params.update({name: getattr(args, name) for name in params
+                   if getattr(args, name) is not None})
+    generate(args.root or default_root(args.scale), seed=args.seed, **params)
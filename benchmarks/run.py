@@ -0,0 +1,153 @@
+"""Run the benchmark suite and store the timings by commit.
+
+Generates the synthetic tree of the scale on first use, runs every case of
+``cases.py`` in its own interpreter and writes one JSON file per run to
+``benchmarks/results/<commit>[-dirty]-<scale>.json``, with the environment
+(Python and library versions, CPU count) next to the timings. Two result
+files can then be compared case by case; everything runs offline.
+
+Usage::
+
+    python run.py                          # all cases, small scale
+    python run.py --scale medium --repeat 5
+    python run.py --case callbacks --case scoring
+    python run.py --compare results/abc1234-small.json \
+        results/def5678-small.json
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime
+from importlib import metadata
+from pathlib import Path
+
+import cases
+import generate
+
+results_path = Path(__file__).resolve().parent.joinpath('results')
+
+# libraries whose version is recorded with the results
+libraries = ['numpy', 'pandas', 'scikit-learn', 'scipy', 'dash', 'flask',
+             'pyarrow', 'pmdarima']
+
+
+def _git(*args):
+    try:
+        return subprocess.run(['git'] + list(args), cwd=str(cases.repo_path),
+                              check=True, capture_output=True,
+                              text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def commit():
+    """Short hash of HEAD, with -dirty when the tree has local changes."""
+    head = _git('rev-parse', '--short', 'HEAD') or 'unknown'
+    dirty = _git('status', '--porcelain', '--untracked-files=no')
+    return head + ('-dirty' if dirty else '')
+
+
+def environment():
+    versions = {}
+    for name in libraries:
+        try:
+            versions[name] = metadata.version(name)
+        except metadata.PackageNotFoundError:
+            versions[name] = None
+    return {'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(), 'libraries': versions}
+
+
+def run(scale='small', root=None, names=None, repeat=3):
+    """Run the cases and write the results file.
+
+    Returns:
+        path of the results file
+    """
+    root = Path(root or generate.default_root(scale))
+    if not root.joinpath('generated.json').exists():
+        generate.generate(root, **generate.scales[scale])
+    with open(root.joinpath('generated.json')) as f:
+        data = json.load(f)
+
+    results = {}
+    for name in names or cases.cases:
+        start = time.perf_counter()
+        try:
+            results[name] = cases.run_case(root, name, repeat)
+        except subprocess.CalledProcessError as e:
+            results[name] = {'error': 'exit status {}'.format(e.returncode)}
+        print('{:<20} {:6.1f}s'.format(name, time.perf_counter() - start))
+
+    output = {'commit': commit(),
+              'date': datetime.now().isoformat(timespec='seconds'),
+              'scale': scale, 'data': data, 'repeat': repeat,
+              'environment': environment(), 'results': results}
+    results_path.mkdir(exist_ok=True)
+    path = results_path.joinpath('{}-{}.json'.format(output['commit'], scale))
+    with open(path, 'w') as f:
+        json.dump(output, f, indent=1)
+    return path
+
+
+def _medians(results):
+    """{(case, measurement): median seconds} of a results file."""
+    medians = {}
+    for case, measurements in results['results'].items():
+        for name, values in measurements.items():
+            if isinstance(values, dict) and 'median' in values:
+                medians[case, name] = values['median']
+    return medians
+
+
+def compare(base_path, head_path, threshold=0.1):
+    """Print the median timings of two result files side by side, flagging
+    changes larger than `threshold` (relative)."""
+    with open(base_path) as f:
+        base = json.load(f)
+    with open(head_path) as f:
+        head = json.load(f)
+    before, after = _medians(base), _medians(head)
+    print('{:<45} {:>10} {:>10} {:>8}'.format(
+        'case / measurement', base['commit'], head['commit'], 'change'))
+    regressions = 0
+    for key in sorted(set(before) | set(after)):
+        old, new = before.get(key), after.get(key)
+        if old is None or new is None:
+            change, flag = '', ''
+        else:
+            ratio = new / old if old else float('inf')
+            change = '{:+.0%}'.format(ratio - 1)
+            flag = ' slower' if ratio > 1 + threshold else \
+                ' faster' if ratio < 1 - threshold else ''
+            regressions += flag == ' slower'
+        print('{:<45} {:>10} {:>10} {:>8}{}'.format(
+            ' / '.join(key), '' if old is None else '{:.4f}'.format(old),
+            '' if new is None else '{:.4f}'.format(new), change, flag))
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Run the benchmark suite on synthetic data.')
+    parser.add_argument('--scale', choices=sorted(generate.scales),
+                        default='small')
+    parser.add_argument('--root', type=Path,
+                        help='synthetic tree (default: benchmarks/data/SCALE)')
+    parser.add_argument('--case', action='append', choices=sorted(cases.cases),
+                        help='run only this case (repeatable)')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--compare', nargs=2, metavar=('BASE', 'HEAD'),
+                        help='compare two results files instead of running')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='relative change flagged by --compare')
+    args = parser.parse_args()
+
+    if args.compare:
+        sys.exit(1 if compare(*args.compare, args.threshold) else 0)
+    print('Wrote', run(args.scale, args.root, args.case, args.repeat))
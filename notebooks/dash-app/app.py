@@ -2,16 +2,18 @@ import dash
 from dash import dcc
 from dash import html
 from dash.dependencies import Input, Output, State
+from dash.exceptions import PreventUpdate
 import plotly.graph_objs as go
 import pandas as pd
 import numpy as np
-import pickle
-import joblib
-from tabs import tab_1, tab_2, tab_3, tab_4, tab_5
+from tabs import tab_1, tab_2, tab_3, tab_4, tab_5, tab_6, tab_7
 from utils import display_eval_metrics
-
-
-df=pd.read_csv('resources/final_probs.csv')
+import data
+import downsample
+import memory
+import metrics
+import predict
+import profile_search
 
 
 ## Instantiante Dash
@@ -21,11 +23,12 @@ server = app.server
 app.config['suppress_callback_exceptions'] = True
 app.title='Instagram Growth Strategy'
 
-# Load Preprocess
-preprocess = joblib.load('resources/preprocess.joblib')
-### load ML model ###########################################
-with open('resources/final_model.pkl', 'rb') as f:
-    model = pickle.load(f)
+# JSON prediction route for other tools: POST /api/predict
+predict.init_app(server)
+# resident memory of the worker: GET /api/memory
+memory.init_app(server)
+# latency histograms of the callbacks, inference and loads: GET /metrics
+metrics.init_app(server)
 
 
 ## Layout
@@ -36,7 +39,9 @@ app.layout = html.Div([
         dcc.Tab(label='Time Series', value='tab-2-template'),
         dcc.Tab(label='Model Evaluation', value='tab-3-template'),
         dcc.Tab(label='Testing Results', value='tab-4-template'),
-        dcc.Tab(label='User Inputs', value='tab-5-template')
+        dcc.Tab(label='User Inputs', value='tab-5-template'),
+        dcc.Tab(label='Best Time to Post', value='tab-6-template'),
+        dcc.Tab(label='Drift', value='tab-7-template')
         
     ]),
     html.Div(id='tabs-content-template')
@@ -47,53 +52,82 @@ app.layout = html.Div([
 
 @app.callback(Output('tabs-content-template', 'children'),
               [Input('tabs-template', 'value')])
+@metrics.timed('callback')
 def render_content(tab):
     if tab == 'tab-1-template':
-        return tab_1.tab_1_layout
+        return tab_1.layout()
     elif tab == 'tab-2-template':
-        return tab_2.tab_2_layout
+        return tab_2.layout()
     elif tab == 'tab-3-template':
-        return tab_3.tab_3_layout
+        return tab_3.layout()
     elif tab == 'tab-4-template':
-        return tab_4.tab_4_layout
+        return tab_4.layout()
     elif tab == 'tab-5-template':
-        return tab_5.tab_5_layout
+        return tab_5.layout()
+    elif tab == 'tab-6-template':
+        return tab_6.layout()
+    elif tab == 'tab-7-template':
+        return tab_7.layout()
+
+# Time Series graphs: re-query the visible range at full resolution on zoom
+@app.callback(Output('growth-graph', 'figure'),
+              [Input('growth-graph', 'relayoutData')])
+@metrics.timed('callback')
+def growth_zoom(relayout_data):
+    visible = downsample.zoom_range(relayout_data)
+    if visible is None:
+        raise PreventUpdate
+    return tab_2.growth_figure(data.profile_growth(), *visible)
+
+
+@app.callback(Output('discovery-graph', 'figure'),
+              [Input('discovery-graph', 'relayoutData')])
+@metrics.timed('callback')
+def discovery_zoom(relayout_data):
+    visible = downsample.zoom_range(relayout_data)
+    if visible is None:
+        raise PreventUpdate
+    return tab_2.discovery_figure(data.profile_growth(), *visible)
 
 # Tab 2 callbacks
 
 @app.callback(Output('page-2-graphic', 'figure'),
               [Input('page-2-radios', 'value')])
+@metrics.timed('callback')
 def radio_results(value):
     return display_eval_metrics(value)
 
 # Tab 3 callback # 1
-@app.callback(Output('page-3-content', 'children'),
-              [Input('page-3-dropdown', 'value')])
-def page_3_dropdown(value):
-    name=df.loc[value, 'username']
-    return f'You have selected "{name}"'
-
-# Tab 3 callback # 2
-@app.callback(Output('follower_probability', 'children'),
-              [Input('page-3-dropdown', 'value')])
-
-def page_3_follower(value):
-    follower=df.loc[value, 'follower_probability']
-    actual = df.loc[value,'actual']
-    follower=round(follower*100)
-    return f'Predicted probability of following is {follower}%, Actual status is {actual}'
+@app.callback(Output('page-3-dropdown', 'options'),
+              [Input('page-3-dropdown', 'search_value')],
+              [State('page-3-dropdown', 'value')])
+@metrics.timed('callback')
+def page_3_search(search_value, value):
+    search=profile_search.profile_search()
+    if not search_value:
+        # keep the selected profile in the options so its label stays shown
+        return search.options([] if value is None else [value])
+    return search.options(search.search(search_value))
 
 # Tab 3 callback # 2
-@app.callback(Output('follower-characteristics', 'children'),
+@app.callback([Output('page-3-content', 'children'),
+               Output('follower-characteristics', 'children'),
+               Output('follower_probability', 'children')],
               [Input('page-3-dropdown', 'value')])
-def page_3_characteristics(value):
-    mydata=df.drop(['actual', 'follower_probability', 'username'], axis=1)
-    mydata=df[['is_private', 'mediacount', 'followers', 'followees', 'is_business_account', 'has_public_story']]
-    return html.Table(
-        [html.Tr([html.Th(col) for col in mydata.columns])] +
-        [html.Tr([
-            html.Td(mydata.iloc[value][col]) for col in mydata.columns
-        ])]
+@metrics.timed('callback')
+def page_3_profile(value):
+    if value is None:
+        raise PreventUpdate
+    record=profile_search.profile_record(value)
+    follower=round(record['follower_probability']*100)
+    cols=profile_search.characteristics
+    return (
+        f'You have selected "{record["username"]}"',
+        html.Table(
+            [html.Tr([html.Th(col) for col in cols])] +
+            [html.Tr([html.Td(record[col]) for col in cols])]
+        ),
+        f'Predicted probability of following is {follower}%, Actual status is {record["actual"]}',
     )
 
 # Tab 4 Callback # 1
@@ -103,30 +137,41 @@ def page_3_characteristics(value):
               State('is_private', 'value'),
               State('is_business_account', 'value'),
               State('has_public_story', 'value'))
+@metrics.timed('callback')
 def update_output(n_clicks, mediacount, followers, followees, is_private,
                   is_business_account, has_public_story):
-    inputs = [
-        mediacount, followers, followees, is_private, is_business_account,
-        has_public_story
-    ]
-    keys = [
-        'mediacount', 'followers', 'followees', 'is_private',
-        'is_business_account', 'has_public_story'
-    ]
-    dict6 = dict(zip(keys, inputs))
-    df = pd.DataFrame([dict6])
-    # drop unnecessary columns, and reorder columns to match the final model.
-
-    df = df[[
-        'is_private', 'mediacount', 'followers', 'followees',
-        'is_business_account', 'has_public_story'
-    ]]
-
-    df_new = preprocess.transform(df)
-    prob = model.predict_proba(df_new)
-    final_prob = round(float(prob[0][1]) * 100, 1)
+    # reorder the inputs to match the final model.
+    profile = dict(mediacount=mediacount, followers=followers,
+                   followees=followees, is_private=is_private,
+                   is_business_account=is_business_account,
+                   has_public_story=has_public_story)
+    prob = predict.predict_profiles(
+        [[profile[col] for col in predict.features]])
+    final_prob = round(prob[0] * 100, 1)
     return (f'Probability of Survival: {final_prob}%')
 
+# Tab 6 callback
+@app.callback([Output('engagement-heatmap', 'figure'),
+               Output('engagement-best-slots', 'children')],
+              [Input('engagement-types', 'value'),
+               Input('engagement-buckets', 'value'),
+               Input('engagement-metric', 'value')])
+@metrics.timed('callback')
+def engagement_results(typenames, buckets, metric):
+    cube=data.engagement_cube()
+    return (tab_6.heatmap_figure(cube, typenames, buckets, metric),
+            tab_6.slots_table(cube, typenames, buckets, metric))
+
+# Tab 7 callback
+@app.callback([Output('drift-histogram', 'figure'),
+               Output('drift-history', 'figure')],
+              [Input('drift-feature', 'value')])
+@metrics.timed('callback')
+def drift_results(feature):
+    state=data.drift()
+    return (tab_7.histogram_figure(state, feature),
+            tab_7.history_figure(state, feature))
+
 
 
 ####### Run the app #######
@@ -0,0 +1,71 @@
+"""Break down the dashboard's boot cost by module.
+
+Runs ``import app`` in a fresh interpreter with ``-X importtime`` and sums the
+import time per top-level package, then times the work that is deferred to
+first use: building each tab layout and loading the model.
+
+Usage::
+
+    python boot_report.py            # run from the dash-app folder
+    python boot_report.py --top 30
+"""
+import argparse
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+
+def import_times(module='app'):
+    """Self import time in seconds per top-level package, measured in a
+    fresh interpreter, and the total wall time of the import."""
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c',
+                             'import ' + module],
+                            capture_output=True, text=True, check=True)
+    wall = time.perf_counter() - start
+
+    totals = defaultdict(float)
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, _, name = line[len('import time:'):].split('|')
+        totals[name.strip().split('.')[0]] += int(self_us) / 1e6
+    return dict(totals), wall
+
+
+def first_use_times():
+    """Seconds spent building each tab layout and loading the model."""
+    import app
+    import predict
+
+    timings = {}
+    for tab in (app.tab_1, app.tab_2, app.tab_3, app.tab_4, app.tab_5,
+                app.tab_6, app.tab_7):
+        start = time.perf_counter()
+        tab.layout()
+        timings[tab.__name__ + '.layout()'] = time.perf_counter() - start
+    start = time.perf_counter()
+    predict.load_model()
+    timings['predict.load_model()'] = time.perf_counter() - start
+    return timings
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Report the boot cost of the dashboard by module.')
+    parser.add_argument('--top', type=int, default=20,
+                        help='number of packages to list (default: 20)')
+    args = parser.parse_args()
+
+    totals, wall = import_times()
+    print('Boot: import app took {:.2f}s (interpreter included)'.format(wall))
+    print('{:<40}{:>10}'.format('package', 'seconds'))
+    for name, seconds in sorted(totals.items(), key=lambda item: -item[1])[
+            :args.top]:
+        print('{:<40}{:>10.3f}'.format(name, seconds))
+
+    print()
+    print('Deferred to first use:')
+    for name, seconds in first_use_times().items():
+        print('{:<40}{:>10.3f}'.format(name, seconds))
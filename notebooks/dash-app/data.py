@@ -0,0 +1,138 @@
+import json
+import os
+import sys
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+import metrics
+import shared_table
+
+# Data files are read on first use rather than at import time, so workers
+# start serving before any tab has been opened.
+
+# the engagement cube is queried with the code that builds it, in posts/
+posts_path = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                          os.pardir, 'posts')
+
+# versioned bundles written by gain-followers/train.py
+artifacts_path = os.path.join('resources', 'artifacts')
+
+# column order the preprocess transformer was fitted with
+features = ['is_private', 'mediacount', 'followers', 'followees',
+            'is_business_account', 'has_public_story']
+
+
+def artifact_version():
+    """Version of the training bundle in use, None without bundles."""
+    try:
+        with open(os.path.join(artifacts_path, 'LATEST')) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def resource_path(name):
+    """Path of a model artifact: from the latest training bundle when it
+    has the file, from resources/ otherwise."""
+    version = artifact_version()
+    if version is not None:
+        path = os.path.join(artifacts_path, version, name)
+        if os.path.exists(path):
+            return path
+    return os.path.join('resources', name)
+
+
+@lru_cache(maxsize=1)
+@metrics.timed('load', 'final_probs')
+def _final_probs_table(path, signature):
+    return shared_table.load(path)
+
+
+def final_probs_table():
+    """Testing dataset with the predicted follower probability, as
+    memory-mapped columns shared by every worker."""
+    path = resource_path('final_probs.csv')
+    signature = shared_table.source_signature(path)
+    return _final_probs_table(path, tuple(signature.values()))
+
+
+def final_probs():
+    """Private DataFrame copy of the testing dataset."""
+    return final_probs_table().to_frame()
+
+
+def growth_version():
+    """Changes whenever profile_growth.csv is rewritten."""
+    return os.stat('resources/profile_growth.csv').st_mtime_ns
+
+
+@lru_cache(maxsize=1)
+@metrics.timed('load', 'profile_growth')
+def _profile_growth(version):
+    df = pd.read_csv('resources/profile_growth.csv')
+    df['Date'] = pd.to_datetime(df['Date'])
+    return df
+
+
+def profile_growth():
+    """Daily followers, impressions and reach, newest day first."""
+    return _profile_growth(growth_version())
+
+
+def forecast_version():
+    """Changes whenever forecast.py publishes a new forecast."""
+    return os.stat('resources/forecast_df.csv').st_mtime_ns
+
+
+@lru_cache(maxsize=1)
+@metrics.timed('load', 'forecast')
+def _forecast(version):
+    return (pd.read_csv('resources/series_df.csv'),
+            pd.read_csv('resources/forecast_df.csv'))
+
+
+def forecast():
+    """Latest published (series_df, forecast_df) of the followers."""
+    return _forecast(forecast_version())
+
+
+def engagement_version():
+    """Changes whenever posts/engagement_cube.py publishes the cube."""
+    return os.stat('resources/engagement_cube.npz').st_mtime_ns
+
+
+@lru_cache(maxsize=1)
+@metrics.timed('load', 'engagement_cube')
+def _engagement_cube(version):
+    if posts_path not in sys.path:
+        sys.path.append(posts_path)
+    import engagement_cube
+    return engagement_cube.load('resources/engagement_cube.npz')
+
+
+def engagement_cube():
+    """Published engagement cube, an ``EngagementCube`` of
+    posts/engagement_cube.py: posts, likes and comments by hour, weekday,
+    post type and hashtag bucket."""
+    return _engagement_cube(engagement_version())
+
+
+def drift_version():
+    """Changes whenever gain-followers/batch_score.py writes the drift
+    state."""
+    return os.stat('resources/drift.json').st_mtime_ns
+
+
+@lru_cache(maxsize=1)
+@metrics.timed('load', 'drift')
+def _drift(version):
+    with open('resources/drift.json') as f:
+        return json.load(f)
+
+
+def drift():
+    """Drift state of the scored profiles: reference histograms, bin counts
+    of the recent days and their PSI and KS scores."""
+    return _drift(drift_version())
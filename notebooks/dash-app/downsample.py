@@ -0,0 +1,121 @@
+"""Shape-preserving downsampling of the time series graphs.
+
+Largest-Triangle-Three-Buckets (Steinarsson, 2013) keeps the first and last
+point and, for every bucket of points in between, the one that forms the
+largest triangle with the point kept in the previous bucket and the mean of
+the next bucket, so peaks and dips survive the reduction. ``view`` serves a
+column of ``profile_growth.csv`` between two dates at a point budget; its
+results are kept in a bounded LRU cache keyed by the file version, the
+column, the range and the budget, so re-zooming to a range already seen is
+free.
+
+Usage::
+
+    x, y = downsample.view('Followers', start, end, points=1000)
+"""
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+import data
+
+# default number of points sent to the browser per trace
+points = 1000
+# downsampled views kept in memory
+cache_size = 128
+
+
+def lttb(x, y, n_out):
+    """Indices of the `n_out` points LTTB keeps of the series (x, y).
+
+    Args:
+        x (array): increasing x values, as numbers
+        y (array): y values
+        n_out (int): number of points to keep, at least 3
+    Returns:
+        sorted integer array of the kept positions
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    # bucket edges of the points between the first and the last one
+    every = (n - 2) / (n_out - 2)
+    edges = (np.arange(n_out - 1) * every).astype(np.int64) + 1
+    # mean of every bucket, the third corner of the triangles
+    sums = np.add.reduceat(np.column_stack([x, y])[1:n - 1], edges[:-1] - 1)
+    means = sums / np.diff(edges)[:, None]
+
+    kept = np.empty(n_out, dtype=np.int64)
+    kept[0], kept[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        if i + 1 < n_out - 2:
+            cx, cy = means[i + 1]
+        else:
+            cx, cy = x[-1], y[-1]
+        # twice the triangle areas, the constant factor does not matter
+        area = np.abs((x[a] - cx) * (y[lo:hi] - y[a])
+                      - (x[a] - x[lo:hi]) * (cy - y[a]))
+        a = lo + int(np.nanargmax(area)) if np.isfinite(area).any() else lo
+        kept[i + 1] = a
+    return kept
+
+
+@lru_cache(maxsize=8)
+def _series(version, column):
+    """Dates (int64 ns) and values of a profile_growth column, oldest
+    first, missing values dropped."""
+    df = data.profile_growth()
+    df = df[['Date', column]].dropna().sort_values('Date')
+    return (df['Date'].to_numpy(dtype='datetime64[ns]').astype(np.int64),
+            df[column].to_numpy(dtype=np.float64))
+
+
+@lru_cache(maxsize=cache_size)
+def _view(version, column, start, end, n_points):
+    x, y = _series(version, column)
+    lo = 0 if start is None else np.searchsorted(x, start, side='left')
+    hi = len(x) if end is None else np.searchsorted(x, end, side='right')
+    # one point on each side, so the line reaches the edges of the plot
+    lo, hi = max(lo - 1, 0), min(hi + 1, len(x))
+    x, y = x[lo:hi], y[lo:hi]
+    kept = lttb(x, y, n_points)
+    return x[kept].astype('datetime64[ns]'), y[kept]
+
+
+def view(column, start=None, end=None, points=points):
+    """Downsampled (dates, values) of a profile_growth column.
+
+    Args:
+        column (str): column of profile_growth.csv
+        start, end: visible date range, None for the start/end of the data
+        points (int): point budget of the view
+    """
+    def as_ns(value):
+        return None if value is None else pd.Timestamp(value).value
+
+    return _view(data.growth_version(), column, as_ns(start), as_ns(end),
+                 points)
+
+
+def zoom_range(relayout_data):
+    """Visible x range of a graph's relayoutData.
+
+    Returns:
+        (start, end) after a zoom or pan, (None, None) after a reset, and
+        None when the x range did not change
+    """
+    if not relayout_data:
+        return None
+    if relayout_data.get('xaxis.autorange'):
+        return None, None
+    if 'xaxis.range[0]' in relayout_data:
+        return (relayout_data['xaxis.range[0]'],
+                relayout_data['xaxis.range[1]'])
+    if 'xaxis.range' in relayout_data:
+        return tuple(relayout_data['xaxis.range'])
+    return None
@@ -0,0 +1,125 @@
+"""Incremental daily forecast of profile growth.
+
+The AutoARIMA model from ``forecast_followers/05_AutoArima.ipynb`` is fitted
+once and its state kept on disk. Each day, the days appended to
+``profile_growth.csv`` since the last run are fed to the fitted model with
+``update`` (a few optimizer steps from the current parameters, the order
+search is not repeated) and the forecast the dashboard shows is rewritten.
+The order is re-selected with a full refit only every ``refit_every`` days.
+
+Usage::
+
+    python forecast.py                 # update with the new days
+    python forecast.py --refit         # force a full refit
+    python forecast.py --column Reach  # another series of profile_growth.csv
+"""
+import argparse
+import os
+
+import joblib
+import pandas as pd
+
+store_path = os.path.join('resources', 'forecast')
+horizon = 7
+refit_every = 30
+
+
+def _state_path(name):
+    return os.path.join(store_path, name + '.joblib')
+
+
+def _write_csv(df, path):
+    tmp_path = path + '.tmp'
+    df.to_csv(tmp_path, index=False)
+    os.replace(tmp_path, path)
+
+
+def load_series(path='resources/profile_growth.csv', column='Followers'):
+    """Daily values of a profile_growth.csv column, oldest day first."""
+    df = pd.read_csv(path, usecols=['Date', column])
+    df['Date'] = pd.to_datetime(df['Date'])
+    return df.sort_values('Date').drop_duplicates('Date', keep='last') \
+        .set_index('Date')[column]
+
+
+def fit(series):
+    """Fit AutoARIMA on the whole series (order search included)."""
+    import pmdarima as pm
+    return pm.auto_arima(series.to_numpy(dtype=float),
+                         suppress_warnings=True, error_action='ignore')
+
+
+def load_state(name):
+    path = _state_path(name)
+    return joblib.load(path) if os.path.exists(path) else None
+
+
+def save_state(name, state):
+    os.makedirs(store_path, exist_ok=True)
+    tmp_path = _state_path(name) + '.tmp'
+    joblib.dump(state, tmp_path)
+    os.replace(tmp_path, _state_path(name))
+
+
+def update(series, name='Followers', refit=False):
+    """Bring the stored model of a series up to date and forecast.
+
+    Args:
+        series (Series): daily values indexed by date, oldest first
+        name (str): key of the series in the store
+        refit (bool): force a full refit instead of an incremental update
+    Returns:
+        (state, forecast) where forecast is a Series of the next `horizon`
+        days
+    """
+    state = load_state(name)
+    if state is not None and not refit:
+        new = series[series.index > state['last_date']]
+        if state['updates'] + len(new) >= refit_every:
+            refit = True
+        elif len(new):
+            state['model'].update(new.to_numpy(dtype=float))
+            state['last_date'] = new.index[-1]
+            state['updates'] += len(new)
+            state['forecast'] = None
+
+    if state is None or refit:
+        state = {'model': fit(series), 'last_date': series.index[-1],
+                 'updates': 0, 'forecast': None}
+
+    if state['forecast'] is None:
+        dates = pd.date_range(state['last_date'] + pd.Timedelta(days=1),
+                              periods=horizon, freq='D')
+        values = state['model'].predict(n_periods=horizon)
+        state['forecast'] = pd.Series(list(values), index=dates, name=name)
+    save_state(name, state)
+    return state, state['forecast']
+
+
+def publish(series, forecast, name='Followers'):
+    """Write the series and forecast CSVs read by the Time Series tab."""
+    series_df = series.rename(name).rename_axis('Date').reset_index()
+    forecast_df = forecast.rename(name).rename_axis('Date').reset_index()
+    suffix = '' if name == 'Followers' else '_' + name
+    _write_csv(series_df, os.path.join('resources',
+                                       'series_df{}.csv'.format(suffix)))
+    _write_csv(forecast_df, os.path.join('resources',
+                                         'forecast_df{}.csv'.format(suffix)))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Update the stored forecast with the new days of '
+        'profile_growth.csv.')
+    parser.add_argument('--column', default='Followers',
+                        help='profile_growth.csv column (default: Followers)')
+    parser.add_argument('--refit', action='store_true',
+                        help='refit the model from scratch')
+    args = parser.parse_args()
+
+    series = load_series(column=args.column)
+    state, forecast = update(series, args.column, args.refit)
+    publish(series, forecast, args.column)
+    print('{} forecast up to {} ({} incremental updates since the last '
+          'refit)'.format(args.column, forecast.index[-1].date(),
+                          state['updates']))
@@ -0,0 +1,58 @@
+"""Multi-worker deployment of the dashboard.
+
+Run from the dash-app folder::
+
+    gunicorn app:server
+
+The app is imported once in the master. Before forking, the master exports
+final_probs.csv and the forest model to memory-mappable arrays (if they are
+missing or older than their source) and maps the table, so every worker
+shares the same read-only pages instead of parsing and unpickling its own
+copy. ``python memory.py <master pid>`` reports what each worker holds.
+Threads do not survive the fork, so the prediction micro-batcher and the
+profiler start their threads in each worker on first use.
+
+The workers add up their latency metrics in ``DASH_METRICS_DIR`` (default
+``metrics/``), emptied when the server starts, so ``GET /metrics`` returns
+the totals of every worker whichever one answers.
+"""
+import multiprocessing
+import os
+
+# read by metrics.py when the app is imported
+os.environ.setdefault('DASH_METRICS_DIR', 'metrics')
+
+bind = os.environ.get('BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('WEB_CONCURRENCY',
+                             multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.environ.get('THREADS', 2))
+preload_app = True
+
+
+def on_starting(server):
+    import metrics
+
+    metrics.clear()
+
+
+def when_ready(server):
+    import data
+    import metrics
+    import predict
+
+    data.final_probs_table()
+    predict.export_arrays()
+    # the loads above are counted in the master's file
+    metrics.flush()
+
+
+def post_worker_init(worker):
+    import memory
+
+    worker.log.info('worker %s memory: %s', worker.pid, memory.usage())
+
+
+def worker_exit(server, worker):
+    import metrics
+
+    metrics.flush()
@@ -0,0 +1,105 @@
+"""Resident memory of the dashboard workers.
+
+RSS counts the shared, memory-mapped pages of the profile table and the model
+arrays in every worker, so the per-worker figure that sizes a node is the
+private memory; PSS splits the shared pages evenly between the processes
+that map them. Both come from ``/proc/<pid>/smaps_rollup`` (Linux); other
+systems only report the peak RSS of the current process.
+
+Usage::
+
+    python memory.py <gunicorn master pid>    # one line per worker
+    curl localhost:8000/api/memory            # the worker that answers
+"""
+import argparse
+import os
+import resource
+import sys
+
+from flask import jsonify
+
+fields = {'Rss': 'rss', 'Pss': 'pss', 'Shared_Clean': 'shared_clean',
+          'Shared_Dirty': 'shared_dirty', 'Private_Clean': 'private_clean',
+          'Private_Dirty': 'private_dirty'}
+
+
+def usage(pid='self'):
+    """Memory of a process in bytes: rss, pss, shared and private.
+
+    Args:
+        pid (int or str): process id, 'self' for the current process
+    Returns:
+        dict, with only 'peak_rss' where smaps_rollup is not available
+    """
+    try:
+        with open('/proc/{}/smaps_rollup'.format(pid)) as f:
+            lines = f.read().splitlines()
+    except OSError:
+        if pid != 'self':
+            raise
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # kilobytes on Linux, bytes on macOS
+        return {'peak_rss': peak if sys.platform == 'darwin' else peak * 1024}
+    memory = {}
+    for line in lines:
+        name, _, value = line.partition(':')
+        if name in fields:
+            memory[fields[name]] = int(value.split()[0]) * 1024
+    memory['shared'] = memory.pop('shared_clean', 0) \
+        + memory.pop('shared_dirty', 0)
+    memory['private'] = memory.pop('private_clean', 0) \
+        + memory.pop('private_dirty', 0)
+    return memory
+
+
+def children(pid):
+    """Process ids of the direct children of `pid` (the workers of a
+    gunicorn master)."""
+    pids = []
+    for task in os.listdir('/proc/{}/task'.format(pid)):
+        with open('/proc/{}/task/{}/children'.format(pid, task)) as f:
+            pids.extend(int(child) for child in f.read().split())
+    return sorted(pids)
+
+
+def report(master_pid):
+    """Rows of (role, pid, memory) for a master and its workers."""
+    rows = [('master', master_pid, usage(master_pid))]
+    rows.extend(('worker', pid, usage(pid)) for pid in children(master_pid))
+    return rows
+
+
+def memory_route():
+    """GET /api/memory: memory of the worker serving the request."""
+    return jsonify(pid=os.getpid(), **usage())
+
+
+def init_app(server):
+    """Register the memory route on the Flask server."""
+    server.add_url_rule('/api/memory', 'memory', memory_route)
+
+
+def _mb(value):
+    return '{:9.1f}'.format(value / 2 ** 20)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Print the memory of a gunicorn master and its workers.')
+    parser.add_argument('pid', type=int, help='gunicorn master pid')
+    args = parser.parse_args()
+
+    rows = report(args.pid)
+    print('{:8} {:>8} {:>9} {:>9} {:>9} {:>9}'.format(
+        'role', 'pid', 'rss MB', 'pss MB', 'shared MB', 'private MB'))
+    for role, pid, memory in rows:
+        print('{:8} {:>8} {} {} {} {}'.format(
+            role, pid, _mb(memory['rss']), _mb(memory['pss']),
+            _mb(memory['shared']), _mb(memory['private'])))
+    workers = [memory for role, _, memory in rows if role == 'worker']
+    if workers:
+        print('{} workers: {:.1f} MB private each on average, {:.1f} MB '
+              'total PSS'.format(
+                  len(workers),
+                  sum(m['private'] for m in workers) / len(workers) / 2 ** 20,
+                  sum(m['pss'] for _, _, m in rows) / 2 ** 20))
@@ -0,0 +1,303 @@
+"""Latency metrics of the dashboard and a sampling profiler for slow requests.
+
+Functions decorated with ``timed(kind)`` record a latency histogram, a call
+count and an error count under ``(kind, name)``: ``callback`` for the Dash
+callbacks, ``inference`` for the model and ``load`` for the file loaders.
+``GET /metrics`` serves them in the Prometheus text format. The numbers are
+per process, labelled with its pid, unless ``DASH_METRICS_DIR`` is set (as
+``gunicorn.conf.py`` does): each process then writes its numbers to
+``<pid>.json`` in that folder at most every ``flush_interval`` seconds, and
+every scrape adds up the files of all the workers, past and present, so the
+counters only go up whichever worker answers.
+
+The profiler is off unless ``DASH_PROFILE_THRESHOLD`` is set (seconds). A
+background thread then samples the stack of every thread serving a request
+each ``DASH_PROFILE_INTERVAL`` seconds, and requests slower than the
+threshold have their samples written as collapsed stacks (one
+``frame;frame;frame count`` line per stack, the input of ``flamegraph.pl``
+and speedscope) to ``DASH_PROFILE_DIR``.
+
+Usage::
+
+    @app.callback(...)
+    @metrics.timed('callback')
+    def render_content(tab): ...
+
+    metrics.init_app(server)    # GET /metrics and the profiler hooks
+"""
+import functools
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+from dash.exceptions import PreventUpdate
+from flask import Response, g, request
+
+# upper bounds of the latency buckets, in seconds
+buckets = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+           float('inf'))
+
+# folder shared by the workers, None for per-process metrics
+metrics_dir = os.environ.get('DASH_METRICS_DIR')
+# seconds between writes of the numbers of a process to metrics_dir
+flush_interval = 1.0
+
+profile_threshold = os.environ.get('DASH_PROFILE_THRESHOLD')
+profile_interval = float(os.environ.get('DASH_PROFILE_INTERVAL', 0.005))
+profile_dir = os.environ.get('DASH_PROFILE_DIR', 'profiles')
+
+
+class Histogram:
+    """Cumulative latency histogram with call and error counts."""
+
+    def __init__(self):
+        self.counts = [0] * len(buckets)
+        self.total = 0.0
+        self.calls = 0
+        self.errors = 0
+
+    def observe(self, seconds, error=False):
+        for i, bound in enumerate(buckets):
+            if seconds <= bound:
+                self.counts[i] += 1
+                break
+        self.total += seconds
+        self.calls += 1
+        self.errors += error
+
+
+_lock = threading.Lock()
+_histograms = {}
+# process the histograms belong to: a forked worker starts from zero, the
+# master's numbers are in the master's file
+_pid = os.getpid()
+_flushed_at = 0.0
+_flush_lock = threading.Lock()
+
+
+def _own_histograms():
+    global _pid
+    if _pid != os.getpid():
+        _histograms.clear()
+        _pid = os.getpid()
+    return _histograms
+
+
+def observe(kind, name, seconds, error=False):
+    """Record one call of `name` that took `seconds`."""
+    with _lock:
+        histograms = _own_histograms()
+        histogram = histograms.get((kind, name))
+        if histogram is None:
+            histogram = histograms[(kind, name)] = Histogram()
+        histogram.observe(seconds, error)
+    if metrics_dir and time.monotonic() - _flushed_at >= flush_interval:
+        flush()
+
+
+def _snapshot():
+    with _lock:
+        return {key: (list(h.counts), h.total, h.calls, h.errors)
+                for key, h in _own_histograms().items()}
+
+
+def flush():
+    """Write the numbers of this process to metrics_dir."""
+    global _flushed_at
+    if not metrics_dir:
+        return
+    with _flush_lock:
+        _flushed_at = time.monotonic()
+        os.makedirs(metrics_dir, exist_ok=True)
+        path = os.path.join(metrics_dir, '{}.json'.format(os.getpid()))
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump([[kind, name, *values]
+                       for (kind, name), values in _snapshot().items()], f)
+        os.replace(tmp_path, path)
+
+
+def clear():
+    """Remove the files of metrics_dir, when the server starts."""
+    if metrics_dir and os.path.isdir(metrics_dir):
+        for name in os.listdir(metrics_dir):
+            if name.endswith('.json'):
+                os.remove(os.path.join(metrics_dir, name))
+
+
+def _shared_snapshot():
+    """Numbers of every process that wrote to metrics_dir, added up."""
+    flush()
+    snapshot = {}
+    for file_name in os.listdir(metrics_dir):
+        if not file_name.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(metrics_dir, file_name)) as f:
+                rows = json.load(f)
+        except (OSError, ValueError):
+            continue
+        for kind, name, counts, total, calls, errors in rows:
+            old = snapshot.get((kind, name))
+            if old is not None:
+                counts = [a + b for a, b in zip(old[0], counts)]
+                total, calls, errors = (total + old[1], calls + old[2],
+                                        errors + old[3])
+            snapshot[(kind, name)] = (counts, total, calls, errors)
+    return snapshot
+
+
+def timed(kind, name=None):
+    """Decorator recording the latency, calls and errors of a function.
+
+    PreventUpdate, which Dash callbacks raise to leave their outputs as
+    they are, is not counted as an error.
+    """
+    def decorator(func):
+        label = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            error = False
+            try:
+                return func(*args, **kwargs)
+            except PreventUpdate:
+                raise
+            except Exception:
+                error = True
+                raise
+            finally:
+                observe(kind, label, time.perf_counter() - start, error)
+        return wrapper
+    return decorator
+
+
+def _labels(kind, name, **extra):
+    labels = dict(kind=kind, name=name, **extra)
+    if not metrics_dir:
+        labels['pid'] = os.getpid()
+    return '{' + ','.join('{}="{}"'.format(key, value)
+                          for key, value in labels.items()) + '}'
+
+
+def render():
+    """Every metric in the Prometheus text exposition format."""
+    snapshot = _shared_snapshot() if metrics_dir else _snapshot()
+    lines = ['# HELP dashboard_latency_seconds Latency of the dashboard '
+             'callbacks, inference and file loads.',
+             '# TYPE dashboard_latency_seconds histogram']
+    for (kind, name), (counts, total, calls, _) in sorted(snapshot.items()):
+        cumulative = 0
+        for bound, count in zip(buckets, counts):
+            cumulative += count
+            le = '+Inf' if bound == float('inf') else repr(bound)
+            lines.append('dashboard_latency_seconds_bucket{} {}'.format(
+                _labels(kind, name, le=le), cumulative))
+        lines.append('dashboard_latency_seconds_sum{} {!r}'.format(
+            _labels(kind, name), total))
+        lines.append('dashboard_latency_seconds_count{} {}'.format(
+            _labels(kind, name), calls))
+    for metric, position, help_text in [
+            ('dashboard_calls_total', 2, 'Calls'),
+            ('dashboard_errors_total', 3, 'Calls that raised')]:
+        lines.append('# HELP {} {}.'.format(metric, help_text))
+        lines.append('# TYPE {} counter'.format(metric))
+        for (kind, name), values in sorted(snapshot.items()):
+            lines.append('{}{} {}'.format(metric, _labels(kind, name),
+                                          values[position]))
+    return '\n'.join(lines) + '\n'
+
+
+def metrics_route():
+    """GET /metrics"""
+    return Response(render(), mimetype='text/plain; version=0.0.4')
+
+
+class Sampler:
+    """Samples the stacks of the threads serving requests.
+
+    Args:
+        interval (float): seconds between samples
+    """
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self._samples = {}
+        self._lock = threading.Lock()
+        self._pid = None
+
+    def start(self):
+        with self._lock:
+            # the thread is started in each process: threads do not
+            # survive the fork of the gunicorn workers
+            if self._pid != os.getpid():
+                self._samples = {}
+                threading.Thread(target=self._run, daemon=True,
+                                 name='request-sampler').start()
+                self._pid = os.getpid()
+            self._samples[threading.get_ident()] = Counter()
+
+    def stop(self):
+        with self._lock:
+            return self._samples.pop(threading.get_ident(), Counter())
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            frames = sys._current_frames()
+            with self._lock:
+                for ident, samples in self._samples.items():
+                    frame = frames.get(ident)
+                    if frame is not None:
+                        samples[_stack(frame)] += 1
+
+
+def _stack(frame):
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        stack.append('{} ({}:{})'.format(
+            code.co_name, os.path.basename(code.co_filename),
+            code.co_firstlineno))
+        frame = frame.f_back
+    return ';'.join(reversed(stack))
+
+
+def dump(samples, seconds, path):
+    """Write the samples of a slow request as collapsed stacks."""
+    os.makedirs(profile_dir, exist_ok=True)
+    name = '{}-{}-{:.0f}ms.txt'.format(
+        time.strftime('%Y%m%d-%H%M%S'), path.strip('/').replace('/', '_')
+        or 'index', seconds * 1000)
+    with open(os.path.join(profile_dir, name), 'w') as f:
+        for stack, count in samples.most_common():
+            f.write('{} {}\n'.format(stack, count))
+    return name
+
+
+def init_app(server):
+    """Register GET /metrics, and the profiler hooks when enabled."""
+    server.add_url_rule('/metrics', 'metrics', metrics_route)
+    if not profile_threshold:
+        return
+    threshold = float(profile_threshold)
+    sampler = Sampler(profile_interval)
+
+    @server.before_request
+    def start_profile():
+        g.profile_start = time.perf_counter()
+        sampler.start()
+
+    @server.teardown_request
+    def stop_profile(exc):
+        samples = sampler.stop()
+        seconds = time.perf_counter() - g.pop('profile_start',
+                                              time.perf_counter())
+        if seconds >= threshold and samples:
+            name = dump(samples, seconds, request.path)
+            server.logger.warning('slow request %s (%.0f ms), profile: %s',
+                                  request.path, seconds * 1000, name)
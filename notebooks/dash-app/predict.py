@@ -0,0 +1,250 @@
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeout
+from queue import Empty, Queue
+
+import joblib
+import numpy as np
+import pandas as pd
+from flask import jsonify, request
+
+import data
+import forest_arrays
+import metrics
+
+features = data.features
+
+# seconds between checks for a new training bundle
+check_interval = 2.0
+# seconds a request waits for its micro-batch to be scored
+result_timeout = 30.0
+
+_lock = threading.Lock()
+_loaded = None
+_checked_at = 0.0
+
+
+def _export(preprocess, model, model_path):
+    """Write the memory-mapped arrays of a freshly unpickled model, so the
+    next workers to start map them instead of unpickling."""
+    if forest_arrays.walker() is None:
+        # without numba the arrays are not used
+        return
+    try:
+        forest_arrays.export(preprocess, model,
+                             forest_arrays.arrays_path(model_path),
+                             forest_arrays.model_signature(model_path))
+    except (AttributeError, OSError, TypeError):
+        # read-only resources, another worker exporting, or a model the
+        # arrays do not support: keep serving the pickled model
+        pass
+
+
+def export_arrays():
+    """Export the model arrays when they are missing or stale, without
+    keeping the model; run once before the workers start."""
+    model_path = data.resource_path('final_model.pkl')
+    if forest_arrays.walker() is not None and \
+            forest_arrays.load(model_path) is None:
+        preprocess = joblib.load(data.resource_path('preprocess.joblib'))
+        with open(model_path, 'rb') as f:
+            model = pickle.load(f)
+        _export(preprocess, model, model_path)
+
+
+@metrics.timed('load', 'model')
+def _load():
+    model_path = data.resource_path('final_model.pkl')
+    forest = forest_arrays.load(model_path)
+    if forest is not None:
+        # the mapped arrays stand in for preprocess and model
+        return forest, forest
+    # Load Preprocess
+    preprocess = joblib.load(data.resource_path('preprocess.joblib'))
+    ### load ML model ###################################
+    with open(model_path, 'rb') as f:
+        model = pickle.load(f)
+    _export(preprocess, model, model_path)
+    return preprocess, model
+
+
+def load_model():
+    """Load the preprocess transformer and the model on first use, and
+    again when a new training bundle is published."""
+    global _loaded, _checked_at
+    with _lock:
+        if _loaded is None or time.monotonic() - _checked_at >= check_interval:
+            version = data.artifact_version()
+            if _loaded is None or _loaded[0] != version:
+                preprocess, model = _load()
+                if _loaded is not None:
+                    cache.clear()
+                _loaded = version, preprocess, model
+            _checked_at = time.monotonic()
+    return _loaded[1:]
+
+
+@metrics.timed('inference')
+def predict_proba(rows):
+    """Follower probability for rows of features, in `features` order."""
+    preprocess, model = load_model()
+    X = pd.DataFrame(np.asarray(rows, dtype=float), columns=features)
+    return model.predict_proba(preprocess.transform(X))[:, 1]
+
+
+class ResultCache:
+    """Thread-safe LRU cache of feature vector -> probability."""
+
+    def __init__(self, maxsize=100000):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._data.get(key)
+            if value is not None:
+                self._data.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            if len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class MicroBatcher:
+    """Combine concurrent prediction requests into one predict_proba call.
+
+    The first request to arrive opens a window of `window` seconds; every
+    request submitted during the window (up to `max_batch` rows) is scored in
+    the same call.
+
+    The scoring thread is started by the first submit of each process:
+    threads do not survive a fork, and gunicorn imports the app in the
+    master before forking the workers.
+    """
+
+    def __init__(self, predict, window=0.005, max_batch=4096):
+        self.predict = predict
+        self.window = window
+        self.max_batch = max_batch
+        self._lock = threading.Lock()
+        self._pid = None
+        self._queue = None
+
+    def _start(self):
+        with self._lock:
+            if self._pid != os.getpid():
+                self._queue = Queue()
+                threading.Thread(target=self._run, args=(self._queue,),
+                                 daemon=True, name='predict-batcher').start()
+                self._pid = os.getpid()
+
+    def submit(self, rows):
+        """Queue rows for scoring, returns a Future of their probabilities."""
+        if self._pid != os.getpid():
+            self._start()
+        future = Future()
+        self._queue.put((rows, future))
+        return future
+
+    def _run(self, queue):
+        while True:
+            pending = [queue.get()]
+            size = len(pending[0][0])
+            deadline = time.perf_counter() + self.window
+            while size < self.max_batch:
+                timeout = deadline - time.perf_counter()
+                if timeout <= 0:
+                    break
+                try:
+                    item = queue.get(timeout=timeout)
+                except Empty:
+                    break
+                pending.append(item)
+                size += len(item[0])
+
+            try:
+                probs = self.predict([row for rows, _ in pending
+                                      for row in rows])
+            except Exception as e:
+                for _, future in pending:
+                    future.set_exception(e)
+                continue
+            start = 0
+            for rows, future in pending:
+                future.set_result(probs[start:start + len(rows)])
+                start += len(rows)
+
+
+cache = ResultCache()
+batcher = MicroBatcher(predict_proba)
+
+
+def predict_profiles(rows):
+    """Follower probabilities for rows of features, served from the cache
+    where possible and micro-batched with concurrent requests otherwise."""
+    # picks up a newly published bundle, which also clears the cache
+    load_model()
+    keys = [tuple(float(v) for v in row) for row in rows]
+    probs = [cache.get(key) for key in keys]
+    missing = [i for i, p in enumerate(probs) if p is None]
+    if missing:
+        scored = batcher.submit([keys[i] for i in missing]).result(
+            timeout=result_timeout)
+        for i, p in zip(missing, scored):
+            probs[i] = float(p)
+            cache.put(keys[i], probs[i])
+    return probs
+
+
+def _profile_row(profile):
+    missing = [col for col in features if profile.get(col) is None]
+    if missing:
+        raise ValueError('missing features: ' + ', '.join(missing))
+    return [float(profile[col]) for col in features]
+
+
+def predict_route():
+    """POST /api/predict
+
+    Accepts one profile object, a list of profiles or {"profiles": [...]}.
+    Each profile holds the six model features. Returns the follower
+    probability, or a list of them for a batch.
+    """
+    payload = request.get_json(silent=True)
+    if isinstance(payload, dict) and 'profiles' in payload:
+        payload = payload['profiles']
+    single = isinstance(payload, dict)
+    profiles = [payload] if single else payload
+    if not isinstance(profiles, list) or not all(
+            isinstance(p, dict) for p in profiles):
+        return jsonify(error='expected a profile object or a list of '
+                       'profiles with: ' + ', '.join(features)), 400
+    try:
+        rows = [_profile_row(p) for p in profiles]
+    except (TypeError, ValueError) as e:
+        return jsonify(error=str(e)), 400
+
+    try:
+        probs = predict_profiles(rows) if rows else []
+    except FutureTimeout:
+        return jsonify(error='prediction timed out'), 503
+    return jsonify(follower_probability=probs[0] if single else probs)
+
+
+def init_app(server):
+    """Register the prediction route on the Flask server."""
+    server.add_url_rule('/api/predict', 'predict', predict_route,
+                        methods=['POST'])
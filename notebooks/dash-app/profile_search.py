@@ -0,0 +1,65 @@
+from functools import lru_cache
+
+import numpy as np
+
+import data
+
+# columns shown in the follower characteristics table
+characteristics = data.features
+
+
+class ProfileSearch:
+    """Username search over the testing dataset.
+
+    Prefix matches come from a binary search over the sorted lowercase
+    usernames; substring matches fill up the remaining slots. The arrays
+    are the memory-mapped ones of the shared table, so no worker holds a
+    private copy.
+
+    Args:
+        table (SharedTable): testing dataset; the row position is the id
+    """
+
+    def __init__(self, table):
+        self.table = table
+        self.usernames = table.column('username')
+        self.order = table.search_order
+        self.sorted = table.search_sorted
+
+    def prefix(self, text, limit):
+        key = text.encode('utf-8')
+        lo = np.searchsorted(self.sorted, key, side='left')
+        hi = np.searchsorted(self.sorted, key + b'\xff', side='left')
+        return self.order[lo:min(hi, lo + limit)]
+
+    def search(self, text, limit=50):
+        """Row ids of usernames starting with or containing text."""
+        text = text.strip().lower()
+        if not text:
+            return np.arange(min(limit, len(self.usernames)))
+        ids = self.prefix(text, limit)
+        if len(ids) < limit:
+            found = np.char.find(self.sorted, text.encode('utf-8')) >= 0
+            contains = np.sort(self.order[found])
+            contains = contains[~np.isin(contains, ids)]
+            ids = np.concatenate([ids, contains[:limit - len(ids)]])
+        return ids
+
+    def options(self, ids):
+        return [{'label': self.table.value('username', i), 'value': int(i)}
+                for i in ids]
+
+
+@lru_cache(maxsize=1)
+def _profile_search(table):
+    return ProfileSearch(table)
+
+
+def profile_search():
+    return _profile_search(data.final_probs_table())
+
+
+def profile_record(i):
+    """The shown columns of one testing profile, by row id."""
+    return data.final_probs_table().record(
+        i, ['username', 'follower_probability', 'actual'] + characteristics)
@@ -0,0 +1,157 @@
+"""Read-only, memory-mapped copy of a CSV table for multi-worker serving.
+
+A DataFrame read from ``final_probs.csv`` lives in each worker's private
+heap, and the reference counts pandas writes into its string objects defeat
+copy-on-write after a fork. The exporter here stores each column as a
+``.npy`` array in a folder next to the CSV (strings as fixed-width UTF-8
+bytes), plus the lowercase usernames sorted for the prefix search. Every
+worker opens the arrays with ``mmap_mode='r'``, so the pages are shared
+through the page cache however many workers run.
+
+Usage::
+
+    python shared_table.py      # export final_probs.csv next to it
+"""
+import argparse
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+import pandas as pd
+
+
+def source_signature(csv_path):
+    stat = os.stat(csv_path)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def table_path(csv_path):
+    return os.path.splitext(csv_path)[0] + '.arrays'
+
+
+def _encode(values):
+    """Fixed-width UTF-8 bytes array of a column of strings."""
+    encoded = pd.Series(values).fillna('').astype(str).str.encode('utf-8')
+    width = max(int(encoded.str.len().max()) if len(encoded) else 0, 1)
+    return np.asarray(encoded.tolist(), dtype='S{}'.format(width))
+
+
+def export(df, path, signature=None, search_column='username'):
+    """Write the columns of `df` as arrays to the folder `path`.
+
+    The folder is written next to it and renamed into place, so workers
+    never see a partial export.
+    """
+    columns, kinds = [], {}
+    tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+    for i, column in enumerate(df.columns):
+        values = df[column]
+        if pd.api.types.is_bool_dtype(values) \
+                or pd.api.types.is_numeric_dtype(values):
+            array, kinds[column] = values.to_numpy(), 'number'
+        else:
+            array, kinds[column] = _encode(values), 'string'
+        columns.append(column)
+        np.save(os.path.join(tmp_path, '{}.npy'.format(i)), array)
+    if search_column in df:
+        lower = _encode(df[search_column].astype(str).str.lower())
+        order = np.argsort(lower, kind='stable')
+        np.save(os.path.join(tmp_path, 'search_order.npy'), order)
+        np.save(os.path.join(tmp_path, 'search_sorted.npy'), lower[order])
+    with open(os.path.join(tmp_path, 'meta.json'), 'w') as f:
+        json.dump({'columns': columns, 'kinds': kinds, 'rows': len(df),
+                   'search_column': search_column
+                   if search_column in df else None,
+                   'source': signature}, f, indent=1)
+    shutil.rmtree(path, ignore_errors=True)
+    try:
+        os.replace(tmp_path, path)
+    finally:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+
+
+class SharedTable:
+    """Memory-mapped columns of an exported table.
+
+    Args:
+        path (str): folder written by `export`
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, 'meta.json')) as f:
+            self.meta = json.load(f)
+        self.columns = self.meta['columns']
+        self.kinds = self.meta['kinds']
+        self._arrays = {column: self._map('{}.npy'.format(i))
+                        for i, column in enumerate(self.columns)}
+        if self.meta['search_column'] is not None:
+            self.search_order = self._map('search_order.npy')
+            self.search_sorted = self._map('search_sorted.npy')
+
+    def _map(self, name):
+        return np.load(os.path.join(self.path, name), mmap_mode='r')
+
+    def __len__(self):
+        return self.meta['rows']
+
+    def column(self, name):
+        """Column as a read-only array; strings as UTF-8 bytes."""
+        return self._arrays[name]
+
+    def value(self, name, i):
+        """Python value of one cell, strings decoded."""
+        value = self._arrays[name][i]
+        if self.kinds[name] == 'string':
+            return value.decode('utf-8')
+        return value.item()
+
+    def record(self, i, columns=None):
+        """One row as a dict of Python values."""
+        return {column: self.value(column, i)
+                for column in columns or self.columns}
+
+    def to_frame(self, columns=None):
+        """Private pandas copy of some columns, for code that needs one."""
+        return pd.DataFrame({
+            column: np.char.decode(self._arrays[column], 'utf-8')
+            if self.kinds[column] == 'string' else self._arrays[column]
+            for column in columns or self.columns})
+
+
+def load(csv_path):
+    """SharedTable of the CSV at `csv_path`, exported first when there is
+    no export or it is older than the CSV."""
+    path = table_path(csv_path)
+    signature = source_signature(csv_path)
+    try:
+        table = SharedTable(path)
+        if table.meta.get('source') == signature:
+            return table
+    except FileNotFoundError:
+        pass
+    export(pd.read_csv(csv_path), path, signature)
+    return SharedTable(path)
+
+
+if __name__ == '__main__':
+    import data
+
+    parser = argparse.ArgumentParser(
+        description='Export a CSV of the dashboard to memory-mappable '
+        'arrays next to it.')
+    parser.add_argument('csv', nargs='?',
+                        help='CSV to export (default: final_probs.csv)')
+    args = parser.parse_args()
+
+    csv_path = args.csv or data.resource_path('final_probs.csv')
+    start = time.perf_counter()
+    export(pd.read_csv(csv_path), table_path(csv_path),
+           source_signature(csv_path))
+    table = SharedTable(table_path(csv_path))
+    print('Exported {:,} rows of {} to {} in {:.2f}s'.format(
+        len(table), csv_path, table.path, time.perf_counter() - start))
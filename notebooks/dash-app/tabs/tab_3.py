@@ -2,6 +2,7 @@ import dash
 from dash import dcc
 from dash import html
 import pandas as pd
+from functools import lru_cache
 
 choices=['Comparison of Models',
 'Final Model Metrics',
@@ -9,24 +10,28 @@ choices=['Comparison of Models',
 'Confusion Matrix',
 'Feature Importance']
 
-tab_3_layout = html.Div([
-    html.H3('Model Evaluation Statistics'),
-    html.Div([
-        html.Div([
-            html.Br(),
-            html.Br(),
-            dcc.RadioItems(
-                id='page-2-radios',
-                options=[{'label': i, 'value': i} for i in choices],
-                value='Comparison of Models'
-            ),
-        ],className='three columns'),
+
+@lru_cache(maxsize=None)
+def layout():
+    """Build the Model Evaluation tab on first render."""
+    return html.Div([
+        html.H3('Model Evaluation Statistics'),
         html.Div([
-            dcc.Graph(id='page-2-graphic')
-        ],className='nine columns',style = {'width': '100%', 'display': 'flex', 'align-items': 'center', 'justify-content': 'center'}),
-    ], className=' twelve columns')
+            html.Div([
+                html.Br(),
+                html.Br(),
+                dcc.RadioItems(
+                    id='page-2-radios',
+                    options=[{'label': i, 'value': i} for i in choices],
+                    value='Comparison of Models'
+                ),
+            ],className='three columns'),
+            html.Div([
+                dcc.Graph(id='page-2-graphic')
+            ],className='nine columns',style = {'width': '100%', 'display': 'flex', 'align-items': 'center', 'justify-content': 'center'}),
+        ], className=' twelve columns')
 
 
 
 
-])
+    ])
@@ -0,0 +1,91 @@
+from dash import dcc
+from dash import html
+import numpy as np
+import plotly.graph_objects as go
+from functools import lru_cache
+
+import data
+
+typename_labels = {'GraphImage': 'Image', 'GraphVideo': 'Video',
+                   'GraphSidecar': 'Carousel', 'other': 'Other'}
+
+
+def layout():
+    """Best Time to Post tab, or how to publish the cube until it exists."""
+    try:
+        data.engagement_cube()
+    except FileNotFoundError:
+        return html.Div([
+            html.H3('Best Time to Post'),
+            html.P('No engagement cube yet: run posts/engagement_cube.py to '
+                   'publish resources/engagement_cube.npz.')])
+    return controls()
+
+
+@lru_cache(maxsize=None)
+def controls():
+    """Build the Best Time to Post tab on first render."""
+    import engagement_cube
+    return html.Div([
+        html.H3('Best Time to Post'),
+        html.Div([
+            html.Div([
+                html.Label('Post type'),
+                dcc.Dropdown(
+                    id='engagement-types',
+                    options=[{'label': typename_labels.get(name, name),
+                              'value': name}
+                             for name in engagement_cube.typenames],
+                    value=[], multi=True, placeholder='All types'),
+                html.Br(),
+                html.Label('Hashtags in the caption'),
+                dcc.Dropdown(
+                    id='engagement-buckets',
+                    options=[{'label': name, 'value': name}
+                             for name in engagement_cube.buckets],
+                    value=[], multi=True, placeholder='Any number'),
+                html.Br(),
+                dcc.RadioItems(
+                    id='engagement-metric',
+                    options=[{'label': name.capitalize(), 'value': name}
+                             for name in engagement_cube.metrics],
+                    value='likes'),
+                html.Br(),
+                html.Div(id='engagement-best-slots'),
+            ], className='three columns'),
+            html.Div([
+                dcc.Graph(id='engagement-heatmap'),
+            ], className='nine columns'),
+        ], className='twelve columns'),
+    ])
+
+
+def heatmap_figure(cube, typenames, buckets, metric):
+    # an empty dropdown selects every type or bucket
+    mean = cube.heatmap(typenames or None, buckets or None, metric)
+    posts = cube.posts(typenames or None, buckets or None)
+    figure = go.Figure(go.Heatmap(
+        z=np.round(mean.to_numpy(), 1), x=mean.columns, y=mean.index,
+        customdata=posts.to_numpy(), colorscale='Greys',
+        hovertemplate='%{y} %{x}:00<br>mean ' + metric
+        + ' %{z}<br>%{customdata} posts<extra></extra>'))
+    figure.update_layout(
+        title='Mean {} per post by hour ({})'.format(
+            metric, cube.tz),
+        xaxis=dict(title='Hour', dtick=1),
+        yaxis=dict(autorange='reversed'),
+        plot_bgcolor='white')
+    return figure
+
+
+def slots_table(cube, typenames, buckets, metric, k=10):
+    best = cube.best_slots(typenames or None, buckets or None, k, metric)
+    if best.empty:
+        return html.P('Not enough posts for this selection.')
+    column = metric + '_mean'
+    return html.Table(
+        [html.Tr([html.Th('Day'), html.Th('Hour'), html.Th('Posts'),
+                  html.Th('Mean ' + metric)])] +
+        [html.Tr([html.Td(row['weekday']), html.Td(f"{row['hour']}:00"),
+                  html.Td(row['posts']), html.Td(round(row[column], 1))])
+         for _, row in best.iterrows()])
@@ -0,0 +1,108 @@
+from dash import dcc
+from dash import html
+import numpy as np
+import plotly.graph_objects as go
+
+import data
+
+# PSI above which a feature reads as a moderate shift, then as drift
+psi_thresholds = (0.1, 0.25)
+
+
+def layout():
+    """Drift tab, or how to start monitoring until the state exists."""
+    try:
+        state = data.drift()
+    except FileNotFoundError:
+        return html.Div([
+            html.H3('Drift'),
+            html.P('No drift state yet: train a bundle with '
+                   'gain-followers/train.py, then score profiles with '
+                   'batch_score.py to write resources/drift.json.')])
+    features = list(state['reference']['features'])
+    days = state.get('window_days', [])
+    return html.Div([
+        html.H3('Drift of the scored profiles'),
+        html.P('Model bundle {}, {} days of scored profiles{}.'.format(
+            state['version'], len(days),
+            ' ({} to {})'.format(days[0], days[-1]) if days else '')),
+        window_table(state['window']),
+        html.Div([
+            html.Div([
+                html.Label('Feature'),
+                dcc.Dropdown(
+                    id='drift-feature',
+                    options=[{'label': name, 'value': name}
+                             for name in features],
+                    value='follower_probability'
+                    if 'follower_probability' in features else features[0],
+                    clearable=False),
+            ], className='three columns'),
+            html.Div([
+                dcc.Graph(id='drift-histogram'),
+                dcc.Graph(id='drift-history'),
+            ], className='nine columns'),
+        ], className='twelve columns'),
+    ])
+
+
+def window_table(window):
+    return html.Table(
+        [html.Tr([html.Th('Feature'), html.Th('PSI'), html.Th('KS'),
+                  html.Th('Profiles'), html.Th('Status')])] +
+        [html.Tr([html.Td(name), html.Td(scores['psi']),
+                  html.Td(scores['ks']), html.Td(f"{scores['rows']:,}"),
+                  html.Td(scores['status'])])
+         for name, scores in sorted(window.items(),
+                                    key=lambda item: -item[1]['psi'])])
+
+
+def bin_labels(hist):
+    edges = ['{:g}'.format(edge) for edge in hist['edges']]
+    if hist['kind'] == 'binary':
+        labels = ['0', '1']
+    elif not edges:
+        labels = ['all']
+    else:
+        labels = (['< ' + edges[0]] +
+                  [f'{low} to {high}' for low, high in zip(edges, edges[1:])]
+                  + ['>= ' + edges[-1]])
+    return labels + ['missing']
+
+
+def _shares(counts):
+    counts = np.asarray(counts, dtype=np.float64)
+    return counts / max(counts.sum(), 1)
+
+
+def histogram_figure(state, feature):
+    hist = state['reference']['features'][feature]
+    window = np.zeros(len(hist['counts']))
+    for counts in state['days'].values():
+        if feature in counts:
+            window += counts[feature]
+    labels = bin_labels(hist)
+    figure = go.Figure([
+        go.Bar(x=labels, y=_shares(hist['counts']), name='Training',
+               marker_color='lightgrey'),
+        go.Bar(x=labels, y=_shares(window), name='Scored',
+               marker_color='black')])
+    figure.update_layout(
+        title='Share of profiles by bin: {}'.format(feature),
+        barmode='group', yaxis=dict(tickformat='.0%'),
+        plot_bgcolor='white')
+    return figure
+
+
+def history_figure(state, feature):
+    days = sorted(day for day, scores in state['scores'].items()
+                  if feature in scores)
+    figure = go.Figure(go.Scatter(
+        x=days, y=[state['scores'][day][feature]['psi'] for day in days],
+        mode='lines+markers', name='PSI', line=dict(color='black')))
+    for value, dash in zip(psi_thresholds, ['dot', 'dash']):
+        figure.add_hline(y=value, line_dash=dash, line_color='grey')
+    figure.update_layout(
+        title='Daily PSI: {}'.format(feature),
+        yaxis=dict(rangemode='tozero'), plot_bgcolor='white')
+    return figure
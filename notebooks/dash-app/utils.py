@@ -2,15 +2,96 @@ import pandas as pd
 import plotly
 import plotly.graph_objs as go
 import pickle
-from sklearn.metrics import roc_auc_score
 from tabs.tab_3 import choices
+import data
+import metrics
 import json
+import os
+import threading
+import time
+
+# resources each evaluation figure is built from
+figure_files = {
+    choices[0]: ['compare_models.csv'],
+    choices[1]: ['eval_scores.pkl'],
+    choices[2]: ['roc_dict.json'],
+    choices[3]: ['roc_dict.json', 'confusion_matrix.csv'],
+    choices[4]: ['coefficients.csv'],
+}
+# seconds between checks of the resources for new artifacts
+check_interval = 2.0
+
+_figure_cache = {}
+# error of the last build of the figures that never built, by choice
+_figure_errors = {}
+_checked_at = 0.0
+_lock = threading.Lock()
+
+
+def _signature(value):
+    signature = []
+    for name in figure_files[value]:
+        path = data.resource_path(name)
+        try:
+            stat = os.stat(path)
+            signature.append((path, stat.st_mtime_ns, stat.st_size))
+        except FileNotFoundError:
+            signature.append((path, None, None))
+    return tuple(signature)
+
+
+def _refresh():
+    """Rebuild the cached figures whose resource files changed.
+
+    A figure that fails to build (e.g. an artifact is being rewritten by a
+    retraining job) keeps its previous version until the next check; one
+    that never built keeps its error, raised only when it is asked for.
+    """
+    global _checked_at
+    with _lock:
+        if time.monotonic() - _checked_at < check_interval:
+            return
+        for value in choices:
+            signature = _signature(value)
+            cached = _figure_cache.get(value)
+            if cached is not None and cached[0] == signature:
+                continue
+            try:
+                figure = json.loads(build_eval_figure(value).to_json())
+            except Exception as e:
+                if cached is None:
+                    _figure_errors[value] = e
+                continue
+            # stored with the signature taken before the build, so a file
+            # replaced mid-build is picked up by the next check
+            _figure_cache[value] = (signature, figure)
+            _figure_errors.pop(value, None)
+        _checked_at = time.monotonic()
+
 
 def display_eval_metrics(value):
+    """Evaluation figure for a tab_3 choice, as serialized figure JSON.
+
+    All five figures are built once and cached; they are rebuilt only when
+    one of their files changes or a new training bundle is published.
+    Returns None for a value that is not one of the choices.
+    """
+    if time.monotonic() - _checked_at >= check_interval:
+        _refresh()
+    cached = _figure_cache.get(value)
+    if cached is None:
+        if value in _figure_errors:
+            raise _figure_errors[value]
+        return None
+    return cached[1]
+
+
+@metrics.timed('load')
+def build_eval_figure(value):
 
     ### Comparison of Possible Models
     if value==choices[0]:
-        compare_models=pd.read_csv('resources/compare_models.csv', index_col=0)
+        compare_models=pd.read_csv(data.resource_path('compare_models.csv'), index_col=0)
         # Let's display that with plotly.
         fig = go.Figure()
 
@@ -45,7 +126,7 @@ def display_eval_metrics(value):
 
     ### Final Model Metrics
     elif value==choices[1]:
-        file = open('resources/eval_scores.pkl', 'rb')
+        file = open(data.resource_path('eval_scores.pkl'), 'rb')
         evals=pickle.load(file)
         file.close()
         fig = go.Figure()
@@ -68,8 +149,10 @@ def display_eval_metrics(value):
 
     # Receiver Operating Characteristic (ROC): Area Under Curve
     elif value==choices[2]:
+        # sklearn (and scipy) are only imported when the ROC view is opened
+        from sklearn.metrics import roc_auc_score
 
-        with open('resources/roc_dict.json') as json_file:
+        with open(data.resource_path('roc_dict.json')) as json_file:
             roc_dict = json.load(json_file)
         FPR=roc_dict['FPR']
         TPR=roc_dict['TPR']
@@ -102,13 +185,13 @@ def display_eval_metrics(value):
 
     # Confusion Matrix
     elif value==choices[3]:
-        with open('resources/roc_dict.json') as json_file:
+        with open(data.resource_path('roc_dict.json')) as json_file:
             roc_dict = json.load(json_file)
         FPR=roc_dict['FPR']
         TPR=roc_dict['TPR']
         y_test=pd.Series(roc_dict['y_test'])
         
-        cm=pd.read_csv('resources/confusion_matrix.csv')
+        cm=pd.read_csv(data.resource_path('confusion_matrix.csv'))
         fig = go.Figure()
 
         fig.add_trace(go.Table(
@@ -128,7 +211,7 @@ def display_eval_metrics(value):
 
     # Odds of Survival (Coefficients)
     elif value==choices[4]:
-        coeffs=pd.read_csv('resources/coefficients.csv')
+        coeffs=pd.read_csv(data.resource_path('coefficients.csv'))
         fig = go.Figure()
 
         fig.add_trace(go.Bar(
@@ -0,0 +1,189 @@
+"""Daily follower forecasts for many tracked accounts at once.
+
+The follower counts of the competitor accounts are taken from the profile
+snapshots scraped into ``others/profile`` (one CSV per scrape, the scrape
+time is in the file name). Every account with enough history is forecast
+either with one local model per series, fitted in parallel in a process
+pool, or with a single global regression model fitted on all series.
+Each series is fitted in isolation, so a bad series is recorded with its
+error and does not stop the run. All forecasts are written to one parquet
+file and the per-series timing and status to another.
+
+Usage::
+
+    python batch_forecast.py --model NaiveDrift --workers 8
+    python batch_forecast.py --global-model --lags 14
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import pandas as pd
+
+from model_selection import make_model
+
+others_profile_folder_path = '../../data/raw/others/profile'
+forecasts_path = '../../data/processed/account_forecasts.parquet'
+status_path = '../../data/processed/account_forecasts_status.parquet'
+horizon = 7
+min_days = 14
+
+
+def _scrape_date(path):
+    # profile files are named profile_%Y-%m-%d_%I-%M-%S_%p.csv
+    stem = os.path.splitext(os.path.basename(path))[0]
+    try:
+        return datetime.strptime(stem.split('_', 1)[1], '%Y-%m-%d_%I-%M-%S_%p')
+    except (IndexError, ValueError):
+        return datetime.fromtimestamp(os.path.getmtime(path))
+
+
+def load_account_series(folder=others_profile_folder_path):
+    """Long table of (userid, Date, Followers), one row per account and day
+    with the last scrape of the day."""
+    frames = []
+    for name in sorted(os.listdir(folder)):
+        if not name.endswith('.csv'):
+            continue
+        path = os.path.join(folder, name)
+        df = pd.read_csv(path, usecols=['userid', 'followers'])
+        df['Date'] = pd.Timestamp(_scrape_date(path))
+        frames.append(df)
+    df = pd.concat(frames, ignore_index=True).dropna()
+    df['Date'] = df['Date'].dt.normalize()
+    df = df.sort_values('Date', kind='mergesort')
+    df = df.drop_duplicates(['userid', 'Date'], keep='last')
+    return df.rename(columns={'followers': 'Followers'})[
+        ['userid', 'Date', 'Followers']].reset_index(drop=True)
+
+
+def _daily(group):
+    """Daily series of one account, gaps carried forward."""
+    return group.set_index('Date')['Followers'].astype(float) \
+        .asfreq('D').ffill()
+
+
+def _to_timeseries(series):
+    from darts import TimeSeries
+    return TimeSeries.from_series(series)
+
+
+def _forecast_frame(userid, forecast, model):
+    return pd.DataFrame({'userid': userid, 'Date': forecast.time_index,
+                         'Followers': forecast.values()[:, 0], 'model': model})
+
+
+def _fit_local(batch, config):
+    """Fit one model per series of a batch, isolating failures."""
+    forecasts, status = [], []
+    for userid, series in batch:
+        start = time.perf_counter()
+        error = None
+        try:
+            model = make_model(config)
+            model.fit(_to_timeseries(series))
+            forecasts.append(_forecast_frame(userid, model.predict(horizon),
+                                             config['model']))
+        except Exception as e:
+            error = '{}: {}'.format(type(e).__name__, e)
+        status.append({'userid': userid, 'n_days': len(series),
+                       'seconds': time.perf_counter() - start,
+                       'error': error})
+    return forecasts, status
+
+
+def forecast_local(series, config, workers=None, batch_size=100):
+    """Fit a local model per series across a process pool."""
+    items = list(series.items())
+    batches = [items[i:i + batch_size]
+               for i in range(0, len(items), batch_size)]
+    forecasts, status = [], []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(_fit_local, batch, config)
+                   for batch in batches]
+        for i, future in enumerate(futures, 1):
+            batch_forecasts, batch_status = future.result()
+            forecasts.extend(batch_forecasts)
+            status.extend(batch_status)
+            print('{}/{} batches done'.format(i, len(futures)))
+    return forecasts, status
+
+
+def forecast_global(series, lags=14):
+    """Fit one regression model on all series and forecast each of them."""
+    from darts.models import LinearRegressionModel
+
+    userids = list(series)
+    start = time.perf_counter()
+    forecasts, error = [], None
+    try:
+        model = LinearRegressionModel(lags=lags)
+        targets = [_to_timeseries(series[u]) for u in userids]
+        model.fit(targets)
+        predictions = model.predict(horizon, series=targets)
+        forecasts = [_forecast_frame(u, p, 'LinearRegressionModel')
+                     for u, p in zip(userids, predictions)]
+    except Exception as e:
+        error = '{}: {}'.format(type(e).__name__, e)
+    # the global fit is shared, its time is spread evenly over the series
+    seconds = (time.perf_counter() - start) / max(len(userids), 1)
+    status = [{'userid': u, 'n_days': len(series[u]), 'seconds': seconds,
+               'error': error} for u in userids]
+    return forecasts, status
+
+
+def run(df, config=None, global_model=False, lags=14, workers=None):
+    """Forecast every account of a long (userid, Date, Followers) table.
+
+    Returns:
+        (forecasts, status) DataFrames
+    """
+    series = {userid: _daily(group) for userid, group in df.groupby('userid')}
+    needed = max(min_days, lags + 1) if global_model else min_days
+    short = {u: len(s) for u, s in series.items() if len(s) < needed}
+    series = {u: s for u, s in series.items() if u not in short}
+
+    start = time.perf_counter()
+    if global_model:
+        forecasts, status = forecast_global(series, lags)
+    else:
+        forecasts, status = forecast_local(series, config, workers)
+    status += [{'userid': u, 'n_days': n, 'seconds': 0.0,
+                'error': 'fewer than {} days'.format(needed)}
+               for u, n in short.items()]
+
+    columns = ['userid', 'Date', 'Followers', 'model']
+    forecasts = pd.concat(forecasts, ignore_index=True) if forecasts \
+        else pd.DataFrame(columns=columns)
+    status = pd.DataFrame(status, columns=['userid', 'n_days', 'seconds',
+                                           'error'])
+    print('Forecast {} of {} accounts in {:.1f}s'.format(
+        status['error'].isna().sum(), len(status),
+        time.perf_counter() - start))
+    return forecasts, status
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Forecast the followers of every tracked account.')
+    parser.add_argument('--folder', default=others_profile_folder_path,
+                        help='profile snapshots (default: %(default)s)')
+    parser.add_argument('--model', default='NaiveDrift',
+                        help='darts model fitted per series '
+                        '(default: %(default)s)')
+    parser.add_argument('--global-model', action='store_true',
+                        help='fit one regression model on all series')
+    parser.add_argument('--lags', type=int, default=14)
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args()
+
+    forecasts, status = run(load_account_series(args.folder),
+                            {'model': args.model, 'params': {}},
+                            args.global_model, args.lags, args.workers)
+    os.makedirs(os.path.dirname(forecasts_path), exist_ok=True)
+    forecasts.to_parquet(forecasts_path, index=False)
+    status.to_parquet(status_path, index=False)
+    print(status.sort_values('seconds', ascending=False).head(10)
+          .to_string(index=False))
@@ -0,0 +1,203 @@
+"""Parallel, cached backtests and grid search for the follower forecasts.
+
+Notebooks 04 and 05 run ``gridsearch``, ``backtest`` and
+``historical_forecasts`` serially and recompute the BoxCox transform and the
+historical forecasts on every call. Here every (model config, backtest
+window) pair is a task run in a process pool. BoxCox transforms and
+historical forecasts are memoized on disk keyed by (model config, series
+hash, window), and the scores are appended to a SQLite table that can be
+queried afterwards.
+
+Usage::
+
+    python model_selection.py --workers 8
+    python model_selection.py --query "select * from results order by smape limit 10"
+"""
+import argparse
+import hashlib
+import itertools
+import json
+import os
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import joblib
+import numpy as np
+import pandas as pd
+
+import warnings
+warnings.filterwarnings("ignore")
+import logging
+logging.disable(logging.CRITICAL)
+
+series_path = '../../data/later/profile_growth.csv'
+cache_path = '../../data/cache/model_selection'
+results_path = '../../data/processed/model_selection.sqlite'
+
+memory = joblib.Memory(cache_path, verbose=0)
+
+# the grids searched in 04_forecasting_boxcox_ensemble.ipynb
+default_grids = {
+    'FFT': {
+        'nr_freqs_to_keep': list(range(1, 20)),
+        'trend': ['poly', 'exp'],
+        'trend_poly_degree': list(range(1, 20)),
+    },
+    'Theta': {
+        'theta': [float(t) for t in 2 - np.linspace(-10, 10, 50)],
+        'seasonality_period': [7, 14, 21],
+        'season_mode': ['additive'],
+    },
+    'AutoARIMA': {},
+}
+
+
+def load_series(path=series_path, column='Followers'):
+    """Daily TimeSeries of a profile_growth.csv column."""
+    from darts import TimeSeries
+    df = pd.read_csv(path, usecols=['Date', column])
+    df['Date'] = pd.to_datetime(df['Date'])
+    df = df.sort_values('Date').drop_duplicates('Date', keep='last')
+    return TimeSeries.from_dataframe(df, 'Date', column)
+
+
+def series_hash(series):
+    """Content hash of a TimeSeries (time index and values)."""
+    digest = hashlib.sha1()
+    digest.update(series.time_index.asi8.tobytes())
+    digest.update(np.ascontiguousarray(series.values()).tobytes())
+    return digest.hexdigest()
+
+
+def expand_grid(model, parameters):
+    """List the configs of a parameter grid, like ``gridsearch`` does."""
+    names = sorted(parameters)
+    return [{'model': model, 'params': dict(zip(names, values))}
+            for values in itertools.product(*(parameters[n] for n in names))]
+
+
+def config_key(config):
+    return json.dumps(config, sort_keys=True, default=float)
+
+
+def make_model(config):
+    import darts.models
+    from darts.utils.utils import SeasonalityMode
+
+    params = dict(config['params'])
+    if 'season_mode' in params:
+        params['season_mode'] = SeasonalityMode(params['season_mode'])
+    return getattr(darts.models, config['model'])(**params)
+
+
+@memory.cache(ignore=['series'])
+def transformed(key, transform, series):
+    """Fitted transformer and transformed series, memoized by series hash."""
+    if transform is None:
+        return None, series
+    from darts.dataprocessing.transformers import BoxCox
+    transformer = BoxCox()
+    return transformer, transformer.fit_transform(series)
+
+
+@memory.cache(ignore=['config', 'series'])
+def historical_forecasts(key, series_key, window, config, series):
+    """Historical forecasts of a config over a window, on the original
+    scale, memoized by (config, series hash, window)."""
+    transformer, values = transformed(series_key, window['transform'],
+                                      series)
+    forecasts = make_model(config).historical_forecasts(
+        values, start=pd.Timestamp(window['start']),
+        forecast_horizon=window['horizon'], stride=window.get('stride', 1),
+        last_points_only=True, verbose=False)
+    if transformer is not None:
+        forecasts = transformer.inverse_transform(forecasts)
+    return forecasts
+
+
+def evaluate(config, window, series, series_key):
+    """Backtest one config over one window; never raises."""
+    from darts.metrics import mape, smape
+
+    row = {'model': config['model'], 'params': config_key(config['params']),
+           'series': series_key, 'start': window['start'],
+           'horizon': window['horizon'],
+           'transform': window['transform'] or 'none',
+           'smape': None, 'mape': None, 'error': None}
+    start = time.perf_counter()
+    try:
+        forecasts = historical_forecasts(config_key(config), series_key,
+                                         window, config, series)
+        row['smape'] = float(smape(series, forecasts))
+        row['mape'] = float(mape(series, forecasts))
+    except Exception as e:
+        row['error'] = '{}: {}'.format(type(e).__name__, e)
+    row['seconds'] = time.perf_counter() - start
+    return row
+
+
+def default_windows(series, days=14, horizons=(1, 2, 7),
+                    transforms=(None, 'boxcox')):
+    """Backtest windows starting `days` before the end of the series."""
+    start = (series.end_time() - pd.Timedelta(days=days)).isoformat()
+    return [{'start': start, 'horizon': h, 'transform': t}
+            for h in horizons for t in transforms]
+
+
+def run(series, configs, windows, workers=None, path=results_path):
+    """Backtest every config over every window in a process pool.
+
+    Rows are appended to the `results` table of the SQLite file at `path`
+    as tasks finish.
+
+    Returns:
+        DataFrame of this run's results
+    """
+    key = series_hash(series)
+    tasks = list(itertools.product(configs, windows))
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+
+    rows = []
+    with ProcessPoolExecutor(max_workers=workers) as pool, \
+            sqlite3.connect(path) as con:
+        futures = [pool.submit(evaluate, config, window, series, key)
+                   for config, window in tasks]
+        for i, future in enumerate(futures, 1):
+            row = future.result()
+            rows.append(row)
+            pd.DataFrame([row]).to_sql('results', con, if_exists='append',
+                                       index=False)
+            if i % 50 == 0 or i == len(futures):
+                print('{}/{} backtests done'.format(i, len(futures)))
+    return pd.DataFrame(rows)
+
+
+def query(sql, path=results_path):
+    """Run a SQL query against the results table."""
+    with sqlite3.connect(path) as con:
+        return pd.read_sql_query(sql, con)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Parallel grid search and backtests of the follower '
+        'forecasting models.')
+    parser.add_argument('--series', default=series_path,
+                        help='profile growth CSV (default: %(default)s)')
+    parser.add_argument('--column', default='Followers')
+    parser.add_argument('--models', nargs='+', default=list(default_grids),
+                        choices=list(default_grids))
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--query', help='only run this SQL query against '
+                        'the results table')
+    args = parser.parse_args()
+
+    if args.query:
+        print(query(args.query).to_string(index=False))
+    else:
+        series = load_series(args.series, args.column)
+        configs = [config for model in args.models
+                   for config in expand_grid(model, default_grids[model])]
+        results = run(series, configs, default_windows(series), args.workers)
+        print(results.sort_values('smape').head(10).to_string(index=False))
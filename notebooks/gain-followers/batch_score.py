@@ -0,0 +1,180 @@
+"""Score the scraped candidate pool with the trained follower model.
+
+Streams the profile chunk files written by the scraper, runs
+``preprocess.joblib`` and ``final_model.pkl`` on large batches across a pool
+of worker processes and appends the probabilities to a CSV as batches
+finish, so memory stays bounded by the number of batches in flight.
+
+Usage::
+
+    python batch_score.py                      # traveltrackie + others chunks
+    python batch_score.py data/chunks/*.csv --batch-size 50000 --workers 8
+"""
+import argparse
+import os
+import pickle
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import joblib
+import pandas as pd
+
+import drift
+import filenames
+
+# column order the preprocess transformer was fitted with
+features = ['is_private', 'mediacount', 'followers', 'followees',
+            'is_business_account', 'has_public_story']
+
+scores_path = filenames.processed_data_path.joinpath('candidate_scores.csv')
+
+_preprocess = None
+_model = None
+
+
+def bundle_path(resources_path=filenames.resources_path):
+    """Latest training bundle written by train.py, resources_path itself
+    when there is none."""
+    latest = resources_path.joinpath('artifacts', 'LATEST')
+    if latest.exists():
+        return resources_path.joinpath('artifacts',
+                                       latest.read_text().strip())
+    return resources_path
+
+
+def load_model(resources_path=filenames.resources_path):
+    """Load the fitted preprocess transformer and the final model, from the
+    latest training bundle written by train.py when there is one."""
+    resources_path = bundle_path(resources_path)
+    preprocess = joblib.load(resources_path.joinpath('preprocess.joblib'))
+    with open(resources_path.joinpath('final_model.pkl'), 'rb') as f:
+        model = pickle.load(f)
+    return preprocess, model
+
+
+def _init_worker(resources_path):
+    global _preprocess, _model
+    _preprocess, _model = load_model(resources_path)
+    # parallelism comes from the process pool, keep each forest single-core
+    estimator = getattr(_model, 'best_estimator_', _model)
+    if hasattr(estimator, 'n_jobs'):
+        estimator.n_jobs = 1
+
+
+def score_batch(batch, preprocess=None, model=None):
+    """Predict the follower probability of a batch of profiles.
+
+    Args:
+        batch (DataFrame): profiles with a username and the model features
+        preprocess: fitted column transformer, the worker's copy if None
+        model: fitted classifier, the worker's copy if None
+    Returns:
+        DataFrame with username and follower_probability; profiles with
+        missing features get a NaN probability
+    """
+    if preprocess is None:
+        preprocess, model = _preprocess, _model
+
+    X = batch[features].replace({False: 0, True: 1})
+    complete = X.notna().all(axis=1).to_numpy()
+    scores = pd.DataFrame({'username': batch['username'].to_numpy(),
+                           'follower_probability': float('nan')})
+    if complete.any():
+        X = preprocess.transform(X[complete])
+        scores.loc[complete, 'follower_probability'] = \
+            model.predict_proba(X)[:, 1]
+    return scores
+
+
+def iter_batches(paths, batch_size):
+    """Yield batches of profiles from the chunk files, reading only the
+    columns the model needs."""
+    for path in paths:
+        for batch in pd.read_csv(path, usecols=['username'] + features,
+                                 chunksize=batch_size):
+            yield batch
+
+
+def chunk_files(folders=(filenames.traveltrackie_chunks_path,
+                         filenames.others_chunks_path), pattern='*.csv'):
+    paths = []
+    for folder in folders:
+        paths.extend(sorted(folder.glob(pattern)))
+    return paths
+
+
+def run(paths, output_path=scores_path, batch_size=20000, workers=None,
+        resources_path=filenames.resources_path):
+    """Score every profile in paths and append the results to output_path.
+
+    At most two batches per worker are in flight at any time and results are
+    written in input order. The features and probabilities are added to the
+    drift monitor (resources_path/drift.json) when the model bundle has a
+    drift reference.
+
+    Returns:
+        number of profiles scored
+    """
+    workers = workers or os.cpu_count()
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    if output_path.exists():
+        output_path.unlink()
+
+    scored = 0
+    start = time.perf_counter()
+    monitor = drift.load_monitor(bundle_path(resources_path),
+                                 resources_path.joinpath(drift.state_name))
+
+    def write(scores):
+        nonlocal scored
+        scores.to_csv(output_path, mode='a', index=False,
+                      header=not output_path.exists())
+        scored += len(scores)
+        if monitor is not None:
+            monitor.update(scores)
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(resources_path,)) as pool:
+        pending = deque()
+        for batch in iter_batches(paths, batch_size):
+            pending.append(pool.submit(score_batch, batch))
+            if monitor is not None:
+                monitor.update(batch)
+            if len(pending) >= 2 * workers:
+                write(pending.popleft().result())
+                elapsed = time.perf_counter() - start
+                print('{:,} profiles scored, {:,.0f} profiles/s'.format(
+                    scored, scored / elapsed))
+        while pending:
+            write(pending.popleft().result())
+
+    elapsed = time.perf_counter() - start
+    print('Scored {:,} profiles in {:.1f}s ({:,.0f} profiles/s) -> {}'.format(
+        scored, elapsed, scored / elapsed if elapsed else 0, output_path))
+    if monitor is not None:
+        monitor.save()
+        print(monitor.report().to_string(index=False))
+    return scored
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Batch score candidate profiles with the final model.')
+    parser.add_argument('paths', nargs='*',
+                        help='chunk CSV files (default: all files under the '
+                        'traveltrackie and others chunks folders)')
+    parser.add_argument('--output', default=scores_path,
+                        help='output CSV (default: %(default)s)')
+    parser.add_argument('--batch-size', type=int, default=20000)
+    parser.add_argument('--workers', type=int, default=None,
+                        help='worker processes (default: all cores)')
+    parser.add_argument('--resources', default=filenames.resources_path,
+                        help='folder with preprocess.joblib and '
+                        'final_model.pkl, or with an artifacts/LATEST bundle')
+    args = parser.parse_args()
+
+    paths = [Path(p) for p in args.paths] or chunk_files()
+    run(paths, Path(args.output), args.batch_size, args.workers,
+        Path(args.resources))
@@ -0,0 +1,247 @@
+"""Drift of the scored profiles from the training data.
+
+Training writes ``drift_reference.json`` into the model bundle: histograms of
+the six model features and of the predicted ``follower_probability`` on the
+held-out test set. The numeric features are binned at the deciles of the
+reference, the binary ones at 0/1 and the probability in 20 equal bins; each
+histogram has an extra bin for missing values, and values outside the
+reference range fall in the first or last bin.
+
+As ``batch_score.py`` scores new profiles, their bin counts are added to the
+counts of the day, and the population stability index (PSI) and the
+Kolmogorov-Smirnov distance of the binned distributions are computed for the
+day and for the last ``window_days`` days with scored profiles. Only bin
+counts are kept, for a bounded number of days, so memory and the size of
+the state file do not grow with the number of profiles. The state is
+written to ``dash-app/resources/drift.json`` for the dashboard's Drift tab
+and starts over when a new bundle is trained.
+
+PSI below 0.1 is read as stable, 0.1 to 0.25 as a moderate shift and above
+0.25 as drift worth retraining for.
+
+Usage::
+
+    python drift.py                  # scores of the last window
+    python drift.py --days 14
+"""
+import argparse
+import json
+import os
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+import filenames
+
+state_name = 'drift.json'
+state_path = filenames.resources_path.joinpath(state_name)
+reference_name = 'drift_reference.json'
+
+# name: kind of histogram
+features = {'mediacount': 'numeric', 'followers': 'numeric',
+            'followees': 'numeric', 'is_private': 'binary',
+            'is_business_account': 'binary', 'has_public_story': 'binary',
+            'follower_probability': 'score'}
+
+n_bins = 10
+score_bins = 20
+# days of bin counts kept, the rolling window of the drift scores
+window_days = 30
+# days of daily scores kept
+history_days = 365
+psi_thresholds = (0.1, 0.25)
+# floor of the bin shares, so empty bins do not make the PSI infinite
+epsilon = 1e-4
+
+
+def _values(column):
+    return pd.to_numeric(column.replace({True: 1, False: 0, 'True': 1,
+                                         'False': 0}), errors='coerce') \
+        .to_numpy(dtype=np.float64)
+
+
+def _edges(kind, values):
+    """Inner bin edges of a reference column."""
+    if kind == 'binary':
+        return [0.5]
+    if kind == 'score':
+        return np.linspace(0, 1, score_bins + 1)[1:-1].tolist()
+    values = values[~np.isnan(values)]
+    if len(values) == 0:
+        return []
+    quantiles = np.quantile(values, np.linspace(0, 1, n_bins + 1)[1:-1])
+    return np.unique(quantiles).tolist()
+
+
+def histogram(values, edges):
+    """Counts of values in the bins of the inner edges, then missing."""
+    values = np.asarray(values, dtype=np.float64)
+    missing = np.isnan(values)
+    bins = np.searchsorted(edges, values[~missing], side='right')
+    counts = np.bincount(bins, minlength=len(edges) + 1)
+    return np.append(counts, missing.sum()).astype(np.int64)
+
+
+def reference(df):
+    """Reference histograms of the columns of `features` in df."""
+    hists = {}
+    for name, kind in features.items():
+        if name not in df:
+            continue
+        values = _values(df[name])
+        edges = _edges(kind, values)
+        hists[name] = {'kind': kind, 'edges': edges,
+                       'counts': histogram(values, edges).tolist()}
+    return {'rows': len(df), 'features': hists}
+
+
+def write_reference(df, path):
+    """Write the reference histograms of a bundle."""
+    with open(path, 'w') as f:
+        json.dump(reference(df), f)
+
+
+def _shares(counts):
+    counts = np.asarray(counts, dtype=np.float64)
+    return np.maximum(counts / max(counts.sum(), 1), epsilon)
+
+
+def psi(expected, actual):
+    """Population stability index of two histograms of the same bins."""
+    e, a = _shares(expected), _shares(actual)
+    return float(np.sum((a - e) * np.log(a / e)))
+
+
+def ks(expected, actual):
+    """Largest distance between the binned CDFs, missing values left out."""
+    e = np.cumsum(expected[:-1]) / max(np.sum(expected[:-1]), 1)
+    a = np.cumsum(actual[:-1]) / max(np.sum(actual[:-1]), 1)
+    return float(np.max(np.abs(a - e))) if len(e) else 0.0
+
+
+def status(value):
+    if value < psi_thresholds[0]:
+        return 'stable'
+    return 'moderate' if value < psi_thresholds[1] else 'drift'
+
+
+class Monitor:
+    """Bin counts of the scored profiles and their drift scores.
+
+    Args:
+        reference (dict): reference histograms written by training
+        version (str): bundle the reference belongs to
+        path (Path): state file, reset when it belongs to another bundle
+    """
+
+    def __init__(self, reference, version=None, path=state_path):
+        self.path = path
+        self.state = {'version': version, 'reference': reference,
+                      'days': {}, 'scores': {}, 'window': {}}
+        if os.path.exists(path):
+            with open(path) as f:
+                state = json.load(f)
+            if state.get('version') == version:
+                self.state = state
+        self._edges = {name: np.asarray(hist['edges'])
+                       for name, hist in reference['features'].items()}
+
+    def update(self, batch, day=None):
+        """Add the bin counts of the columns of a batch to its day.
+
+        The batch can hold the features, the predicted probability or both.
+        """
+        day = day or date.today().isoformat()
+        counts = self.state['days'].setdefault(day, {})
+        for name, edges in self._edges.items():
+            if name not in batch:
+                continue
+            new = histogram(_values(batch[name]), edges)
+            old = counts.get(name)
+            counts[name] = (new + old if old is not None else new).tolist()
+
+    def _scores(self, counts):
+        scores = {}
+        for name, hist in self.state['reference']['features'].items():
+            if name not in counts:
+                continue
+            expected = np.asarray(hist['counts'])
+            actual = np.asarray(counts[name])
+            value = psi(expected, actual)
+            scores[name] = {'psi': round(value, 4),
+                            'ks': round(ks(expected, actual), 4),
+                            'rows': int(actual.sum()),
+                            'status': status(value)}
+        return scores
+
+    def save(self):
+        """Score the days and the window, drop old days and write the state
+        file."""
+        days = self.state['days']
+        for day in sorted(days)[:-window_days]:
+            del days[day]
+        window = {}
+        for counts in days.values():
+            for name, values in counts.items():
+                window[name] = np.asarray(values) + window.get(name, 0)
+        for day, counts in days.items():
+            self.state['scores'][day] = self._scores(counts)
+        for day in sorted(self.state['scores'])[:-history_days]:
+            del self.state['scores'][day]
+        self.state['window'] = self._scores(window)
+        self.state['window_days'] = sorted(days)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_name(self.path.name + '.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(self.state, f)
+        os.replace(tmp_path, self.path)
+
+    def report(self, days=None):
+        """Drift scores of the window (or of the last `days` days) as a
+        DataFrame with one row per feature."""
+        if days is None:
+            scores = self.state['window']
+        else:
+            window = {}
+            for day in sorted(self.state['days'])[-days:]:
+                for name, values in self.state['days'][day].items():
+                    window[name] = np.asarray(values) + window.get(name, 0)
+            scores = self._scores(window)
+        return pd.DataFrame.from_dict(scores, orient='index') \
+            .rename_axis('feature').reset_index()
+
+
+def load_monitor(bundle, path=state_path):
+    """Monitor of a model bundle, None when the bundle has no reference."""
+    reference_path = os.path.join(bundle, reference_name)
+    if not os.path.exists(reference_path):
+        return None
+    with open(reference_path) as f:
+        reference = json.load(f)
+    return Monitor(reference, os.path.basename(os.path.normpath(bundle)),
+                   path)
+
+
+if __name__ == '__main__':
+    from pathlib import Path
+
+    import batch_score
+
+    parser = argparse.ArgumentParser(
+        description='Print the drift scores of the scored profiles.')
+    parser.add_argument('--resources', type=Path,
+                        default=filenames.resources_path,
+                        help='folder of the model bundle and of the drift '
+                        'state (default: %(default)s)')
+    parser.add_argument('--days', type=int,
+                        help='score the last DAYS days (default: the '
+                        'window of the last batch_score run)')
+    args = parser.parse_args()
+
+    monitor = load_monitor(batch_score.bundle_path(args.resources),
+                           args.resources.joinpath(state_name))
+    if monitor is None:
+        raise SystemExit('The model bundle has no drift reference; retrain '
+                         'with train.py.')
+    print(monitor.report(args.days).to_string(index=False))
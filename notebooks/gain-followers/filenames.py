@@ -3,6 +3,9 @@ from pathlib import Path
 
 # Use of parents1
 data_path = Path.cwd().parents[1].joinpath('data')
+# the dash app's resources/ folder, which it reads from its own cwd
+resources_path = Path.cwd().parents[1].joinpath('notebooks', 'dash-app',
+                                                'resources')
 
 #folders
 raw_data_path = data_path.joinpath('raw')
@@ -0,0 +1,465 @@
+"""On-disk index of follower snapshots.
+
+``followers.txt`` is overwritten by the scraper, and labelling used to read it
+row by row into a list for ``df['username'].isin(follower)``. This index keeps
+every snapshot instead: usernames are mapped to stable integer ids, and each
+day is stored as the ids gained and lost since the previous snapshot, with a
+full sorted id array every ``checkpoint_every`` snapshots (compressed
+``.npz``). Sorted ids are stored as the varint (LEB128) bytes of their gaps,
+one byte per id for most lists.
+
+Any past day is rebuilt from the last checkpoint before it, replaying at most
+``checkpoint_every`` deltas, and only a few rebuilt snapshots are kept in
+memory. Daily counts, gains and losses are read from the catalog alone, and
+retention cohorts are computed in one pass over the history holding a single
+follower set, so a year of snapshots never has to be in memory at once.
+
+Usage from a notebook::
+
+    import follower_index
+    index = follower_index.update()
+    df['is_follower'] = index.is_follower(df['username']).astype(int)
+    index.churn('2021-01-01', freq='W')
+    index.retention('2021-01-01', freq='M')
+
+or from the command line: ``python follower_index.py``.
+"""
+import argparse
+import json
+import os
+import shutil
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from datetime import date, datetime
+
+import numpy as np
+import pandas as pd
+
+import filenames
+
+index_path = filenames.processed_data_path.joinpath('follower_index')
+
+# a full snapshot is stored every `checkpoint_every` snapshots
+checkpoint_every = 30
+# rebuilt snapshots kept in memory
+cache_size = 4
+
+
+def read_followers(path=filenames.followers_path):
+    """Read a followers text file (one username in the first column)."""
+    usernames = pd.read_csv(path, header=None, usecols=[0], dtype=str,
+                            skip_blank_lines=True)[0]
+    return usernames.dropna().unique()
+
+
+def _varint(values):
+    """LEB128 bytes of non-negative integers: 7 bits per byte, low bits
+    first, the high bit set on every byte of a value but its last."""
+    values = np.asarray(values, dtype=np.uint64)
+    nbytes = np.ones(len(values), dtype=np.int64)
+    rest = values >> np.uint64(7)
+    while rest.any():
+        nbytes += rest > 0
+        rest >>= np.uint64(7)
+    starts = np.cumsum(nbytes) - nbytes
+    out = np.empty(nbytes.sum(), dtype=np.uint8)
+    for k in range(nbytes.max() if len(values) else 0):
+        has = nbytes > k
+        low = (values[has] >> np.uint64(7 * k)) & np.uint64(0x7f)
+        out[starts[has] + k] = low | np.uint64(0x80) * (nbytes[has] > k + 1)
+    return out
+
+
+def _unvarint(data):
+    data = np.asarray(data, dtype=np.uint8)
+    if len(data) == 0:
+        return np.zeros(0, dtype=np.uint64)
+    ends = np.flatnonzero(data < 0x80) + 1
+    starts = np.concatenate([[0], ends[:-1]])
+    shift = 7 * (np.arange(len(data)) - np.repeat(starts, ends - starts))
+    low = (data & 0x7f).astype(np.uint64) << shift.astype(np.uint64)
+    return np.bitwise_or.reduceat(low, starts)
+
+
+def _encode(ids):
+    """Varint bytes of the gaps of a sorted id array."""
+    return _varint(np.diff(ids, prepend=0) if len(ids) else ids)
+
+
+def _decode(data, encoding='varint'):
+    """Inverse of _encode. Snapshots written before the varint encoding
+    store the gaps in the smallest unsigned dtype (encoding 'gaps')."""
+    if encoding == 'varint':
+        data = _unvarint(data)
+    return np.cumsum(data, dtype=np.int64)
+
+
+def _as_date(value):
+    if value is None:
+        return date.today().isoformat()
+    return pd.Timestamp(value).date().isoformat()
+
+
+class FollowerIndex:
+    """Follower snapshots keyed by integer user id.
+
+    Args:
+        path (Path): folder holding the index files
+    """
+
+    def __init__(self, path=index_path):
+        self.path = path
+        self.path.mkdir(parents=True, exist_ok=True)
+        self._catalog_path = self.path.joinpath('catalog.json')
+        self._vocab_path = self.path.joinpath('usernames.txt')
+
+        self.catalog = []
+        if self._catalog_path.exists():
+            with open(self._catalog_path) as f:
+                self.catalog = json.load(f)
+
+        usernames = []
+        if self._vocab_path.exists():
+            with open(self._vocab_path, encoding='utf-8') as f:
+                usernames = f.read().splitlines()
+        self.vocab = pd.Index(usernames, dtype=object)
+        self._cache = OrderedDict()
+
+    @property
+    def dates(self):
+        return [entry['date'] for entry in self.catalog]
+
+    def _ids(self, usernames, add=False):
+        usernames = pd.Index(pd.unique(np.asarray(usernames, dtype=object)))
+        ids = self.vocab.get_indexer(usernames)
+        if add and (ids == -1).any():
+            new = usernames[ids == -1]
+            with open(self._vocab_path, 'a', encoding='utf-8') as f:
+                f.write(''.join(name + '\n' for name in new))
+            self.vocab = self.vocab.append(new)
+            ids = self.vocab.get_indexer(usernames)
+        return ids
+
+    def _snapshot_path(self, snapshot_date):
+        return self.path.joinpath(snapshot_date + '.npz')
+
+    def _write_catalog(self):
+        tmp_path = self._catalog_path.with_suffix('.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(self.catalog, f, indent=1)
+        os.replace(tmp_path, self._catalog_path)
+
+    def _remember(self, snapshot_date, ids):
+        self._cache[snapshot_date] = ids
+        self._cache.move_to_end(snapshot_date)
+        while len(self._cache) > cache_size:
+            self._cache.popitem(last=False)
+
+    def _write(self, entry, ids, added, removed):
+        """Write the file of a new catalog entry, a checkpoint when the last
+        one is `checkpoint_every` snapshots old or the delta would not be
+        smaller than the full list."""
+        since = 0
+        for previous in reversed(self.catalog):
+            if previous['kind'] == 'full':
+                break
+            since += 1
+        full = (not self.catalog or since + 1 >= checkpoint_every
+                or len(added) + len(removed) >= len(ids))
+        entry.update(kind='full' if full else 'delta', encoding='varint')
+        if full:
+            np.savez_compressed(self._snapshot_path(entry['date']),
+                                ids=_encode(ids))
+        else:
+            np.savez_compressed(self._snapshot_path(entry['date']),
+                                added=_encode(added), removed=_encode(removed))
+
+    def add_snapshot(self, usernames, snapshot_date=None):
+        """Record the follower list of a day.
+
+        Snapshots must be added in date order. Adding a snapshot for a date
+        that is already recorded is a no-op.
+
+        Args:
+            usernames (array-like): followers on that day
+            snapshot_date (str or date): defaults to today
+        Returns:
+            the catalog entry of the snapshot
+        """
+        snapshot_date = _as_date(snapshot_date)
+        if snapshot_date in self.dates:
+            return self.catalog[self.dates.index(snapshot_date)]
+        if self.catalog and snapshot_date < self.catalog[-1]['date']:
+            raise ValueError(
+                'snapshot for {} is older than the last snapshot {}'.format(
+                    snapshot_date, self.catalog[-1]['date']))
+
+        ids = np.sort(self._ids(usernames, add=True)).astype(np.int64)
+        previous = self.snapshot() if self.catalog else ids[:0]
+        added = np.setdiff1d(ids, previous, assume_unique=True)
+        removed = np.setdiff1d(previous, ids, assume_unique=True)
+        entry = {'date': snapshot_date, 'count': len(ids),
+                 'gained': len(added), 'lost': len(removed)}
+        self._write(entry, ids, added, removed)
+
+        self.catalog.append(entry)
+        self._write_catalog()
+        self._remember(snapshot_date, ids)
+        return entry
+
+    def _resolve(self, snapshot_date):
+        """Latest recorded snapshot date on or before snapshot_date."""
+        if not self.catalog:
+            raise ValueError('the follower index is empty')
+        if snapshot_date is None:
+            return self.catalog[-1]['date']
+        snapshot_date = _as_date(snapshot_date)
+        position = bisect_right(self.dates, snapshot_date)
+        if position == 0:
+            raise ValueError(
+                'no follower snapshot on or before {}'.format(snapshot_date))
+        return self.dates[position - 1]
+
+    def _load(self, entry):
+        """{name: sorted ids} stored for a catalog entry: ids for a
+        checkpoint, added and removed for a delta."""
+        encoding = entry.get('encoding', 'gaps')
+        with np.load(self._snapshot_path(entry['date'])) as data:
+            return {name: _decode(data[name], encoding)
+                    for name in data.files}
+
+    def _replay(self, start=None, end=None):
+        """Walk the snapshots from start to end (dates included), holding a
+        single follower set.
+
+        The walk starts from the last checkpoint on or before start, or from
+        a cached snapshot between the two when there is one.
+
+        Yields:
+            (entry, ids, added, removed) per snapshot; added and removed are
+            None for the first snapshot yielded unless it is the first one
+            of the index
+        """
+        dates = self.dates
+        first = 0 if start is None else bisect_left(dates, _as_date(start))
+        last = len(dates) if end is None else bisect_right(dates,
+                                                           _as_date(end))
+        if first >= last:
+            return
+        position = first
+        while self.catalog[position]['kind'] != 'full' \
+                and dates[position] not in self._cache:
+            position -= 1
+
+        ids = None
+        for i in range(position, last):
+            entry = self.catalog[i]
+            if ids is None and entry['date'] in self._cache:
+                current, added, removed = self._cache[entry['date']], None, \
+                    None
+            else:
+                stored = self._load(entry)
+                if 'ids' in stored:
+                    current, added, removed = stored['ids'], None, None
+                    if ids is not None and i >= first:
+                        added = np.setdiff1d(current, ids, assume_unique=True)
+                        removed = np.setdiff1d(ids, current,
+                                               assume_unique=True)
+                else:
+                    added, removed = stored['added'], stored['removed']
+                    current = np.union1d(
+                        np.setdiff1d(ids, removed, assume_unique=True), added)
+            if i == 0:
+                added, removed = current, current[:0]
+            ids = current
+            if i >= first:
+                yield entry, ids, added, removed
+
+    def snapshot(self, snapshot_date=None):
+        """Sorted follower ids on a date (the latest snapshot by default)."""
+        snapshot_date = self._resolve(snapshot_date)
+        if snapshot_date not in self._cache:
+            for _, ids, _, _ in self._replay(snapshot_date, snapshot_date):
+                self._remember(snapshot_date, ids)
+        self._cache.move_to_end(snapshot_date)
+        return self._cache[snapshot_date]
+
+    def usernames(self, ids):
+        """Map ids back to usernames."""
+        return self.vocab[np.asarray(ids, dtype=np.int64)].to_numpy()
+
+    def followers(self, snapshot_date=None):
+        """Usernames following on a date (the latest snapshot by default)."""
+        return self.usernames(self.snapshot(snapshot_date))
+
+    def is_follower(self, usernames, snapshot_date=None):
+        """Vectorized membership test.
+
+        Args:
+            usernames (array-like): usernames to test
+            snapshot_date (str or date): defaults to the latest snapshot
+        Returns:
+            boolean numpy array aligned with usernames
+        """
+        members = self.snapshot(snapshot_date)
+        ids = self.vocab.get_indexer(np.asarray(usernames, dtype=object))
+        if len(members) == 0:
+            return np.zeros(len(ids), dtype=bool)
+        position = np.searchsorted(members, ids).clip(max=len(members) - 1)
+        return (ids >= 0) & (members[position] == ids)
+
+    def diff(self, start, end):
+        """Followers gained and lost between two dates.
+
+        Returns:
+            tuple of (gained usernames, lost usernames)
+        """
+        before = self.snapshot(start)
+        after = self.snapshot(end)
+        gained = np.setdiff1d(after, before, assume_unique=True)
+        lost = np.setdiff1d(before, after, assume_unique=True)
+        return self.usernames(gained), self.usernames(lost)
+
+    def churn(self, start=None, end=None, freq=None):
+        """Daily follower counts, gains and losses, read from the catalog
+        without loading any snapshot.
+
+        Args:
+            start, end: date range (included), None for the whole history
+            freq (str): pandas frequency ('W', 'M', ...) to sum the gains
+                and losses over, with the follower count at the end of
+                each period
+        Returns:
+            DataFrame indexed by date with followers, gained, lost and net
+        """
+        churn = pd.DataFrame(self.catalog,
+                             columns=['date', 'count', 'gained', 'lost'])
+        churn['date'] = pd.to_datetime(churn['date'])
+        churn = churn.rename(columns={'count': 'followers'}).set_index('date')
+        churn['net'] = churn['gained'] - churn['lost']
+        churn = churn.loc[start:end]
+        if freq is not None:
+            churn = churn.resample(freq).agg(
+                {'followers': 'last', 'gained': 'sum', 'lost': 'sum',
+                 'net': 'sum'}).dropna(subset=['followers'])
+            churn['followers'] = churn['followers'].astype(np.int64)
+        return churn
+
+    def retention(self, start=None, end=None, freq='W', normalize=True):
+        """Retention cohorts of the followers gained from start to end.
+
+        A follower belongs to the cohort of the period it was first gained
+        in; followers of the first snapshot of the range belong to none.
+        The history is replayed once, holding one follower set and a cohort
+        number per known username.
+
+        Args:
+            start, end: date range (included), None for the whole history
+            freq (str): pandas frequency of the cohorts and of the columns
+            normalize (bool): shares of each cohort instead of counts
+        Returns:
+            DataFrame indexed by cohort period, with the number of followers
+            gained in the cohort ('gained') and, for every period, the
+            share (or count) of the cohort still following at its last
+            snapshot
+        """
+        cohort = np.full(len(self.vocab), -1, dtype=np.int32)
+        periods, counts = [], []
+        ids = None
+        for entry, current, added, _ in self._replay(start, end):
+            period = pd.Period(entry['date'], freq)
+            if not periods or period != periods[-1]:
+                if ids is not None:
+                    counts.append(self._cohort_counts(cohort, ids, periods))
+                periods.append(period)
+            if ids is None:
+                # the followers already there when the range starts
+                cohort[current] = -2
+            else:
+                new = added[cohort[added] == -1]
+                cohort[new] = len(periods) - 1
+            ids = current
+        if ids is None:
+            return pd.DataFrame(columns=['gained'])
+        counts.append(self._cohort_counts(cohort, ids, periods))
+
+        matrix = np.zeros((len(periods), len(periods)))
+        for column, column_counts in enumerate(counts):
+            matrix[:len(column_counts), column] = column_counts
+        index = pd.PeriodIndex(periods, name='cohort')
+        # a cohort has no retention before the period it was gained in
+        table = pd.DataFrame(matrix, index=index, columns=index.rename(None))
+        table = table.where(np.triu(np.ones(matrix.shape, dtype=bool)))
+        gained = np.bincount(cohort[cohort >= 0], minlength=len(periods))
+        if normalize:
+            table = table.div(np.where(gained > 0, gained, np.nan), axis=0)
+        table.insert(0, 'gained', gained)
+        return table
+
+    @staticmethod
+    def _cohort_counts(cohort, ids, periods):
+        """Followers in `ids` per cohort seen so far."""
+        members = cohort[ids]
+        return np.bincount(members[members >= 0], minlength=len(periods))
+
+    def repack(self):
+        """Rewrite the index with the current encoding and checkpoints.
+
+        The snapshots are written to a folder next to the index, which is
+        then renamed into place.
+        """
+        tmp_path = self.path.with_name(
+            '{}.{}.tmp'.format(self.path.name, os.getpid()))
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        try:
+            packed = FollowerIndex(tmp_path)
+            shutil.copyfile(self._vocab_path, packed._vocab_path)
+            packed.vocab = self.vocab
+            for entry, ids, added, removed in self._replay():
+                new = {key: entry[key]
+                       for key in ['date', 'count', 'gained', 'lost']}
+                packed._write(new, ids, added, removed)
+                packed.catalog.append(new)
+            packed._write_catalog()
+            old_path = self.path.with_name(
+                '{}.{}.old'.format(self.path.name, os.getpid()))
+            os.replace(self.path, old_path)
+            os.replace(tmp_path, self.path)
+            shutil.rmtree(old_path)
+        finally:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+        self.catalog = packed.catalog
+        self._cache.clear()
+        return self
+
+
+def update(path=filenames.followers_path, snapshot_date=None):
+    """Record a followers file in the index, dated by the file's
+    modification time unless a date is given, and return the index."""
+    index = FollowerIndex()
+    if snapshot_date is None:
+        snapshot_date = datetime.fromtimestamp(os.path.getmtime(path)).date()
+    index.add_snapshot(read_followers(path), snapshot_date)
+    return index
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Record a follower list in the follower index.')
+    parser.add_argument('path', nargs='?', default=filenames.followers_path,
+                        help='followers file (default: followers.txt)')
+    parser.add_argument('--date', help='snapshot date, YYYY-MM-DD '
+                        '(default: modification date of the file)')
+    parser.add_argument('--repack', action='store_true',
+                        help='rewrite the index with the current encoding '
+                        'and checkpoints instead of recording a file')
+    args = parser.parse_args()
+
+    if args.repack:
+        index = FollowerIndex().repack()
+        print('Repacked {} snapshots, {} checkpoints'.format(
+            len(index.catalog),
+            sum(entry['kind'] == 'full' for entry in index.catalog)))
+    else:
+        entry = update(args.path, args.date).catalog[-1]
+        print('{date}: {count} followers, +{gained} -{lost}'.format(**entry))
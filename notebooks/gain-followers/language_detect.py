@@ -0,0 +1,151 @@
+"""Batched, cached language detection of the profile biographies.
+
+Biographies are hashed and only the hashes missing from the cache are sent
+to ``cld2``, in chunks across a pool of worker processes, so re-runs only
+touch new or edited bios and identical bios are detected once. The cache and
+the result are tidy tables with one row per (biography, language) and the
+share of the text in that language, the primary language being rank 0.
+
+Usage::
+
+    python language_detect.py --workers 8
+"""
+import argparse
+import hashlib
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+import filenames
+
+cache_path = filenames.processed_data_path.joinpath('language_cache.parquet')
+languages_path = filenames.processed_data_path.joinpath('languages.parquet')
+
+cache_columns = ['hash', 'rank', 'language', 'share']
+
+
+def bio_hash(bios):
+    """sha1 of each biography, None for missing ones."""
+    return pd.Series([hashlib.sha1(bio.encode('utf-8', 'surrogatepass'))
+                      .hexdigest() if isinstance(bio, str) else None
+                      for bio in bios], index=getattr(bios, 'index', None),
+                     dtype=object)
+
+
+def _detect(bio):
+    import pycld2 as cld2
+    try:
+        _, _, details = cld2.detect(bio)
+    except cld2.error:
+        # cld2 rejects control characters and invalid utf-8
+        bio = ''.join(c for c in bio if c.isprintable())
+        bio = bio.encode('utf-8', 'ignore').decode('utf-8')
+        try:
+            _, _, details = cld2.detect(bio)
+        except cld2.error:
+            details = ()
+    return [(name.capitalize(), percent / 100) for name, _, percent, _
+            in details if name != 'Unknown' and percent > 0]
+
+
+def detect_chunk(hashes, bios):
+    """Cache rows for a chunk of biographies; a bio without any detected
+    language gets a single row with no language so it is not retried."""
+    rows = []
+    for key, bio in zip(hashes, bios):
+        languages = _detect(bio)
+        if not languages:
+            rows.append((key, 0, None, None))
+        rows.extend((key, rank, language, share)
+                    for rank, (language, share) in enumerate(languages))
+    return rows
+
+
+def load_cache(path=cache_path):
+    if os.path.exists(path):
+        return pd.read_parquet(path)
+    return pd.DataFrame(columns=cache_columns)
+
+
+def save_cache(cache, path=cache_path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = str(path) + '.tmp'
+    cache.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, path)
+
+
+def update_cache(bios, path=cache_path, workers=None, chunk_size=20000,
+                 verbose=True):
+    """Detect the languages of the biographies missing from the cache.
+
+    Args:
+        bios (Series): biographies, missing values are skipped
+        path (Path): parquet cache keyed by biography hash
+        workers (int): worker processes, one per core if None
+        chunk_size (int): biographies sent to a worker at a time
+    Returns:
+        the cache DataFrame
+    """
+    cache = load_cache(path)
+    bios = bios.dropna().astype(str)
+    hashes = bio_hash(bios)
+    new = ~hashes.isin(cache['hash']) & ~hashes.duplicated()
+    hashes, bios = hashes[new].tolist(), bios[new].tolist()
+    if not hashes:
+        return cache
+
+    start = time.perf_counter()
+    rows = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(detect_chunk, hashes[i:i + chunk_size],
+                               bios[i:i + chunk_size])
+                   for i in range(0, len(hashes), chunk_size)]
+        for future in futures:
+            rows.extend(future.result())
+    new_rows = pd.DataFrame(rows, columns=cache_columns)
+    cache = pd.concat([cache, new_rows], ignore_index=True) \
+        if len(cache) else new_rows
+    save_cache(cache, path)
+    if verbose:
+        print('Detected {} new biographies in {:.1f}s ({} cached)'.format(
+            len(hashes), time.perf_counter() - start,
+            cache['hash'].nunique()))
+    return cache
+
+
+def detect_languages(df, path=cache_path, workers=None, verbose=True):
+    """Tidy language table of the profiles.
+
+    Args:
+        df (DataFrame): profiles with userid and biography
+    Returns:
+        DataFrame with userid, rank, language and share, one row per
+        profile and detected language; rank 0 is the primary language
+    """
+    cache = update_cache(df['biography'], path, workers, verbose=verbose)
+    keys = pd.DataFrame({'userid': df['userid'].to_numpy(),
+                         'hash': bio_hash(df['biography']).to_numpy()})
+    languages = keys.merge(cache.dropna(subset=['language']), on='hash')
+    return languages[['userid', 'rank', 'language', 'share']] \
+        .sort_values(['userid', 'rank'], kind='mergesort') \
+        .reset_index(drop=True)
+
+
+def primary_language(languages):
+    """Primary language per userid from the tidy table."""
+    return languages[languages['rank'] == 0].set_index('userid')['language']
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Detect the language of the profile biographies.')
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args()
+
+    import profile_store
+    df = profile_store.load_profiles(columns=['userid', 'biography'])
+    languages = detect_languages(df, workers=args.workers)
+    languages.to_parquet(languages_path, index=False)
+    print(primary_language(languages).value_counts().head(10).to_string())
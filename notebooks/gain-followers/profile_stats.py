@@ -0,0 +1,288 @@
+"""Streaming hypothesis tests of the profile features against is_follower.
+
+Notebook 03 runs ``chi2_contingency``, ``ttest_ind`` and ``pearsonr`` one
+feature at a time over the full frame. This module keeps the sufficient
+statistics of every test instead: follower/non-follower counts of the binary
+features, per-class counts, means and sums of squared deviations of the
+numeric features (Welford, merged across batches with Chan's formulas), the
+co-moment matrix of the numeric features and is_follower, and per-category
+summaries for the one-way ANOVA. A new batch of profiles is folded into the
+state in one vectorized pass and the report is computed from the state alone.
+
+Usage from a notebook::
+
+    import profile_stats
+    stats = profile_stats.FollowerStats()
+    stats.update(df)
+    stats.report()
+
+or from the command line: ``python profile_stats.py`` to fold the profiles
+not counted yet into the stored state and print the report.
+"""
+import argparse
+import json
+import os
+
+import numpy as np
+import pandas as pd
+from scipy import stats as st
+
+import filenames
+
+stats_path = filenames.processed_data_path.joinpath('profile_stats')
+
+target = 'is_follower'
+binary = ['is_private', 'is_business_account', 'has_public_story']
+numeric = ['mediacount', 'followers', 'followees']
+# one-way ANOVA of `anova_value` across the categories of `anova_group`
+anova_group = 'business_category_name'
+anova_value = 'followers'
+
+
+def merge_moments(n_a, mean_a, m2_a, n_b, mean_b, m2_b):
+    """Merge counts, means and sums of squared deviations of two samples
+    (Chan et al.); works element-wise on arrays."""
+    n = n_a + n_b
+    with np.errstate(invalid='ignore', divide='ignore'):
+        delta = mean_b - mean_a
+        mean = np.where(n > 0, mean_a + delta * n_b / n, 0.0)
+        m2 = m2_a + m2_b + np.where(n > 0, delta ** 2 * n_a * n_b / n, 0.0)
+    return n, mean, m2
+
+
+def merge_comoments(n_a, mean_a, c_a, n_b, mean_b, c_b):
+    """Merge the co-moment matrices of two samples."""
+    n = n_a + n_b
+    if n == 0:
+        return n, mean_a, c_a
+    delta = mean_b - mean_a
+    mean = mean_a + delta * n_b / n
+    return n, mean, c_a + c_b + np.outer(delta, delta) * n_a * n_b / n
+
+
+def _as_numbers(df, columns):
+    return df[columns].replace({False: 0, True: 1}) \
+        .apply(pd.to_numeric, errors='coerce').astype(float)
+
+
+class FollowerStats:
+    """Sufficient statistics of the feature tests against is_follower.
+
+    Args:
+        path (Path): folder of the stored state, None to keep it in memory
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.correlated = numeric + [target]
+        k = len(self.correlated)
+        self.state = {
+            'binary_ones': np.zeros((2, len(binary))),
+            'binary_n': np.zeros((2, len(binary))),
+            'n': np.zeros((2, len(numeric))),
+            'mean': np.zeros((2, len(numeric))),
+            'm2': np.zeros((2, len(numeric))),
+            'rows': 0,
+            'co_n': 0, 'co_mean': np.zeros(k), 'co_m2': np.zeros((k, k)),
+        }
+        self.groups = pd.DataFrame(columns=['n', 'mean', 'm2'], dtype=float)
+        self.seen = np.empty(0, dtype='int64')
+        if path is not None and path.joinpath('state.json').exists():
+            self._load()
+
+    def _load(self):
+        with open(self.path.joinpath('state.json')) as f:
+            state = json.load(f)
+        self.state = {key: np.asarray(value) if isinstance(value, list)
+                      else value for key, value in state['moments'].items()}
+        self.groups = pd.DataFrame.from_dict(
+            state['groups'], orient='index', dtype=float) \
+            .reindex(columns=['n', 'mean', 'm2'])
+        self.seen = np.load(self.path.joinpath('seen.npy'))
+
+    def save(self):
+        self.path.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.joinpath('seen.npy.tmp')
+        with open(tmp_path, 'wb') as f:
+            np.save(f, self.seen)
+        os.replace(tmp_path, self.path.joinpath('seen.npy'))
+        state = {'moments': {key: value.tolist()
+                             if isinstance(value, np.ndarray) else value
+                             for key, value in self.state.items()},
+                 'groups': self.groups.to_dict('index')}
+        tmp_path = self.path.joinpath('state.json.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self.path.joinpath('state.json'))
+
+    def update(self, df):
+        """Fold a batch of labelled profiles into the statistics.
+
+        Profiles whose userid was already counted are skipped, so each
+        profile is counted once, with its label at the time it was first
+        seen.
+
+        Args:
+            df (DataFrame): profiles with the features, is_follower and userid
+        Returns:
+            number of profiles added
+        """
+        if 'userid' in df:
+            userids = df['userid'].to_numpy(dtype='int64')
+            new = ~np.isin(userids, self.seen) \
+                & ~pd.Series(userids).duplicated().to_numpy()
+            df = df[new]
+            self.seen = np.union1d(self.seen, userids[new])
+        df = df[df[target].notna()]
+        if not len(df):
+            return 0
+        y = df[target].astype(int).to_numpy()
+        s = self.state
+        s['rows'] += len(df)
+
+        # binary features: per-class count of ones and of non-missing values
+        X = _as_numbers(df, binary)
+        by_class = X.groupby(y)
+        ones = by_class.sum().reindex([0, 1]).fillna(0).to_numpy()
+        n = by_class.count().reindex([0, 1]).fillna(0).to_numpy()
+        s['binary_ones'] = s['binary_ones'] + ones
+        s['binary_n'] = s['binary_n'] + n
+
+        # numeric features: per-class Welford moments
+        X = _as_numbers(df, numeric)
+        by_class = X.groupby(y)
+        n_b = by_class.count().reindex([0, 1]).fillna(0).to_numpy()
+        mean_b = by_class.mean().reindex([0, 1]).fillna(0).to_numpy()
+        m2_b = (by_class.var(ddof=0).reindex([0, 1]).fillna(0) * n_b) \
+            .to_numpy()
+        s['n'], s['mean'], s['m2'] = merge_moments(
+            s['n'], s['mean'], s['m2'], n_b, mean_b, m2_b)
+
+        # co-moments of the numeric features and the label (complete rows)
+        X = _as_numbers(df, self.correlated).dropna().to_numpy()
+        if len(X):
+            mean_b = X.mean(axis=0)
+            deviations = X - mean_b
+            s['co_n'], s['co_mean'], s['co_m2'] = merge_comoments(
+                s['co_n'], s['co_mean'], s['co_m2'], len(X), mean_b,
+                deviations.T @ deviations)
+
+        # per-category moments for the ANOVA
+        if anova_group in df:
+            values = pd.to_numeric(df[anova_value], errors='coerce')
+            by_group = values.groupby(df[anova_group])
+            batch = pd.DataFrame({'n': by_group.count(),
+                                  'mean': by_group.mean(),
+                                  'm2': by_group.var(ddof=0)
+                                  * by_group.count()}).fillna(0)
+            batch = batch[batch['n'] > 0]
+            groups = self.groups.reindex(
+                self.groups.index.union(batch.index)).fillna(0)
+            batch = batch.reindex(groups.index).fillna(0)
+            n, mean, m2 = merge_moments(*groups.to_numpy().T,
+                                        *batch.to_numpy().T)
+            self.groups = pd.DataFrame({'n': n, 'mean': mean, 'm2': m2},
+                                       index=groups.index)
+        return len(df)
+
+    def contingency(self):
+        """Chi-square tests of independence of each binary feature and
+        is_follower, with Yates' correction like ``chi2_contingency``."""
+        ones = self.state['binary_ones']
+        observed = np.stack([self.state['binary_n'] - ones, ones], axis=2)
+        total = observed.sum(axis=(0, 2))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            expected = observed.sum(axis=2, keepdims=True) \
+                * observed.sum(axis=0, keepdims=True) / total[None, :, None]
+            difference = np.abs(observed - expected)
+            corrected = np.maximum(difference - 0.5, 0)
+            chi2 = (corrected ** 2 / expected).sum(axis=(0, 2))
+        return pd.DataFrame({'test': 'chi2', 'feature': binary,
+                             'statistic': chi2, 'p_value': st.chi2.sf(chi2, 1),
+                             'n': total})
+
+    def ttests(self):
+        """Two-sample t-tests of each numeric feature between followers and
+        non-followers (pooled variance, like ``ttest_ind``)."""
+        n, mean, m2 = self.state['n'], self.state['mean'], self.state['m2']
+        with np.errstate(invalid='ignore', divide='ignore'):
+            std = np.sqrt(m2 / (n - 1))
+            t, p = st.ttest_ind_from_stats(mean[1], std[1], n[1],
+                                           mean[0], std[0], n[0])
+        return pd.DataFrame({'test': 't', 'feature': numeric, 'statistic': t,
+                             'p_value': p, 'n': n.sum(axis=0),
+                             'mean_follower': mean[1],
+                             'mean_non_follower': mean[0]})
+
+    def correlations(self):
+        """Pearson correlation of every pair of numeric features and
+        is_follower, with the p-value of ``pearsonr``."""
+        n, c = self.state['co_n'], self.state['co_m2']
+        with np.errstate(invalid='ignore', divide='ignore'):
+            r = c / np.sqrt(np.outer(np.diag(c), np.diag(c)))
+            r = np.clip(r, -1, 1)
+            t = r * np.sqrt((n - 2) / (1 - r ** 2))
+            p = 2 * st.t.sf(np.abs(t), n - 2)
+        i, j = np.triu_indices(len(self.correlated), k=1)
+        return pd.DataFrame({
+            'test': 'pearson',
+            'feature': [self.correlated[a] + ' ~ ' + self.correlated[b]
+                        for a, b in zip(i, j)],
+            'statistic': r[i, j], 'p_value': p[i, j], 'n': n})
+
+    def anova(self, categories=None):
+        """One-way ANOVA of the followers across business categories."""
+        groups = self.groups[self.groups['n'] > 0]
+        if categories is not None:
+            groups = groups.reindex(categories).dropna()
+        n, k = groups['n'].sum(), len(groups)
+        if k < 2 or n <= k:
+            return pd.DataFrame(columns=['test', 'feature', 'statistic',
+                                         'p_value', 'n'])
+        grand = (groups['n'] * groups['mean']).sum() / n
+        between = (groups['n'] * (groups['mean'] - grand) ** 2).sum()
+        within = groups['m2'].sum()
+        f = (between / (k - 1)) / (within / (n - k))
+        return pd.DataFrame({'test': ['anova'],
+                             'feature': [anova_value + ' ~ ' + anova_group],
+                             'statistic': [f],
+                             'p_value': [st.f.sf(f, k - 1, n - k)],
+                             'n': [n]})
+
+    def report(self, alpha=0.05):
+        """Every test in one table, with the significant ones flagged."""
+        report = pd.concat([self.contingency(), self.ttests(),
+                            self.correlations(), self.anova()],
+                           ignore_index=True, sort=False)
+        report['significant'] = report['p_value'] < alpha
+        return report
+
+
+def refresh(path=stats_path):
+    """Fold the stored profiles not counted yet into the stored state."""
+    import follower_index
+    import profile_store
+
+    profile_store.ingest(verbose=False)
+    stats = FollowerStats(path)
+    userids = profile_store.load_profiles(columns=['userid'])['userid']
+    new = userids[~userids.isin(stats.seen)]
+    if len(new):
+        df = profile_store.load_profiles(userids=new)
+        df[target] = follower_index.update().is_follower(df['username']) \
+            .astype(int)
+        stats.update(df)
+        stats.save()
+    print('Added {} profiles ({} counted).'.format(len(new),
+                                                   stats.state['rows']))
+    return stats
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Update the streaming feature statistics and print the '
+        'significance report.')
+    parser.add_argument('--alpha', type=float, default=0.05)
+    args = parser.parse_args()
+
+    print(refresh().report(args.alpha).to_string(index=False))
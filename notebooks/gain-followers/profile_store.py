@@ -0,0 +1,183 @@
+"""Incremental columnar store for the scraped profile CSVs.
+
+The notebooks used to glob every CSV under ``filenames.profile_folder_path``,
+concatenate them and drop duplicate ``userid`` rows on every run. This module
+ingests only the CSVs that are new or changed since the last run into parquet
+partitions bucketed by ``userid`` and keeps the latest row for each user, so
+loading the profile table is a column/partition read.
+
+Usage from a notebook::
+
+    import profile_store
+    profile_store.ingest()
+    df = profile_store.load_profiles()
+
+or from the command line: ``python profile_store.py``.
+"""
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+import filenames
+
+store_path = filenames.processed_data_path.joinpath('profile_store')
+n_partitions = 16
+
+# internal column used to keep the most recently written row for a user
+_mtime_column = '_mtime_ns'
+
+
+def _manifest_path(path):
+    return path.joinpath('manifest.json')
+
+
+def _partition_path(path, partition):
+    return path.joinpath('part-{:03d}.parquet'.format(partition))
+
+
+def _read_manifest(path):
+    manifest_path = _manifest_path(path)
+    if not manifest_path.exists():
+        return {'n_partitions': n_partitions, 'files': {}}
+    with open(manifest_path) as f:
+        return json.load(f)
+
+
+def _write_atomic(df, path):
+    tmp_path = path.with_name(path.name + '.tmp')
+    df.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, path)
+
+
+def partition_of(userids, partitions=n_partitions):
+    """Return the partition number of each userid.
+
+    Args:
+        userids (array-like): profile ids
+        partitions (int): number of partitions in the store
+    Returns:
+        numpy array of partition numbers
+    """
+    return np.asarray(userids, dtype='int64') % partitions
+
+
+def changed_files(folder_path=filenames.profile_folder_path, path=store_path):
+    """List the CSV files that are new or changed since the last ingest,
+    oldest first."""
+    seen = _read_manifest(path)['files']
+    changed = []
+    for f in folder_path.glob('*.csv'):
+        stat = f.stat()
+        entry = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+        if seen.get(f.name) != entry:
+            changed.append((stat.st_mtime_ns, f.name, f, entry))
+    changed.sort(key=lambda item: item[:2])
+    return [(f, entry) for _, _, f, entry in changed]
+
+
+def ingest(folder_path=filenames.profile_folder_path, path=store_path,
+           verbose=True):
+    """Append new or changed profile CSVs to the store.
+
+    Each partition touched by the new rows is rewritten with only the latest
+    row per userid. Files that were already ingested and have not changed
+    are not read again.
+
+    Args:
+        folder_path (Path): folder holding the raw profile CSVs
+        path (Path): store folder
+        verbose (bool): print a summary
+    Returns:
+        number of new rows read
+    """
+    path.mkdir(parents=True, exist_ok=True)
+    manifest = _read_manifest(path)
+    partitions = manifest['n_partitions']
+
+    files = changed_files(folder_path, path)
+    if not files:
+        if verbose:
+            print('Profile store is up to date.')
+        return 0
+
+    appended_data = []
+    for f, entry in files:
+        data = pd.read_csv(f)
+        data[_mtime_column] = entry['mtime_ns']
+        appended_data.append(data)
+    new = pd.concat(appended_data, ignore_index=True)
+    new = new.dropna(subset=['userid'])
+    new['userid'] = new['userid'].astype('int64')
+
+    for partition, rows in new.groupby(partition_of(new['userid'], partitions)):
+        partition_path = _partition_path(path, partition)
+        if partition_path.exists():
+            rows = pd.concat([pd.read_parquet(partition_path), rows],
+                             ignore_index=True)
+        rows = rows.sort_values(_mtime_column, kind='mergesort')
+        rows = rows.drop_duplicates(subset=['userid'], keep='last')
+        _write_atomic(rows.reset_index(drop=True), partition_path)
+
+    # only record the files once their rows are safely in the partitions
+    for f, entry in files:
+        manifest['files'][f.name] = entry
+    tmp_manifest = _manifest_path(path).with_suffix('.tmp')
+    with open(tmp_manifest, 'w') as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(tmp_manifest, _manifest_path(path))
+
+    if verbose:
+        print('Ingested {} rows from {} files.'.format(len(new), len(files)))
+    return len(new)
+
+
+def load_profiles(columns=None, partitions=None, userids=None,
+                  path=store_path):
+    """Load the deduplicated profile table from the store.
+
+    Args:
+        columns (list): columns to read, all columns if None
+        partitions (list): partition numbers to read, all if None
+        userids (array-like): only return these users; implies the
+            partitions they live in
+        path (Path): store folder
+    Returns:
+        DataFrame with one row per userid
+    """
+    n = _read_manifest(path)['n_partitions']
+    if userids is not None:
+        userids = np.unique(np.asarray(userids, dtype='int64'))
+        partitions = np.unique(partition_of(userids, n)).tolist()
+    if partitions is None:
+        partitions = range(n)
+
+    read_columns = None
+    if columns is not None:
+        read_columns = list(columns)
+        if userids is not None and 'userid' not in read_columns:
+            read_columns.append('userid')
+
+    frames = []
+    for partition in partitions:
+        partition_path = _partition_path(path, partition)
+        if partition_path.exists():
+            frames.append(pd.read_parquet(partition_path,
+                                          columns=read_columns))
+    if not frames:
+        return pd.DataFrame(columns=columns)
+
+    df = pd.concat(frames, ignore_index=True)
+    if userids is not None:
+        df = df[df['userid'].isin(userids)]
+        if columns is not None:
+            df = df[list(columns)]
+    if _mtime_column in df.columns and (columns is None
+                                        or _mtime_column not in columns):
+        df = df.drop(columns=[_mtime_column])
+    return df.reset_index(drop=True)
+
+
+if __name__ == '__main__':
+    ingest()
@@ -0,0 +1,491 @@
+"""Concurrent, resumable scraping of profiles and posts.
+
+Usernames are fetched by a pool of threads through a backend, under a
+token-bucket rate limit shared by the threads. Results are written in chunk
+files with the columns the notebooks read: profiles to
+``traveltrackie/chunks/chunk_<n>.csv`` (the profile CSV schema read by
+``profile_store`` and ``batch_score``) and posts to ``raw/post/post_<n>.csv``
+(the schema read by ``posts/post_features.py``). After each chunk is on disk
+its usernames are appended to ``extracted_todate/usernames_todate.txt``, and a
+new run skips every username listed there, so a crashed run resumes where it
+stopped. A crash between the two writes scrapes a chunk again; the readers
+drop duplicate profiles and posts.
+
+Backends:
+
+- ``instaloader``: Instagram through Instaloader, optionally logged in with a
+  saved session.
+- ``fake``: deterministic profiles and posts made up from the username, with
+  a simulated latency and rate-limit errors, for offline runs.
+
+Failures are appended to ``raw/log/log_<date>.txt``.
+
+Usage::
+
+    python scraper.py usernames.txt --backend fake --workers 8
+    python scraper.py usernames.txt --login my_account --rate 0.5 --posts 12
+"""
+import argparse
+import os
+import threading
+import time
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+import filenames
+
+post_folder_path = filenames.raw_data_path.joinpath('post')
+
+profile_columns = ['userid', 'username', 'full_name', 'biography',
+                   'external_url', 'is_private', 'is_verified',
+                   'is_business_account', 'business_category_name',
+                   'has_public_story', 'mediacount', 'igtvcount', 'followers',
+                   'followees', 'profile_pic_url', 'followed_by_viewer',
+                   'follows_viewer', 'blocked_by_viewer', 'has_blocked_viewer',
+                   'requested_by_viewer', 'has_requested_viewer']
+
+post_columns = ['url', 'owner_id', 'owner_username', 'date_utc', 'typename',
+                'is_video', 'video_view_count', 'likes', 'comments',
+                'is_sponsored', 'caption_hashtags', 'caption_mentions',
+                'tagged_users', 'days_ago']
+
+# posts returned by one request of the web API
+posts_per_page = 12
+
+
+class NotFound(Exception):
+    """The profile does not exist or cannot be read."""
+
+
+class RateLimited(Exception):
+    """The backend asked to slow down; the request can be retried."""
+
+
+class BackendError(Exception):
+    """The request failed otherwise; the username is logged and left for
+    the next run."""
+
+
+class Backend:
+    """Source of profiles and posts.
+
+    ``profile`` returns a dict with the keys of `profile_columns`, ``posts``
+    a list of dicts with the keys of `post_columns` but ``days_ago``. Both
+    raise NotFound, RateLimited or BackendError, and are called from several
+    threads.
+    """
+
+    def profile(self, username):
+        raise NotImplementedError
+
+    def posts(self, username, limit):
+        raise NotImplementedError
+
+
+class InstaloaderBackend(Backend):
+    """Instagram through Instaloader, one Instaloader context per thread.
+
+    Args:
+        login (str): account whose saved session is loaded (see
+            ``instaloader --login``), anonymous if None
+        session_file (str): session file, Instaloader's default if None
+    """
+
+    def __init__(self, login=None, session_file=None):
+        self.login = login
+        self.session_file = session_file
+        self._local = threading.local()
+
+    def _loader(self):
+        import instaloader
+        if not hasattr(self._local, 'loader'):
+            loader = instaloader.Instaloader(
+                download_pictures=False, download_videos=False,
+                download_video_thumbnails=False, save_metadata=False,
+                quiet=True, max_connection_attempts=1)
+            if self.login:
+                loader.load_session_from_file(self.login, self.session_file)
+            self._local.loader = loader
+        return self._local.loader
+
+    def _call(self, func):
+        from instaloader import exceptions
+        try:
+            return func()
+        except (exceptions.ProfileNotExistsException,
+                exceptions.QueryReturnedNotFoundException,
+                exceptions.PrivateProfileNotFollowedException) as e:
+            raise NotFound(str(e))
+        except (exceptions.TooManyRequestsException,
+                exceptions.ConnectionException) as e:
+            raise RateLimited(str(e))
+        except (exceptions.InstaloaderException, KeyError) as e:
+            # login required, bad responses, or a field missing from the
+            # returned metadata
+            raise BackendError('{}: {}'.format(type(e).__name__, e))
+
+    def _profile(self, username):
+        """Profile of a username, reusing the one the thread fetched last
+        so that ``posts`` does not load it again after ``profile``."""
+        import instaloader
+        last = getattr(self._local, 'profile', None)
+        if last is None or last.username != username.lower():
+            last = instaloader.Profile.from_username(self._loader().context,
+                                                     username)
+            self._local.profile = last
+        return last
+
+    def profile(self, username):
+        def fetch():
+            # the attributes can make requests of their own
+            profile = self._profile(username)
+            return {column: getattr(profile, column)
+                    for column in profile_columns}
+        return self._call(fetch)
+
+    def posts(self, username, limit):
+        def fetch():
+            profile = self._profile(username)
+            if profile.is_private and not profile.followed_by_viewer:
+                return []
+            posts = []
+            for post in profile.get_posts():
+                if len(posts) >= limit:
+                    break
+                posts.append({column: getattr(post, column)
+                              for column in post_columns[:-1]})
+            return posts
+        return self._call(fetch)
+
+
+class FakeBackend(Backend):
+    """Made-up profiles and posts, the same for a username on every call.
+
+    Args:
+        latency (float): seconds each request sleeps
+        rate_limit_share (float): share of requests raising RateLimited
+        missing_share (float): share of usernames raising NotFound
+        seed (int): varies the made-up data
+    """
+
+    def __init__(self, latency=0.05, rate_limit_share=0.0, missing_share=0.0,
+                 seed=0):
+        self.latency = latency
+        self.rate_limit_share = rate_limit_share
+        self.missing_share = missing_share
+        self.seed = seed
+        self._errors = np.random.default_rng(seed)
+        self._lock = threading.Lock()
+
+    def _request(self):
+        time.sleep(self.latency)
+        with self._lock:
+            limited = self._errors.random() < self.rate_limit_share
+        if limited:
+            raise RateLimited('fake rate limit')
+
+    def _rng(self, username):
+        return np.random.default_rng(
+            [self.seed, zlib.crc32(username.encode('utf-8'))])
+
+    def profile(self, username):
+        self._request()
+        return self._made_up(username)
+
+    def _made_up(self, username):
+        rng = self._rng(username)
+        if rng.random() < self.missing_share:
+            raise NotFound(username)
+        business = bool(rng.random() < 0.25)
+        return {
+            'userid': int(rng.integers(10 ** 9, 6 * 10 ** 10)),
+            'username': username,
+            'full_name': username.replace('_', ' ').title(),
+            'biography': ' '.join(rng.choice(
+                ['travel', 'photo', 'life', 'nature', 'food', 'explore'],
+                int(rng.integers(0, 6)))),
+            'external_url': None,
+            'is_private': bool(rng.random() < 0.35),
+            'is_verified': bool(rng.random() < 0.01),
+            'is_business_account': business,
+            'business_category_name': 'Travel' if business else None,
+            'has_public_story': bool(rng.random() < 0.2),
+            'mediacount': int(rng.lognormal(4.0, 1.3)),
+            'igtvcount': int(rng.poisson(0.3)),
+            'followers': int(rng.lognormal(5.5, 1.6)),
+            'followees': int(rng.lognormal(6.0, 1.1)),
+            'profile_pic_url': 'https://example.com/pic.jpg',
+            'followed_by_viewer': False,
+            'follows_viewer': False,
+            'blocked_by_viewer': False,
+            'has_blocked_viewer': False,
+            'requested_by_viewer': False,
+            'has_requested_viewer': False,
+        }
+
+    def posts(self, username, limit):
+        self._request()
+        profile = self._made_up(username)
+        if profile['is_private']:
+            return []
+        rng = self._rng(username + '/posts')
+        posts = []
+        for i in range(min(limit, profile['mediacount'])):
+            typename = rng.choice(['GraphImage', 'GraphVideo',
+                                   'GraphSidecar'], p=[0.6, 0.15, 0.25])
+            posts.append({
+                'url': 'https://www.instagram.com/p/{}{}/'.format(
+                    profile['userid'], i),
+                'owner_id': profile['userid'],
+                'owner_username': username,
+                'date_utc': datetime(2022, 2, 4) - timedelta(
+                    seconds=int(rng.integers(0, 3 * 365 * 86400))),
+                'typename': typename,
+                'is_video': typename == 'GraphVideo',
+                'video_view_count': int(rng.integers(100, 50000))
+                if typename == 'GraphVideo' else None,
+                'likes': int(rng.lognormal(4.0, 1.4)),
+                'comments': int(rng.poisson(6)),
+                'is_sponsored': bool(rng.random() < 0.02),
+                'caption_hashtags': rng.choice(
+                    ['travel', 'wanderlust', 'nature', 'explore'],
+                    int(rng.poisson(3))).tolist(),
+                'caption_mentions': [],
+                'tagged_users': [],
+            })
+        return posts
+
+
+backends = {'instaloader': InstaloaderBackend, 'fake': FakeBackend}
+
+
+class TokenBucket:
+    """Thread-safe token bucket: `rate` tokens a second, at most `burst`
+    saved up.
+
+    Args:
+        rate (float): tokens added per second
+        burst (float): capacity of the bucket
+    """
+
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens=1):
+        """Block until `tokens` are available and take them."""
+        tokens = min(tokens, self.burst)
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens
+                                   + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait = (tokens - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+def read_usernames(path):
+    """Usernames of a text file, one per line, in order, without
+    duplicates; an empty list if the file does not exist."""
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding='utf-8') as f:
+        usernames = [line.strip() for line in f]
+    return list(dict.fromkeys(name for name in usernames if name))
+
+
+def log(message, path=None):
+    """Append a timestamped line to the log file of the day."""
+    path = path or '{}{}.txt'.format(filenames.log_path,
+                                     date.today().isoformat())
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write('{} {}\n'.format(datetime.now().isoformat(timespec='seconds'),
+                                 message))
+
+
+def _next_chunk(folder, prefix):
+    numbers = [int(path.stem[len(prefix):]) for path in
+               folder.glob(prefix + '*.csv')
+               if path.stem[len(prefix):].isdigit()]
+    return max(numbers, default=-1) + 1
+
+
+def _write_csv(df, folder, prefix):
+    folder.mkdir(parents=True, exist_ok=True)
+    path = folder.joinpath('{}{}.csv'.format(prefix,
+                                             _next_chunk(folder, prefix)))
+    tmp_path = path.with_suffix('.tmp')
+    df.to_csv(tmp_path, index=False)
+    os.replace(tmp_path, path)
+    return path
+
+
+def fetch(backend, bucket, username, posts=12, retries=3, backoff=30.0):
+    """Profile and posts of a username.
+
+    Every request takes a token from the bucket; rate-limited requests are
+    retried after `backoff` seconds, doubling each time.
+
+    Returns:
+        (profile dict or None if not found, list of post dicts)
+    """
+    pages = -(-posts // posts_per_page)
+    for attempt in range(retries + 1):
+        try:
+            bucket.acquire(1)
+            profile = backend.profile(username)
+            rows = []
+            if posts and not profile['is_private']:
+                bucket.acquire(pages)
+                rows = backend.posts(username, posts)
+            return profile, rows
+        except NotFound:
+            return None, []
+        except RateLimited:
+            if attempt == retries:
+                raise
+            time.sleep(backoff * 2 ** attempt)
+
+
+class Checkpoint:
+    """Usernames already scraped, appended to usernames_todate.txt once the
+    chunk holding them is written."""
+
+    def __init__(self, path=filenames.todate_path):
+        self.path = path
+        self.done = set(read_usernames(path))
+
+    def add(self, usernames):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(''.join(name + '\n' for name in usernames))
+            f.flush()
+            os.fsync(f.fileno())
+        self.done.update(usernames)
+
+
+def scrape(usernames, backend, workers=4, rate=1.0, burst=5, posts=12,
+           chunk_size=500, retries=3, backoff=30.0,
+           profile_folder=filenames.traveltrackie_chunks_path,
+           post_folder=post_folder_path, checkpoint_path=filenames.todate_path):
+    """Scrape the usernames not yet in the checkpoint file.
+
+    Args:
+        usernames (list): usernames to scrape, in order
+        backend (Backend): source of the profiles and posts
+        workers (int): threads fetching at the same time
+        rate (float): requests a second, shared by the threads
+        burst (int): requests that can be made at once after a pause
+        posts (int): posts fetched per public profile, 0 for none
+        chunk_size (int): usernames per chunk file
+        retries (int): retries of a rate-limited username
+        backoff (float): seconds before the first retry
+    Returns:
+        dict with the number of profiles, posts, missing and failed
+        usernames
+    """
+    checkpoint = Checkpoint(checkpoint_path)
+    todo = [name for name in dict.fromkeys(usernames)
+            if name not in checkpoint.done]
+    bucket = TokenBucket(rate, burst)
+    stats = dict(profiles=0, posts=0, missing=0, failed=0,
+                 skipped=len(set(usernames) & checkpoint.done))
+    start = time.perf_counter()
+    profiles, post_rows, names = [], [], []
+
+    def flush():
+        if profiles:
+            _write_csv(pd.DataFrame(profiles, columns=profile_columns),
+                       profile_folder, 'chunk_')
+        if post_rows:
+            df = pd.DataFrame(post_rows, columns=post_columns)
+            df['days_ago'] = (pd.Timestamp(date.today())
+                              - pd.to_datetime(df['date_utc'])).dt.days
+            _write_csv(df, post_folder, 'post_')
+        if names:
+            checkpoint.add(names)
+        stats['profiles'] += len(profiles)
+        stats['posts'] += len(post_rows)
+        del profiles[:], post_rows[:], names[:]
+        elapsed = time.perf_counter() - start
+        done = stats['profiles'] + stats['missing'] + stats['failed']
+        print('{:,}/{:,} usernames, {:.1f}/s'.format(
+            done, len(todo), done / elapsed if elapsed else 0))
+
+    def collect(username, future):
+        try:
+            profile, rows = future.result()
+        except RateLimited as e:
+            # not checkpointed, the next run tries again
+            stats['failed'] += 1
+            log('rate limited {}: {}'.format(username, e))
+            return
+        except BackendError as e:
+            stats['failed'] += 1
+            log('failed {}: {}'.format(username, e))
+            return
+        names.append(username)
+        if profile is None:
+            stats['missing'] += 1
+            log('not found {}'.format(username))
+            return
+        profiles.append(profile)
+        post_rows.extend(rows)
+        if len(names) >= chunk_size:
+            flush()
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            pending = deque()
+            for username in todo:
+                pending.append((username, pool.submit(
+                    fetch, backend, bucket, username, posts, retries,
+                    backoff)))
+                if len(pending) >= 2 * workers:
+                    collect(*pending.popleft())
+            while pending:
+                collect(*pending.popleft())
+    finally:
+        # keep what was scraped when an unexpected error stops the run
+        flush()
+    return stats
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Scrape profiles and posts into chunk files.')
+    parser.add_argument('paths', nargs='+',
+                        help='text files of usernames, one per line')
+    parser.add_argument('--backend', choices=sorted(backends),
+                        default='instaloader')
+    parser.add_argument('--login', help='Instaloader session to load')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--rate', type=float, default=1.0,
+                        help='requests a second (default: %(default)s)')
+    parser.add_argument('--burst', type=int, default=5)
+    parser.add_argument('--posts', type=int, default=12,
+                        help='posts per public profile (default: '
+                        '%(default)s)')
+    parser.add_argument('--chunk-size', type=int, default=500)
+    args = parser.parse_args()
+
+    backend = InstaloaderBackend(args.login) if args.backend == 'instaloader' \
+        else FakeBackend()
+    usernames = [name for path in args.paths for name in read_usernames(path)]
+    stats = scrape(usernames, backend, args.workers, args.rate, args.burst,
+                   args.posts, args.chunk_size)
+    print('{profiles:,} profiles, {posts:,} posts, {missing:,} not found, '
+          '{failed:,} failed, {skipped:,} already scraped'.format(**stats))
@@ -0,0 +1,249 @@
+"""Daily target lists for the liking method, ranked by follow probability.
+
+Streams scored candidate profiles (``candidate_scores.csv`` written by
+``batch_score.py``, or any CSV with ``username`` and
+``follower_probability`` columns such as ``final_probs.csv``) and keeps the
+``k`` best in a min-heap, so memory is proportional to ``k`` whatever the
+number of candidates. Rows scoring below the current k-th best are dropped
+with a vectorized comparison before anything else is done with them.
+
+Accounts that already follow (``followers.txt``), that were already engaged
+(``post_likes.txt``, ``follow_unfollow.txt``) or that are inactive
+(``inactive.txt``) are excluded through a sorted array of 64-bit username
+hashes. The ranked targets are then split into one CSV per day, each within
+the daily action budget.
+
+Usage::
+
+    python target_queue.py                              # candidate_scores.csv
+    python target_queue.py data/processed/final_probs.csv --days 14
+    python target_queue.py --budget 450 --actions-per-target 3 --top 2000
+"""
+import argparse
+import heapq
+import os
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import batch_score
+import filenames
+from follower_index import read_followers
+
+queue_path = filenames.processed_data_path.joinpath('target_queue')
+
+# usernames that are never targeted
+exclusion_paths = [filenames.followers_path, filenames.post_likes_path,
+                   filenames.follow_unfollow_path, filenames.inactive_path]
+
+# actions (likes) a day, and actions spent on each target
+daily_budget = 300
+actions_per_target = 3
+
+
+def _hash(usernames):
+    return pd.util.hash_array(np.asarray(usernames, dtype=object))
+
+
+class Exclusions:
+    """Usernames read from text files, kept as sorted 64-bit hashes.
+
+    Args:
+        paths (list): text files with one username per line; missing and
+            empty files are skipped
+    """
+
+    def __init__(self, paths=exclusion_paths):
+        hashes = []
+        self.counts = {}
+        for path in paths:
+            path = Path(path)
+            usernames = []
+            if path.exists() and path.stat().st_size > 0:
+                usernames = read_followers(path)
+            self.counts[path.name] = len(usernames)
+            hashes.append(_hash(usernames))
+        self.hashes = np.unique(np.concatenate(hashes)) if hashes \
+            else np.zeros(0, dtype=np.uint64)
+
+    def __len__(self):
+        return len(self.hashes)
+
+    def contains(self, usernames):
+        """Boolean array, True for the excluded usernames."""
+        hashes = _hash(usernames)
+        if len(self.hashes) == 0:
+            return np.zeros(len(hashes), dtype=bool)
+        position = np.searchsorted(self.hashes, hashes)
+        position = position.clip(max=len(self.hashes) - 1)
+        return self.hashes[position] == hashes
+
+
+class TopK:
+    """The k best scored usernames of a stream.
+
+    A username seen twice keeps its best score.
+
+    Args:
+        k (int): number of usernames kept
+    """
+
+    def __init__(self, k):
+        self.k = k
+        self.heap = []
+        self._members = {}
+
+    @property
+    def threshold(self):
+        """Score a candidate must beat to enter."""
+        return self.heap[0][0] if len(self.heap) >= self.k else -np.inf
+
+    def push(self, usernames, scores):
+        """Offer a batch of candidates; NaN scores never enter."""
+        usernames = np.asarray(usernames, dtype=object)
+        scores = np.asarray(scores, dtype=np.float64)
+        keep = scores > self.threshold
+        usernames, scores = usernames[keep], scores[keep]
+        if len(scores) > 1:
+            # best score of each username, before the batch is cut to k
+            best = pd.Series(scores).groupby(usernames, sort=False).max()
+            usernames = best.index.to_numpy(dtype=object)
+            scores = best.to_numpy(dtype=np.float64)
+        if len(scores) > self.k:
+            best = np.argpartition(-scores, self.k - 1)[:self.k]
+            usernames, scores = usernames[best], scores[best]
+        for username, score in zip(usernames.tolist(), scores.tolist()):
+            if username in self._members:
+                if score > self._members[username]:
+                    # rare, the heap is small: update the entry in place
+                    self.heap.remove((self._members[username], username))
+                    self.heap.append((score, username))
+                    heapq.heapify(self.heap)
+                    self._members[username] = score
+                continue
+            if len(self.heap) < self.k:
+                heapq.heappush(self.heap, (score, username))
+            elif (score, username) > self.heap[0]:
+                _, dropped = heapq.heapreplace(self.heap, (score, username))
+                del self._members[dropped]
+            else:
+                continue
+            self._members[username] = score
+
+    def ranked(self):
+        """DataFrame of username and follower_probability, best first."""
+        ranked = sorted(self.heap, reverse=True)
+        return pd.DataFrame({
+            'username': [username for _, username in ranked],
+            'follower_probability': [score for score, _ in ranked]})
+
+
+def rank(paths, k, exclusions=None, chunksize=200000):
+    """Stream scored candidates and keep the k best not excluded.
+
+    Args:
+        paths (list): CSV files with username and follower_probability
+        k (int): number of targets
+        exclusions (Exclusions): defaults to the four exclusion files
+        chunksize (int): rows read at a time
+    Returns:
+        DataFrame of username and follower_probability, best first
+    """
+    exclusions = Exclusions() if exclusions is None else exclusions
+    top = TopK(k)
+    rows = 0
+    start = time.perf_counter()
+    for path in paths:
+        for chunk in pd.read_csv(path, chunksize=chunksize,
+                                 usecols=['username', 'follower_probability']):
+            rows += len(chunk)
+            usernames = chunk['username'].to_numpy(dtype=object)
+            scores = chunk['follower_probability'].to_numpy(dtype=np.float64)
+            # the threshold only rises, so most rows stop here
+            keep = scores > top.threshold
+            usernames, scores = usernames[keep], scores[keep]
+            keep = ~exclusions.contains(usernames)
+            top.push(usernames[keep], scores[keep])
+    elapsed = time.perf_counter() - start
+    print('Ranked {:,} candidates in {:.1f}s ({:,.0f} rows/s), {:,} '
+          'excluded usernames'.format(rows, elapsed,
+                                      rows / elapsed if elapsed else 0,
+                                      len(exclusions)))
+    return top.ranked()
+
+
+def schedule(targets, budget=daily_budget, per_target=actions_per_target,
+             start=None):
+    """Split ranked targets into daily batches within the action budget.
+
+    Returns:
+        the targets with their date and the actions planned for them
+    """
+    per_day = budget // per_target
+    if per_day < 1:
+        raise ValueError('a budget of {} actions is less than one target '
+                         'of {} actions'.format(budget, per_target))
+    start = date.today() if start is None else pd.Timestamp(start).date()
+    day = np.arange(len(targets)) // per_day
+    targets = targets.copy()
+    targets.insert(0, 'date', [(start + timedelta(days=int(d))).isoformat()
+                               for d in day])
+    targets['actions'] = per_target
+    return targets
+
+
+def write(batches, path=queue_path):
+    """Write one targets_<date>.csv per day, replacing the batches of the
+    same and later days from a previous run.
+
+    Returns:
+        list of the files written
+    """
+    path.mkdir(parents=True, exist_ok=True)
+    if len(batches):
+        first = 'targets_{}.csv'.format(batches['date'].min())
+        for old in path.glob('targets_*.csv'):
+            if old.name >= first:
+                old.unlink()
+    written = []
+    for day, batch in batches.groupby('date', sort=True):
+        output = path.joinpath('targets_{}.csv'.format(day))
+        tmp_path = output.with_suffix('.tmp')
+        batch.drop(columns='date').to_csv(tmp_path, index=False)
+        os.replace(tmp_path, output)
+        written.append(output)
+    return written
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Build the daily target lists of the liking method.')
+    parser.add_argument('paths', nargs='*',
+                        help='scored candidate CSVs (default: '
+                        'candidate_scores.csv from batch_score.py)')
+    parser.add_argument('--budget', type=int, default=daily_budget,
+                        help='actions a day (default: %(default)s)')
+    parser.add_argument('--actions-per-target', type=int,
+                        default=actions_per_target,
+                        help='actions on each target (default: %(default)s)')
+    parser.add_argument('--days', type=int, default=7,
+                        help='days of batches (default: %(default)s)')
+    parser.add_argument('--top', type=int,
+                        help='targets kept (default: what the budget allows '
+                        'over --days)')
+    parser.add_argument('--start', help='date of the first batch, '
+                        'YYYY-MM-DD (default: today)')
+    parser.add_argument('--chunksize', type=int, default=200000)
+    parser.add_argument('--output', type=Path, default=queue_path)
+    args = parser.parse_args()
+
+    paths = [Path(p) for p in args.paths] or [batch_score.scores_path]
+    k = args.top or args.days * (args.budget // args.actions_per_target)
+    targets = rank(paths, k, chunksize=args.chunksize)
+    batches = schedule(targets, args.budget, args.actions_per_target,
+                       args.start)
+    for output in write(batches, args.output):
+        print(output)
@@ -0,0 +1,370 @@
+"""Training pipeline of the follower model.
+
+Runs the steps of ``04-modelling-evaluation-predictions.ipynb`` from the
+command line: label the stored profiles, shuffle and split, fit the column
+transformer, drop the training outliers, oversample with SMOTE, compare the
+candidate models, grid search the random forest and export everything the
+dashboard reads. The data preparation stages are memoized on disk with
+``joblib.Memory``, so re-running with other model settings does not repeat
+them; model comparison, cross-validation and the grid search run on all
+cores.
+
+Each run writes a versioned bundle under
+``dash-app/resources/artifacts/<version>`` with a ``manifest.json``, then
+points ``artifacts/LATEST`` at it. The dashboard and ``batch_score.py`` load
+the bundle named in ``LATEST``.
+
+Usage::
+
+    python train.py
+    python train.py --outlier lof --n-jobs 8
+    python train.py --outlier none --no-compare
+"""
+import argparse
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import time
+from datetime import datetime
+from pathlib import Path
+
+import joblib
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+from sklearn import metrics
+from sklearn.compose import make_column_transformer
+from sklearn.ensemble import (HistGradientBoostingClassifier, IsolationForest,
+                              RandomForestClassifier)
+from sklearn.linear_model import LogisticRegression
+from sklearn.model_selection import GridSearchCV, train_test_split
+from sklearn.naive_bayes import GaussianNB
+from sklearn.neighbors import KNeighborsClassifier, LocalOutlierFactor
+from sklearn.preprocessing import OrdinalEncoder, StandardScaler
+from sklearn.utils import shuffle
+
+import drift
+import filenames
+# column order the preprocess transformer is fitted with
+from batch_score import features
+
+artifacts_path = filenames.resources_path.joinpath('artifacts')
+cache_path = filenames.processed_data_path.joinpath('cache', 'train')
+
+memory = joblib.Memory(str(cache_path), verbose=0)
+
+num_selector = ['mediacount', 'followers', 'followees']
+ordinal_selector = ['is_private', 'is_business_account', 'has_public_story']
+
+candidate_models = {
+    'naive bayes': lambda n_jobs: GaussianNB(),
+    'logistic regression': lambda n_jobs: LogisticRegression(),
+    'k-nearest neighbors': lambda n_jobs: KNeighborsClassifier(
+        n_neighbors=4, n_jobs=n_jobs),
+    'random forest': lambda n_jobs: RandomForestClassifier(n_jobs=n_jobs),
+    'hist gradient boosting': lambda n_jobs: HistGradientBoostingClassifier(),
+}
+
+# 'auto' in the notebook's grid is an alias of 'sqrt' for classifiers
+param_grid = {
+    'n_estimators': [10, 100],
+    'max_features': ['sqrt', 'log2'],
+    'max_depth': [4, 5, 6, 7, 8],
+    'criterion': ['gini', 'entropy'],
+}
+
+outlier_methods = ['isolation-forest', 'lof', 'none']
+
+
+def load_dataset():
+    """Stored profiles labelled with is_follower, model columns only."""
+    import follower_index
+    import profile_store
+
+    profile_store.ingest(verbose=False)
+    df = profile_store.load_profiles(columns=['username'] + features)
+    followers = follower_index.update()
+    df['is_follower'] = followers.is_follower(df['username']).astype(int)
+    return df.dropna(subset=features).reset_index(drop=True)
+
+
+@memory.cache
+def split(df, test_size=0.33, random_state=42):
+    """Shuffle, encode booleans as 0/1 and split like the notebook."""
+    df = shuffle(df, random_state=random_state).reset_index(drop=True)
+    df[ordinal_selector] = df[ordinal_selector].astype('int64')
+    X = df.drop(['is_follower'], axis=1)
+    y = df['is_follower'].to_numpy()
+    return train_test_split(X, y, test_size=test_size,
+                            random_state=random_state)
+
+
+@memory.cache
+def fit_preprocess(X_train):
+    preprocess = make_column_transformer(
+        (OrdinalEncoder(), ordinal_selector),
+        (StandardScaler(), num_selector))
+    preprocess.fit(X_train[features])
+    return preprocess
+
+
+@memory.cache(ignore=['n_jobs'])
+def filter_outliers(X, y, method='isolation-forest', random_state=42,
+                    n_jobs=None):
+    """Drop the training rows flagged as outliers.
+
+    'lof' is the notebook's LocalOutlierFactor, whose neighbour search grows
+    quickly with the data; 'isolation-forest' scales linearly and runs on
+    all cores.
+    """
+    if method == 'none':
+        return X, y
+    if method == 'lof':
+        detector = LocalOutlierFactor(n_jobs=n_jobs)
+    elif method == 'isolation-forest':
+        detector = IsolationForest(random_state=random_state, n_jobs=n_jobs)
+    else:
+        raise ValueError('unknown outlier method: {}'.format(method))
+    mask = detector.fit_predict(X) != -1
+    return X[mask, :], y[mask]
+
+
+@memory.cache
+def oversample(X, y, random_state=0):
+    from imblearn.over_sampling import SMOTE
+    sm = SMOTE(random_state=random_state, sampling_strategy='minority',
+               k_neighbors=7)
+    return sm.fit_resample(X, y)
+
+
+def output_columns(preprocess):
+    """Columns of the arrays the fitted transformer outputs, in order."""
+    return [column for name, _, columns in preprocess.transformers_
+            if name != 'remainder' for column in columns]
+
+
+def prepare(df, test_size=0.33, random_state=42, outlier='isolation-forest',
+            n_jobs=None):
+    """Run the cached data preparation stages.
+
+    Returns:
+        dict with the fitted preprocess, the resampled training arrays and
+        the raw and transformed test set
+    """
+    X_train, X_test, y_train, y_test = split(df, test_size, random_state)
+    preprocess = fit_preprocess(X_train)
+    X_train_t = preprocess.transform(X_train[features])
+    X_train_t, y_train = filter_outliers(X_train_t, y_train, outlier,
+                                         random_state, n_jobs)
+    X_train_t, y_train = oversample(X_train_t, y_train)
+    return {'preprocess': preprocess, 'X_train': X_train_t,
+            'y_train': y_train, 'X_test': X_test,
+            'X_test_t': preprocess.transform(X_test[features]),
+            'y_test': y_test}
+
+
+def model_metrics(y_test, predictions):
+    """Calculate 5 standard model metrics, in percent rounded to 0.1."""
+    accuracy = metrics.accuracy_score(y_test, predictions)
+    scores = {'precision': metrics.precision_score(y_test, predictions),
+              'recall': metrics.recall_score(y_test, predictions),
+              'f1 score': metrics.f1_score(y_test, predictions),
+              'accuracy': accuracy, 'error rate': 1 - accuracy,
+              'ROC-AUC': metrics.roc_auc_score(y_test, predictions)}
+    return {key: round(float(value * 100), 1) for key, value in scores.items()}
+
+
+def _score_candidate(name, make, data):
+    model = make(1).fit(data['X_train'], data['y_train'])
+    predictions = model.predict(data['X_test_t'])
+    y_test = data['y_test']
+    return name, [metrics.f1_score(y_test, predictions),
+                  metrics.accuracy_score(y_test, predictions),
+                  metrics.roc_auc_score(y_test, predictions)]
+
+
+def compare_models(data, n_jobs=-1):
+    """Fit every candidate model in parallel and score it on the test set.
+
+    Returns:
+        DataFrame of F1 score, accuracy and AUC score (percent) per model,
+        in the layout of compare_models.csv
+    """
+    results = Parallel(n_jobs=n_jobs)(
+        delayed(_score_candidate)(name, make, data)
+        for name, make in candidate_models.items())
+    scores = pd.DataFrame(dict(results),
+                          index=['F1 score', 'Accuracy', 'AUC score'])
+    return (scores * 100).astype(float).round(1)
+
+
+def grid_search(data, cv=5, random_state=42, n_jobs=-1):
+    """Cross-validated grid search of the random forest on all cores."""
+    search = GridSearchCV(
+        estimator=RandomForestClassifier(random_state=random_state),
+        param_grid=param_grid, cv=cv, n_jobs=n_jobs, verbose=0)
+    search.fit(data['X_train'], data['y_train'])
+    return search
+
+
+def evaluation(model, data):
+    """Evaluation artifacts of the dashboard for the fitted model."""
+    y_test = data['y_test']
+    predictions = model.predict(data['X_test_t'])
+    probabilities = model.predict_proba(data['X_test_t'])[:, 1]
+
+    FPR, TPR, _ = metrics.roc_curve(y_test, probabilities)
+    roc_dict = {'FPR': list(FPR), 'TPR': list(TPR),
+                'y_test': [int(i) for i in y_test],
+                'predictions': [int(i) for i in predictions]}
+
+    matrix = metrics.confusion_matrix(y_test, predictions)
+    cm = pd.DataFrame(matrix, columns=['pred: follower', 'pred: non-follower'])
+    cm[f'n={len(y_test)}'] = ['actual: follower', 'actual: non-follower']
+    cm = cm[[f'n={len(y_test)}', 'pred: follower', 'pred: non-follower']]
+
+    importances = model.best_estimator_.feature_importances_
+    coeffs = pd.DataFrame({'feature': output_columns(data['preprocess']),
+                           'coefficient': np.round(importances, 2)}) \
+        .sort_values(by='coefficient', ascending=False)
+
+    final = pd.concat([data['X_test'].reset_index(drop=True),
+                       pd.DataFrame({'follower_probability': probabilities,
+                                     'actual': y_test})], axis=1)
+    return {'eval_scores': model_metrics(y_test, predictions),
+            'roc_dict': roc_dict, 'confusion_matrix': cm,
+            'coefficients': coeffs, 'final_probs': final}
+
+
+def _sha1(path):
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def write_bundle(version, preprocess, model, compare, evals, params,
+                 path=artifacts_path):
+    """Write the artifact bundle of a run and point LATEST at it.
+
+    Returns:
+        folder of the bundle
+    """
+    bundle = path.joinpath(version)
+    bundle.mkdir(parents=True, exist_ok=False)
+    joblib.dump(preprocess, bundle.joinpath('preprocess.joblib'))
+    with open(bundle.joinpath('final_model.pkl'), 'wb') as f:
+        pickle.dump(model, f)
+    with open(bundle.joinpath('eval_scores.pkl'), 'wb') as f:
+        pickle.dump(evals['eval_scores'], f)
+    with open(bundle.joinpath('roc_dict.json'), 'w') as f:
+        json.dump(evals['roc_dict'], f)
+    evals['confusion_matrix'].to_csv(bundle.joinpath('confusion_matrix.csv'),
+                                     index=False)
+    evals['coefficients'].to_csv(bundle.joinpath('coefficients.csv'),
+                                 index=False)
+    evals['final_probs'].to_csv(bundle.joinpath('final_probs.csv'),
+                                index=False)
+    # histograms of the test set, the baseline of the drift monitor
+    drift.write_reference(evals['final_probs'],
+                          bundle.joinpath(drift.reference_name))
+    previous = latest_bundle(path)
+    if compare is not None:
+        compare.to_csv(bundle.joinpath('compare_models.csv'), index=True)
+    elif previous is not None and \
+            previous.joinpath('compare_models.csv').exists():
+        # keep the last model comparison when it was skipped
+        shutil.copy2(previous.joinpath('compare_models.csv'), bundle)
+
+    manifest = {'version': version,
+                'created': datetime.now().isoformat(timespec='seconds'),
+                'params': params,
+                'best_params': model.best_params_,
+                'eval_scores': evals['eval_scores'],
+                'files': {f.name: _sha1(f) for f in sorted(bundle.iterdir())}}
+    with open(bundle.joinpath('manifest.json'), 'w') as f:
+        json.dump(manifest, f, indent=1, default=str)
+
+    # the dashboard switches to the new bundle once LATEST is replaced
+    tmp_path = path.joinpath('LATEST.tmp')
+    with open(tmp_path, 'w') as f:
+        f.write(version + '\n')
+    os.replace(tmp_path, path.joinpath('LATEST'))
+    return bundle
+
+
+def latest_bundle(path=artifacts_path):
+    """Folder of the bundle LATEST points at, None if there is none."""
+    try:
+        with open(path.joinpath('LATEST')) as f:
+            return path.joinpath(f.read().strip())
+    except FileNotFoundError:
+        return None
+
+
+def run(df, test_size=0.33, random_state=42, outlier='isolation-forest',
+        compare=True, cv=5, n_jobs=-1, version=None, path=artifacts_path):
+    """Train the follower model and write its artifact bundle.
+
+    Returns:
+        folder of the bundle
+    """
+    params = {'test_size': test_size, 'random_state': random_state,
+              'outlier': outlier, 'cv': cv, 'rows': len(df),
+              'followers': int(df['is_follower'].sum())}
+    timings = {}
+
+    start = time.perf_counter()
+    data = prepare(df, test_size, random_state, outlier, n_jobs)
+    timings['prepare'] = time.perf_counter() - start
+
+    comparison = None
+    if compare:
+        start = time.perf_counter()
+        comparison = compare_models(data, n_jobs)
+        timings['compare'] = time.perf_counter() - start
+        print(comparison.to_string())
+
+    start = time.perf_counter()
+    model = grid_search(data, cv, random_state, n_jobs)
+    timings['grid_search'] = time.perf_counter() - start
+    print('Best parameters:', model.best_params_)
+
+    evals = evaluation(model, data)
+    params['seconds'] = {key: round(value, 2)
+                         for key, value in timings.items()}
+    version = version or datetime.now().strftime('%Y-%m-%d_%H-%M-%S')
+    bundle = write_bundle(version, data['preprocess'], model, comparison,
+                          evals, params, path)
+    print('Evaluation:', evals['eval_scores'])
+    print('Wrote {} ({})'.format(bundle, ', '.join(
+        '{} {:.1f}s'.format(key, value) for key, value in timings.items())))
+    return bundle
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Train the follower model and write a versioned artifact '
+        'bundle for the dashboard.')
+    parser.add_argument('--outlier', choices=outlier_methods,
+                        default='isolation-forest',
+                        help='training outlier filter (default: %(default)s)')
+    parser.add_argument('--test-size', type=float, default=0.33)
+    parser.add_argument('--random-state', type=int, default=42)
+    parser.add_argument('--cv', type=int, default=5,
+                        help='cross-validation folds of the grid search')
+    parser.add_argument('--n-jobs', type=int, default=-1,
+                        help='parallel jobs (default: all cores)')
+    parser.add_argument('--no-compare', action='store_true',
+                        help='skip the comparison of the candidate models')
+    parser.add_argument('--version', help='bundle name (default: timestamp)')
+    parser.add_argument('--output', default=artifacts_path,
+                        help='artifacts folder (default: %(default)s)')
+    args = parser.parse_args()
+
+    run(load_dataset(), args.test_size, args.random_state, args.outlier,
+        not args.no_compare, args.cv, args.n_jobs, args.version,
+        Path(args.output))
@@ -0,0 +1,298 @@
+"""Engagement cube of the scraped posts, for best-time-to-post queries.
+
+Every post is counted in one cell of an hour x weekday x ``typename`` x
+hashtag bucket cube (hour and weekday of ``date_utc`` in `timezone`, the
+bucket from the number of caption hashtags), which holds the number of
+posts and the sums of their likes and comments. The cube is built
+incrementally: only the post CSVs that are new or changed since the last
+run are read, and posts already counted (same url) are skipped. Queries
+only touch the 4,032 cells, so they take milliseconds whatever the size of
+the post archive.
+
+The cube is published to ``dash-app/resources/engagement_cube.npz`` for the
+dashboard's Best Time to Post tab, which reads it back with ``load`` and
+queries it with the same methods.
+
+Usage from a notebook::
+
+    import engagement_cube
+    cube = engagement_cube.update()
+    cube.best_slots('GraphSidecar', k=10)
+    cube.heatmap(metric='comments')
+
+or from the command line: ``python engagement_cube.py --best GraphImage``.
+"""
+import argparse
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import filenames
+from hashtag_index import url_keys
+from post_features import parse_list
+
+cube_path = filenames.engagement_cube_path
+published_path = filenames.resources_path.joinpath('engagement_cube.npz')
+
+# time zone of the hours and weekdays
+timezone = 'UTC'
+
+hours = np.arange(24)
+weekdays = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday',
+            'Saturday', 'Sunday']
+typenames = ['GraphImage', 'GraphVideo', 'GraphSidecar', 'other']
+# lower bound of each hashtag bucket
+bucket_edges = [0, 1, 3, 6, 11, 21]
+buckets = ['0', '1-2', '3-5', '6-10', '11-20', '21+']
+
+shape = (len(hours), len(weekdays), len(typenames), len(buckets))
+measures = ['posts', 'likes', 'comments']
+# what the queries rank and average by
+metrics = ['likes', 'comments', 'engagement']
+
+
+def bucket_of(n_hashtags):
+    """Hashtag bucket position of each hashtag count."""
+    return np.searchsorted(bucket_edges, n_hashtags, side='right') - 1
+
+
+def chunk_cube(chunk, tz=timezone):
+    """{measure: cube} of a chunk of posts.
+
+    Posts without a valid date are left out.
+    """
+    date = pd.to_datetime(chunk['date_utc'], errors='coerce', utc=True)
+    date = date.dt.tz_convert(tz)
+    valid = date.notna().to_numpy()
+    n_hashtags = parse_list(chunk['caption_hashtags']).groupby(level=0) \
+        .size().reindex(chunk.index, fill_value=0).to_numpy()
+    typename = pd.Index(typenames).get_indexer(chunk['typename'])
+    typename[typename == -1] = len(typenames) - 1
+    cell = np.ravel_multi_index(
+        (date.dt.hour.fillna(0).to_numpy(dtype=np.int64),
+         date.dt.weekday.fillna(0).to_numpy(dtype=np.int64),
+         typename, bucket_of(n_hashtags)), shape)[valid]
+
+    size = int(np.prod(shape))
+    cube = {'posts': np.bincount(cell, minlength=size)}
+    for measure in ['likes', 'comments']:
+        values = pd.to_numeric(chunk[measure], errors='coerce').fillna(0)
+        cube[measure] = np.bincount(
+            cell, weights=values.to_numpy()[valid], minlength=size)
+    return {measure: np.rint(values).astype(np.int64).reshape(shape)
+            for measure, values in cube.items()}
+
+
+def _select(labels, wanted):
+    """Positions of the wanted labels, all of them for None."""
+    if wanted is None:
+        return np.arange(len(labels))
+    wanted = [wanted] if isinstance(wanted, str) else list(wanted)
+    positions = pd.Index(labels).get_indexer(wanted)
+    if (positions == -1).any():
+        raise ValueError('unknown {}, expected some of {}'.format(
+            [w for w, p in zip(wanted, positions) if p == -1], labels))
+    return positions
+
+
+class EngagementCube:
+    """Posts, likes and comments by hour, weekday, type and hashtag bucket.
+
+    Args:
+        path (Path): folder holding the cube files, None to keep it in memory
+        tz (str): time zone of the hours and weekdays, fixed when the cube
+            is first built
+    """
+
+    def __init__(self, path=cube_path, tz=timezone):
+        self.path = path
+        self.manifest = {'timezone': tz, 'files': {}}
+        self.tz = tz
+        self.cube = {measure: np.zeros(shape, dtype=np.int64)
+                     for measure in measures}
+        self.keys = np.empty(0, dtype=np.uint64)
+        if path is not None:
+            self._load()
+
+    def _load(self):
+        self.path.mkdir(parents=True, exist_ok=True)
+        if self._file('manifest.json').exists():
+            with open(self._file('manifest.json')) as f:
+                self.manifest = json.load(f)
+        self.tz = self.manifest['timezone']
+        if self._file('cube.npz').exists():
+            with np.load(self._file('cube.npz')) as data:
+                self.cube = {measure: data[measure] for measure in measures}
+        if self._file('keys.npy').exists():
+            self.keys = np.load(self._file('keys.npy'))
+
+    def _file(self, name):
+        return self.path.joinpath(name)
+
+    def _replace(self, name, write, mode='wb'):
+        tmp_path = self._file(name + '.tmp')
+        with open(tmp_path, mode) as f:
+            write(f)
+        os.replace(tmp_path, self._file(name))
+
+    def add_posts(self, posts):
+        """Count a DataFrame of posts; posts already counted are skipped.
+
+        Returns:
+            number of posts added
+        """
+        keys = url_keys(posts['url'])
+        position = np.searchsorted(self.keys, keys).clip(
+            max=max(len(self.keys) - 1, 0))
+        seen = self.keys[position] == keys if len(self.keys) \
+            else np.zeros(len(keys), dtype=bool)
+        new = ~seen & ~pd.Series(keys).duplicated().to_numpy()
+        posts = posts[new]
+        for measure, values in chunk_cube(posts, self.tz).items():
+            self.cube[measure] += values
+        self.keys = np.union1d(self.keys, keys[new])
+        return len(posts)
+
+    def changed_files(self, folder_path=filenames.post_path):
+        """Post CSVs that are new or changed since they were counted."""
+        changed = []
+        for f in sorted(folder_path.glob('*.csv')):
+            stat = f.stat()
+            entry = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+            if self.manifest['files'].get(f.name) != entry:
+                changed.append((f, entry))
+        return changed
+
+    def ingest(self, folder_path=filenames.post_path, chunk_size=100000,
+               verbose=True):
+        """Count the posts of the new or changed CSVs of a folder.
+
+        Returns:
+            number of posts added
+        """
+        added = 0
+        files = self.changed_files(folder_path)
+        for f, entry in files:
+            for chunk in pd.read_csv(
+                    f, chunksize=chunk_size,
+                    usecols=['url', 'date_utc', 'typename', 'likes',
+                             'comments', 'caption_hashtags']):
+                added += self.add_posts(chunk.dropna(subset=['url']))
+            self.manifest['files'][f.name] = entry
+        if files:
+            self.save()
+        if verbose:
+            print('Counted {} new posts from {} files ({} posts).'.format(
+                added, len(files), len(self.keys)))
+        return added
+
+    def save(self):
+        """Write the cube files; the manifest is written last."""
+        self._replace('cube.npz', lambda f: np.savez(f, **self.cube))
+        self._replace('keys.npy', lambda f: np.save(f, self.keys))
+        self._replace('manifest.json', lambda f: json.dump(
+            self.manifest, f, indent=1), mode='w')
+
+    def publish(self, path=published_path):
+        """Write the cube with its axis labels for the dashboard."""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(path.name + '.tmp')
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, hours=hours, weekdays=weekdays, typenames=typenames,
+                     buckets=buckets, timezone=self.tz, **self.cube)
+        os.replace(tmp_path, path)
+        return path
+
+    def _slots(self, typename=None, bucket=None):
+        """(posts, likes, comments) of the selected types and buckets, as
+        hour x weekday arrays."""
+        types = _select(typenames, typename)
+        kept = _select(buckets, bucket)
+        return [self.cube[measure][:, :, types][:, :, :, kept].sum(axis=(2, 3))
+                for measure in measures]
+
+    def heatmap(self, typename=None, bucket=None, metric='likes'):
+        """Mean likes, comments or engagement (likes + comments) per post,
+        as a weekday x hour DataFrame (NaN without posts)."""
+        posts, likes, comments = self._slots(typename, bucket)
+        total = {'likes': likes, 'comments': comments,
+                 'engagement': likes + comments}[metric]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = np.where(posts > 0, total / posts, np.nan)
+        return pd.DataFrame(mean.T, index=weekdays, columns=hours)
+
+    def posts(self, typename=None, bucket=None):
+        """Number of posts as a weekday x hour DataFrame."""
+        posts = self._slots(typename, bucket)[0]
+        return pd.DataFrame(posts.T, index=weekdays, columns=hours)
+
+    def best_slots(self, typename=None, bucket=None, k=10, metric='likes',
+                   min_posts=5):
+        """Hour and weekday slots with the highest mean engagement.
+
+        Args:
+            typename (str or list): GraphImage, GraphVideo, GraphSidecar or
+                other, all types if None
+            bucket (str or list): hashtag buckets, all if None
+            k (int): number of slots
+            metric (str): likes, comments or engagement (likes + comments)
+            min_posts (int): slots with fewer posts are left out
+        Returns:
+            DataFrame of weekday, hour, posts, likes_mean, comments_mean and
+            engagement_mean, best first
+        """
+        posts, likes, comments = self._slots(typename, bucket)
+        hour, weekday = np.nonzero(posts >= max(min_posts, 1))
+        n = posts[hour, weekday]
+        slots = pd.DataFrame({
+            'weekday': np.asarray(weekdays, dtype=object)[weekday],
+            'hour': hour, 'posts': n,
+            'likes_mean': likes[hour, weekday] / n,
+            'comments_mean': comments[hour, weekday] / n})
+        slots['engagement_mean'] = slots['likes_mean'] \
+            + slots['comments_mean']
+        return slots.nlargest(k, metric + '_mean').reset_index(drop=True)
+
+
+def load(path=published_path):
+    """The published cube, for queries only: the urls already counted are
+    not published, so it cannot take new posts."""
+    with np.load(path) as data:
+        cube = EngagementCube(None, str(data['timezone']))
+        cube.cube = {measure: data[measure] for measure in measures}
+    return cube
+
+
+def update(folder_path=filenames.post_path, path=cube_path,
+           publish_path=published_path):
+    """Open the cube, bring it up to date with the post folder and publish
+    it for the dashboard."""
+    cube = EngagementCube(path)
+    if cube.ingest(folder_path) or not publish_path.exists():
+        cube.publish(publish_path)
+    return cube
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Update the engagement cube and query it.')
+    parser.add_argument('--best', nargs='*', metavar='TYPENAME',
+                        help='print the best slots of these post types '
+                        '(all types without a name)')
+    parser.add_argument('--bucket', nargs='+', choices=buckets,
+                        help='hashtag buckets of the query')
+    parser.add_argument('--metric', default='likes', choices=metrics)
+    parser.add_argument('-k', type=int, default=10)
+    parser.add_argument('--resources', type=Path,
+                        default=filenames.resources_path,
+                        help='folder the cube is published to '
+                        '(default: %(default)s)')
+    args = parser.parse_args()
+
+    cube = update(publish_path=args.resources.joinpath('engagement_cube.npz'))
+    if args.best is not None:
+        print(cube.best_slots(args.best or None, args.bucket, args.k,
+                              args.metric).to_string(index=False))
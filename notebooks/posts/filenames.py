@@ -0,0 +1,21 @@
+from pathlib import Path
+
+
+# Use of parents1
+data_path = Path.cwd().parents[1].joinpath('data')
+
+#folders
+raw_data_path = data_path.joinpath('raw')
+intermediate_data_path = data_path.joinpath('intermediate')
+processed_data_path = data_path.joinpath('processed')
+
+#post
+post_path = raw_data_path.joinpath('post')
+user_path = raw_data_path.joinpath('users', 'followers.txt')
+todate_path = intermediate_data_path.joinpath('extracted_todate', 'usernames_todate.txt')
+processed_post_path = processed_data_path.joinpath('post', 'processed_data.csv')
+owner_features_path = processed_data_path.joinpath('post', 'owner_features.parquet')
+engagement_cube_path = processed_data_path.joinpath('post', 'engagement_cube')
+# the dash app's resources/ folder, which it reads from its own cwd
+resources_path = Path.cwd().parents[1].joinpath('notebooks', 'dash-app',
+                                                'resources')
@@ -0,0 +1,362 @@
+"""Sparse hashtag index of the scraped posts.
+
+Hashtags, accounts and posts are mapped to stable integer ids and kept as
+sparse matrices: post x hashtag incidence, account x hashtag post counts and
+hashtag x hashtag co-occurrence (the diagonal is the number of posts of each
+hashtag). The index is built incrementally: only the post CSVs that are new
+or changed since the last run are read, posts already indexed (same url) are
+skipped, and the new rows are added to the stored matrices.
+
+Usage from a notebook::
+
+    import hashtag_index
+    index = hashtag_index.update()
+    index.related(['travel', 'wanderlust'], k=20)
+    index.accounts(['travel', 'wanderlust'], k=20)
+
+or from the command line: ``python hashtag_index.py --related travel``.
+"""
+import argparse
+import json
+import os
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+import filenames
+from post_features import parse_list
+
+index_path = filenames.processed_data_path.joinpath('post', 'hashtag_index')
+
+matrices = ['post_tags', 'account_tags', 'cooccurrence']
+
+
+def normalize_tags(tags):
+    """Lowercase hashtags without the leading '#'."""
+    return pd.Series(tags, dtype=object).astype(str).str.strip() \
+        .str.lstrip('#').str.lower()
+
+
+def url_keys(urls):
+    """64-bit hash of each post url."""
+    return pd.util.hash_pandas_object(pd.Series(urls, dtype=object),
+                                      index=False).to_numpy()
+
+
+def _resize(matrix, shape):
+    matrix = matrix.tocsr()
+    matrix.resize(shape)
+    return matrix
+
+
+def _top_k(scores, k):
+    """Positions of the k highest positive scores, best first."""
+    candidates = np.flatnonzero(scores > 0)
+    if len(candidates) > k:
+        candidates = candidates[np.argpartition(-scores[candidates], k)[:k]]
+    return candidates[np.argsort(-scores[candidates], kind='stable')]
+
+
+class HashtagIndex:
+    """Hashtag -> posts/accounts index and hashtag co-occurrence.
+
+    Args:
+        path (Path): folder holding the index files
+    """
+
+    def __init__(self, path=index_path):
+        self.path = path
+        self.path.mkdir(parents=True, exist_ok=True)
+        self._manifest_path = self.path.joinpath('manifest.json')
+
+        self.manifest = {'files': {}}
+        if self._manifest_path.exists():
+            with open(self._manifest_path) as f:
+                self.manifest = json.load(f)
+
+        hashtags = []
+        if self._file('hashtags.txt').exists():
+            with open(self._file('hashtags.txt'), encoding='utf-8') as f:
+                hashtags = f.read().splitlines()
+        self.hashtags = pd.Index(hashtags, dtype=object)
+        self.accounts_ids = self._load_array('accounts.npy', 'int64')
+        self.post_keys = self._load_array('post_keys.npy', 'uint64')
+        self.post_accounts = self._load_array('post_accounts.npy', 'int64')
+        self._accounts = pd.Index(self.accounts_ids)
+        self._urls = None
+        self._new_urls = []
+
+        shapes = {'post_tags': (len(self.post_keys), len(self.hashtags)),
+                  'account_tags': (len(self.accounts_ids), len(self.hashtags)),
+                  'cooccurrence': (len(self.hashtags), len(self.hashtags))}
+        for name in matrices:
+            path = self._file(name + '.npz')
+            matrix = sparse.load_npz(path).tocsr() if path.exists() \
+                else sparse.csr_matrix(shapes[name], dtype=np.int32)
+            setattr(self, name, matrix)
+        self._csc = {}
+        self._sorted_keys = None
+
+    def _file(self, name):
+        return self.path.joinpath(name)
+
+    def _load_array(self, name, dtype):
+        path = self._file(name)
+        return np.load(path) if path.exists() else np.empty(0, dtype=dtype)
+
+    def _tag_ids(self, tags, add=False):
+        tags = pd.Index(pd.unique(np.asarray(tags, dtype=object)))
+        ids = self.hashtags.get_indexer(tags)
+        if add and (ids == -1).any():
+            self.hashtags = self.hashtags.append(tags[ids == -1])
+            ids = self.hashtags.get_indexer(tags)
+        return tags, ids
+
+    def _account_ids(self, owner_ids):
+        owner_ids = np.asarray(owner_ids, dtype='int64')
+        new = pd.unique(owner_ids[self._accounts.get_indexer(owner_ids) == -1])
+        if len(new):
+            self.accounts_ids = np.concatenate([self.accounts_ids, new])
+            self._accounts = pd.Index(self.accounts_ids)
+        return self._accounts.get_indexer(owner_ids)
+
+    def is_indexed(self, keys):
+        """Whether each url key is already in the index."""
+        if self._sorted_keys is None:
+            self._sorted_keys = np.sort(self.post_keys)
+        if not len(self._sorted_keys):
+            return np.zeros(len(keys), dtype=bool)
+        positions = np.searchsorted(self._sorted_keys, keys)
+        positions[positions == len(self._sorted_keys)] = 0
+        return self._sorted_keys[positions] == keys
+
+    def add_posts(self, posts):
+        """Index a DataFrame of posts (url, owner_id, caption_hashtags).
+
+        Posts whose url is already indexed are skipped.
+
+        Returns:
+            number of posts added
+        """
+        posts = posts.dropna(subset=['url', 'owner_id'])
+        keys = url_keys(posts['url'])
+        new = ~self.is_indexed(keys) \
+            & ~pd.Series(keys).duplicated().to_numpy()
+        posts, keys = posts[new], keys[new]
+        if not len(posts):
+            return 0
+
+        items = parse_list(posts['caption_hashtags'])
+        items = normalize_tags(items).set_axis(items.index)
+        items = items[items != '']
+        unique_tags, unique_ids = self._tag_ids(items, add=True)
+        tag_ids = unique_ids[unique_tags.get_indexer(items)]
+        rows = pd.Index(posts.index).get_indexer(items.index)
+        accounts = self._account_ids(posts['owner_id'])
+
+        n_tags, n_accounts = len(self.hashtags), len(self.accounts_ids)
+        incidence = sparse.coo_matrix(
+            (np.ones(len(rows), dtype=np.int32), (rows, tag_ids)),
+            shape=(len(posts), n_tags)).tocsr()
+        # a hashtag repeated in a caption counts once
+        incidence.data[:] = 1
+        owners = sparse.csr_matrix(
+            (np.ones(len(posts), dtype=np.int32),
+             (accounts, np.arange(len(posts)))),
+            shape=(n_accounts, len(posts)))
+
+        self.post_tags = sparse.vstack(
+            [_resize(self.post_tags, (len(self.post_keys), n_tags)),
+             incidence], format='csr')
+        self.account_tags = _resize(self.account_tags, (n_accounts, n_tags)) \
+            + owners @ incidence
+        self.cooccurrence = _resize(self.cooccurrence, (n_tags, n_tags)) \
+            + (incidence.T @ incidence).tocsr()
+        self.post_keys = np.concatenate([self.post_keys, keys])
+        self._sorted_keys = np.sort(np.concatenate([self._sorted_keys, keys]))
+        self.post_accounts = np.concatenate([self.post_accounts, accounts])
+        self._new_urls.extend(posts['url'].astype(str))
+        self._csc = {}
+        return len(posts)
+
+    def _replace(self, name, write, mode='wb'):
+        tmp_path = self._file(name + '.tmp')
+        with open(tmp_path, mode) as f:
+            write(f)
+        os.replace(tmp_path, self._file(name))
+
+    def _write_lines(self, name, lines):
+        self._replace(name, lambda f: f.write(
+            ''.join(line + '\n' for line in lines).encode('utf-8')))
+
+    def save(self):
+        """Write the index files; the manifest is written last."""
+        for name in matrices:
+            self._replace(name + '.npz', lambda f, m=getattr(self, name):
+                          sparse.save_npz(f, m, compressed=False))
+        for name, array in [('accounts.npy', self.accounts_ids),
+                            ('post_keys.npy', self.post_keys),
+                            ('post_accounts.npy', self.post_accounts)]:
+            self._replace(name, lambda f, a=array: np.save(f, a))
+        self._write_lines('hashtags.txt', self.hashtags)
+        if self._new_urls:
+            urls = self.urls()
+            self._write_lines('posts.txt', urls)
+            self._urls, self._new_urls = urls, []
+        self._replace('manifest.json', lambda f: json.dump(
+            self.manifest, f, indent=1), mode='w')
+
+    def urls(self):
+        """Url of every indexed post, by post id."""
+        if self._urls is None:
+            urls = []
+            if self._file('posts.txt').exists():
+                with open(self._file('posts.txt'), encoding='utf-8') as f:
+                    urls = f.read().splitlines()
+            self._urls = np.asarray(urls, dtype=object)
+        if self._new_urls:
+            return np.concatenate([self._urls,
+                                   np.asarray(self._new_urls, dtype=object)])
+        return self._urls
+
+    def _columns(self, name):
+        if name not in self._csc:
+            self._csc[name] = getattr(self, name).tocsc()
+        return self._csc[name]
+
+    def tag_ids(self, tags):
+        """Ids of the known hashtags among tags."""
+        _, ids = self._tag_ids(normalize_tags(tags))
+        return ids[ids >= 0]
+
+    def counts(self, tags=None):
+        """Number of posts of each hashtag (or of the given ones)."""
+        counts = pd.Series(self.cooccurrence.diagonal(), index=self.hashtags,
+                           name='posts')
+        return counts if tags is None else counts.reindex(
+            normalize_tags(tags).to_numpy()).fillna(0).astype(int)
+
+    def related(self, tags, k=20, measure='count'):
+        """Top-k hashtags co-occurring with a set of hashtags.
+
+        Args:
+            tags (list): query hashtags
+            k (int): number of hashtags returned
+            measure (str): 'count' ranks by the number of posts shared with
+                the query hashtags, 'cosine' divides it by the square root of
+                the hashtag's own post count so generic hashtags rank lower
+        Returns:
+            DataFrame with hashtag, posts (shared with the query) and score
+        """
+        ids = self.tag_ids(tags)
+        together = np.asarray(self.cooccurrence[ids].sum(axis=0),
+                              dtype=float).ravel()
+        together[ids] = 0
+        scores = together
+        if measure == 'cosine':
+            scores = together / np.sqrt(
+                np.maximum(self.cooccurrence.diagonal(), 1))
+        elif measure != 'count':
+            raise ValueError('unknown measure: {}'.format(measure))
+        top = _top_k(scores, k)
+        return pd.DataFrame({'hashtag': self.hashtags[top],
+                             'posts': together[top].astype(int),
+                             'score': scores[top]})
+
+    def accounts(self, tags, k=20):
+        """Top-k accounts posting with a set of hashtags.
+
+        Accounts are ranked by the number of query hashtags they used, then
+        by the number of their posts with any of them.
+
+        Returns:
+            DataFrame with owner_id, hashtags (matched) and posts
+        """
+        ids = self.tag_ids(tags)
+        matched = np.asarray(
+            (self._columns('account_tags')[:, ids] > 0).sum(axis=1)).ravel()
+        # posts with any of the hashtags, each counted once
+        hits = np.asarray(self._columns('post_tags')[:, ids].sum(axis=1)) \
+            .ravel() > 0
+        posts = np.bincount(self.post_accounts[hits],
+                            minlength=len(self.accounts_ids))
+        top = _top_k(matched * (posts.max(initial=0) + 1.0) + posts, k)
+        return pd.DataFrame({'owner_id': self.accounts_ids[top],
+                             'hashtags': matched[top],
+                             'posts': posts[top]})
+
+    def posts(self, tags, k=20, match='all'):
+        """Latest k indexed posts with all (or any) of the hashtags.
+
+        Returns:
+            DataFrame with url and owner_id
+        """
+        ids = self.tag_ids(tags)
+        hits = np.asarray(self._columns('post_tags')[:, ids].sum(axis=1)) \
+            .ravel()
+        needed = len(ids) if match == 'all' else 1
+        found = np.flatnonzero(hits >= max(needed, 1))[::-1][:k]
+        return pd.DataFrame({
+            'url': self.urls()[found],
+            'owner_id': self.accounts_ids[self.post_accounts[found]]})
+
+    def changed_files(self, folder_path=filenames.post_path):
+        """Post CSVs that are new or changed since they were indexed."""
+        changed = []
+        for f in sorted(folder_path.glob('*.csv')):
+            stat = f.stat()
+            entry = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+            if self.manifest['files'].get(f.name) != entry:
+                changed.append((f, entry))
+        return changed
+
+    def ingest(self, folder_path=filenames.post_path, chunk_size=100000,
+               verbose=True):
+        """Index the new or changed post CSVs of a folder.
+
+        Returns:
+            number of posts added
+        """
+        added = 0
+        files = self.changed_files(folder_path)
+        for f, entry in files:
+            for chunk in pd.read_csv(
+                    f, chunksize=chunk_size,
+                    usecols=['url', 'owner_id', 'caption_hashtags']):
+                added += self.add_posts(chunk)
+            self.manifest['files'][f.name] = entry
+        if files:
+            self.save()
+        if verbose:
+            print('Indexed {} new posts from {} files ({} posts, {} hashtags, '
+                  '{} accounts).'.format(added, len(files),
+                                         len(self.post_keys),
+                                         len(self.hashtags),
+                                         len(self.accounts_ids)))
+        return added
+
+
+def update(folder_path=filenames.post_path, path=index_path):
+    """Open the index and bring it up to date with the post folder."""
+    index = HashtagIndex(path)
+    index.ingest(folder_path)
+    return index
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Update the hashtag index and query it.')
+    parser.add_argument('--related', nargs='+', metavar='HASHTAG',
+                        help='print the hashtags co-occurring with these')
+    parser.add_argument('--accounts', nargs='+', metavar='HASHTAG',
+                        help='print the accounts using these hashtags')
+    parser.add_argument('-k', type=int, default=20)
+    args = parser.parse_args()
+
+    index = update()
+    if args.related:
+        print(index.related(args.related, args.k, 'cosine')
+              .to_string(index=False))
+    if args.accounts:
+        print(index.accounts(args.accounts, args.k).to_string(index=False))
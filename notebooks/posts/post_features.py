@@ -0,0 +1,243 @@
+"""Per-owner post features, computed in streaming chunks.
+
+The post CSVs are read in chunks. The list-valued columns
+(``caption_hashtags``, ``caption_mentions``, ``tagged_users``) are parsed
+with vectorized string operations and ``explode``, and every chunk is
+reduced to decomposable partial aggregates per ``owner_id`` (counts, sums,
+sums of squares, min/max, distinct (owner, item) pairs). The partials are
+folded into running totals as they pile up and turned into one typed
+feature table per owner at the end. Memory is bounded by the size of that
+table (the owners and their distinct items) plus the 64-bit url hashes
+that skip posts already counted, 8 bytes a post, rather than by the posts
+themselves.
+
+Usage::
+
+    python post_features.py
+    python post_features.py --chunk-size 200000
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+import filenames
+
+list_columns = {'caption_hashtags': 'hashtags',
+                'caption_mentions': 'mentions',
+                'tagged_users': 'tagged_users'}
+
+usecols = ['url', 'owner_id', 'date_utc', 'typename', 'is_video',
+           'video_view_count', 'likes', 'comments', 'is_sponsored',
+           'days_ago'] + list(list_columns)
+
+typenames = {'GraphImage': 'images', 'GraphVideo': 'videos',
+             'GraphSidecar': 'sidecars'}
+
+
+def parse_list(values):
+    """Explode a column of "[a, 'b', ...]" strings into one row per item.
+
+    Args:
+        values (Series): list-valued column as written by the scraper
+    Returns:
+        Series of stripped items indexed like `values`, empty items dropped
+    """
+    items = values.dropna().astype(str).str.strip('[]').str.split(',') \
+        .explode().str.strip().str.strip('\'"')
+    return items[items.notna() & (items != '')]
+
+
+def _flag(values):
+    return values.replace({'True': 1, 'False': 0, True: 1, False: 0}) \
+        .pipe(pd.to_numeric, errors='coerce').fillna(0)
+
+
+def chunk_aggregates(chunk):
+    """Partial aggregates of a chunk of posts.
+
+    Returns:
+        (numeric, pairs) where numeric has one row per owner_id with sums,
+        sums of squares, min and max, and pairs maps a list column name to
+        its distinct (owner_id, item) rows
+    """
+    date = pd.to_datetime(chunk['date_utc'], errors='coerce')
+    likes = pd.to_numeric(chunk['likes'], errors='coerce').fillna(0)
+    comments = pd.to_numeric(chunk['comments'], errors='coerce').fillna(0)
+    is_video = _flag(chunk['is_video'])
+    views = pd.to_numeric(chunk['video_view_count'], errors='coerce')
+    frame = pd.DataFrame({
+        'owner_id': chunk['owner_id'],
+        'posts': 1,
+        'likes_sum': likes, 'likes_sumsq': likes ** 2, 'likes_max': likes,
+        'comments_sum': comments, 'comments_sumsq': comments ** 2,
+        'comments_max': comments,
+        'n_video': is_video,
+        'video_views_sum': views.fillna(0), 'n_video_views': views.notna(),
+        'n_sponsored': _flag(chunk['is_sponsored']),
+        'first_post': date, 'last_post': date,
+        'days_ago_min': pd.to_numeric(chunk['days_ago'], errors='coerce'),
+    })
+    for typename, column in typenames.items():
+        frame[column] = (chunk['typename'] == typename).astype(int)
+
+    grouped = frame.groupby('owner_id')
+    numeric = grouped.sum(numeric_only=True)
+    for column in ['likes_max', 'comments_max', 'last_post']:
+        numeric[column] = grouped[column].max()
+    for column in ['first_post', 'days_ago_min']:
+        numeric[column] = grouped[column].min()
+
+    pairs = {}
+    for column, name in list_columns.items():
+        items = parse_list(chunk[column])
+        pairs[name] = pd.DataFrame({
+            'owner_id': chunk['owner_id'].reindex(items.index).to_numpy(),
+            'item': items.to_numpy()}).drop_duplicates()
+    return numeric, pairs
+
+
+def merge_aggregates(parts):
+    """Merge per-chunk numeric aggregates into per-owner totals."""
+    df = pd.concat(parts)
+    grouped = df.groupby(level=0)
+    merged = grouped.sum(numeric_only=True)
+    for column in ['likes_max', 'comments_max', 'last_post']:
+        merged[column] = grouped[column].max()
+    for column in ['first_post', 'days_ago_min']:
+        merged[column] = grouped[column].min()
+    return merged
+
+
+def _distinct_pairs(parts):
+    return pd.concat(parts).drop_duplicates()
+
+
+def _compact(parts, reduce):
+    """Reduce a list of partials to one, in place, once the parts added
+    since the last reduction outweigh the reduced one: memory stays within
+    about twice the reduced size, and each row is reduced a logarithmic
+    number of times."""
+    if len(parts) > 1 and sum(map(len, parts[1:])) >= len(parts[0]):
+        parts[:] = [reduce(parts)]
+
+
+def _std(total, sumsq, n):
+    return np.sqrt(np.maximum(sumsq / n - (total / n) ** 2, 0))
+
+
+def finalize(numeric, pairs):
+    """Typed per-owner feature table from the merged aggregates."""
+    n = numeric['posts']
+    features = pd.DataFrame({
+        'posts': n.astype('int32'),
+        'images': numeric['images'].astype('int32'),
+        'videos': numeric['videos'].astype('int32'),
+        'sidecars': numeric['sidecars'].astype('int32'),
+        'likes_sum': numeric['likes_sum'].astype('int64'),
+        'likes_mean': numeric['likes_sum'] / n,
+        'likes_std': _std(numeric['likes_sum'], numeric['likes_sumsq'], n),
+        'likes_max': numeric['likes_max'].astype('int64'),
+        'comments_sum': numeric['comments_sum'].astype('int64'),
+        'comments_mean': numeric['comments_sum'] / n,
+        'comments_std': _std(numeric['comments_sum'],
+                             numeric['comments_sumsq'], n),
+        'comments_max': numeric['comments_max'].astype('int64'),
+        'video_share': numeric['n_video'] / n,
+        'video_views_mean': numeric['video_views_sum']
+        / numeric['n_video_views'].replace(0, np.nan),
+        'sponsored_share': numeric['n_sponsored'] / n,
+        'first_post': numeric['first_post'],
+        'last_post': numeric['last_post'],
+        'days_ago_min': numeric['days_ago_min'],
+    }, index=numeric.index)
+    for name, df in pairs.items():
+        df = df.drop_duplicates().sort_values(['owner_id', 'item'])
+        grouped = df.groupby('owner_id')['item']
+        features['n_' + name] = grouped.size().reindex(features.index) \
+            .fillna(0).astype('int32')
+        features[name] = grouped.agg(','.join).reindex(features.index) \
+            .astype('string')
+    features.index = features.index.astype('int64')
+    return features.rename_axis('userid').reset_index()
+
+
+def _read_chunks(paths, chunk_size):
+    for path in paths:
+        yield from pd.read_csv(path, chunksize=chunk_size,
+                               usecols=lambda c: c in usecols)
+
+
+def build(paths=None, chunk_size=100000, verbose=True):
+    """Per-owner post features of the post CSVs.
+
+    Posts seen in an earlier chunk (same url) are skipped; posts without
+    a url cannot be matched, so each of them is counted.
+
+    Args:
+        paths (list): post CSVs, every CSV of the post folder if None
+        chunk_size (int): rows read at a time
+    Returns:
+        DataFrame with one row per userid
+    """
+    if paths is None:
+        paths = sorted(filenames.post_path.glob('*.csv'))
+    start = time.perf_counter()
+    # 64-bit hashes of the urls already aggregated
+    seen = np.empty(0, dtype='uint64')
+    numeric, pairs = [], {name: [] for name in list_columns.values()}
+    rows = 0
+    for chunk in _read_chunks(paths, chunk_size):
+        for column in usecols:
+            if column not in chunk:
+                chunk[column] = np.nan
+        chunk = chunk.dropna(subset=['owner_id'])
+        has_url = chunk['url'].notna().to_numpy()
+        keys = pd.util.hash_pandas_object(chunk['url'][has_url],
+                                          index=False).to_numpy()
+        position = np.searchsorted(seen, keys).clip(
+            max=max(len(seen) - 1, 0))
+        known = seen[position] == keys if len(seen) \
+            else np.zeros(len(keys), dtype=bool)
+        new = ~known & ~pd.Series(keys).duplicated().to_numpy()
+        kept = ~has_url
+        kept[has_url] = new
+        chunk = chunk[kept]
+        # two sorted runs: the stable sort merges them in linear time
+        seen = np.sort(np.concatenate([seen, np.sort(keys[new])]),
+                       kind='stable')
+        rows += len(chunk)
+        chunk_numeric, chunk_pairs = chunk_aggregates(chunk)
+        numeric.append(chunk_numeric)
+        _compact(numeric, merge_aggregates)
+        for name, df in chunk_pairs.items():
+            pairs[name].append(df)
+            _compact(pairs[name], _distinct_pairs)
+    features = finalize(merge_aggregates(numeric),
+                        {name: pd.concat(dfs) for name, dfs in pairs.items()})
+    if verbose:
+        print('Aggregated {} posts of {} owners in {:.1f}s'.format(
+            rows, len(features), time.perf_counter() - start))
+    return features
+
+
+def write(features, path=filenames.owner_features_path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = str(path) + '.tmp'
+    features.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, path)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Compute the per-owner post feature table.')
+    parser.add_argument('paths', nargs='*', help='post CSVs (default: the '
+                        'CSVs of the raw post folder)')
+    parser.add_argument('--chunk-size', type=int, default=100000)
+    args = parser.parse_args()
+
+    features = build(args.paths or None, args.chunk_size)
+    write(features)
+    print(features.dtypes.to_string())